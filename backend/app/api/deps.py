@@ -2,12 +2,22 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
 from app.core.database import get_db
-from app.core.security import decode_token
+from app.core.security import decode_token, principal_cache
 from app.models.user import User
 
 security = HTTPBearer()
 
+_USER_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+def _user_from_cache(values: dict) -> User:
+    # 每個請求都建立新的 detached 物件，避免請求之間共用同一個 ORM instance
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -31,9 +41,15 @@ async def get_current_user(
             detail="Invalid token payload",
         )
     
-    # 從資料庫取得使用者
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
+    # 先查快取，沒有才從資料庫取得使用者
+    cached = principal_cache.get(user_id)
+    if cached is not None:
+        user = _user_from_cache(cached)
+    else:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+        if user is not None:
+            principal_cache.set(user_id, {key: getattr(user, key) for key in _USER_COLUMNS})
     
     if user is None:
         raise HTTPException(
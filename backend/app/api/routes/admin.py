@@ -2,14 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from app.core.database import get_db
+from app.core.pagination import fetch_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 from app.api.deps import get_current_admin
+from app.core.security import invalidate_principal
 from app.models.user import User
 from app.models.timetable import TimetableTemplate
 from app.schemas.user import UserResponse, UserUpdate, UserListResponse
 from app.schemas.timetable import TimetableTemplateResponse, TimetableTemplateReview, TimetableTemplateCreate
 from app.schemas.auth import MessageResponse
-from app.services.timetable_service import create_template
-from datetime import datetime
+from app.schemas.notification import NotificationOutboxStats
+from app.services.notification_outbox import notification_dispatcher
+from app.services.timetable_service import create_template, review_template as review_template_service
+from typing import Optional
 import json
 
 router = APIRouter()
@@ -18,24 +22,31 @@ router = APIRouter()
 # 使用者管理
 @router.get("/users", response_model=UserListResponse)
 async def list_users(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from next_cursor of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_admin: User = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db)
 ):
-    """取得使用者列表（管理員）"""
-    # 取得總數
-    count_result = await db.execute(select(func.count(User.id)))
-    total = count_result.scalar()
+    """取得使用者列表（管理員），依建立時間新到舊以 keyset 分頁"""
+    # 總數只在第一頁計算，翻頁時不再重複 COUNT(*)
+    total = None
+    if not cursor:
+        count_result = await db.execute(select(func.count(User.id)))
+        total = count_result.scalar()
     
     # 取得使用者列表
-    result = await db.execute(
-        select(User)
-        .offset(skip)
-        .limit(limit)
-        .order_by(User.created_at.desc())
-    )
-    users = result.scalars().all()
+    try:
+        users, next_cursor = await fetch_page(
+            db,
+            select(User),
+            [User.created_at, User.id],
+            cursor,
+            limit,
+            descending=True,
+            tag="users"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
     return {
         "users": [
@@ -53,7 +64,8 @@ async def list_users(
             )
             for u in users
         ],
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor
     }
 
 
@@ -123,6 +135,7 @@ async def update_user(
     
     await db.commit()
     await db.refresh(user)
+    invalidate_principal(user_id)
     
     return UserResponse(
         id=user.id,
@@ -163,10 +176,21 @@ async def delete_user(
     
     await db.delete(user)
     await db.commit()
+    invalidate_principal(user_id)
     
     return {"message": "User deleted successfully"}
 
 
+# 通知佇列
+@router.get("/notifications/stats", response_model=NotificationOutboxStats)
+async def get_notification_stats(
+    current_admin: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """取得 Discord 通知佇列深度與送達延遲（管理員）"""
+    return await notification_dispatcher.get_stats(db)
+
+
 # 課表模板審核
 @router.get("/templates/pending", response_model=list[TimetableTemplateResponse])
 async def get_pending_templates(
@@ -243,10 +267,7 @@ async def review_template(
             detail="Status must be 'approved' or 'rejected'"
         )
     
-    result = await db.execute(
-        select(TimetableTemplate).where(TimetableTemplate.id == template_id)
-    )
-    template = result.scalar_one_or_none()
+    template = await review_template_service(db, current_admin.id, template_id, review_data.status)
     
     if not template:
         raise HTTPException(
@@ -254,11 +275,5 @@ async def review_template(
             detail="Template not found"
         )
     
-    template.status = review_data.status
-    template.reviewed_at = datetime.utcnow()
-    template.reviewed_by = current_admin.id
-    
-    await db.commit()
-    
     return {"message": f"Template {review_data.status} successfully"}
 
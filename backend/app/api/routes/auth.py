@@ -8,15 +8,18 @@ from app.schemas.auth import (
     LoginRequest,
     TokenResponse,
     RefreshTokenRequest,
-    MessageResponse
+    MessageResponse,
+    EmailJobResponse,
+    EmailJobStatusResponse
 )
 from app.services.auth_service import signup, verify_email, request_login_otp, login
+from app.services.email_queue import get_email_job_status
 from app.core.security import decode_token, create_access_token
 
 router = APIRouter()
 
 
-@router.post("/signup", response_model=MessageResponse)
+@router.post("/signup", response_model=EmailJobResponse)
 async def signup_endpoint(
     signup_data: SignupRequest,
     db: AsyncSession = Depends(get_db)
@@ -42,7 +45,7 @@ async def verify_email_endpoint(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
-@router.post("/request-login-otp", response_model=MessageResponse)
+@router.post("/request-login-otp", response_model=EmailJobResponse)
 async def request_login_otp_endpoint(
     request_data: RequestLoginOTPRequest,
     db: AsyncSession = Depends(get_db)
@@ -55,6 +58,18 @@ async def request_login_otp_endpoint(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.get("/email-jobs/{job_id}", response_model=EmailJobStatusResponse)
+async def get_email_job_endpoint(
+    job_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """查詢驗證碼 email 的寄送狀態"""
+    try:
+        return await get_email_job_status(db, job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
 @router.post("/login", response_model=TokenResponse)
 async def login_endpoint(
     login_data: LoginRequest,
@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.core.database import get_db
+from app.core.database import get_db, upsert
 from app.api.deps import get_current_user
 from app.models.user import User
 from app.models.calendar_integration import AppleCalendarCredential
 from app.schemas.calendar import AppleConnectRequest, CalendarStatusResponse
 from app.schemas.auth import MessageResponse
 from app.core.security import encrypt_app_password
-import caldav
-
-# TODO: 實作 CalDAV 連線測試
+from app.services.caldav_client import CalDAVSession, CalDAVError, caldav_sessions
+from app.services.calendar_busy_store import calendar_busy_store
+from app.services.calendar_mirror import drop_mirror
+from app.services.calendar_service import provider_enabled
 
 router = APIRouter()
 
@@ -21,40 +22,47 @@ async def apple_connect(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """連線 Apple Calendar"""
-    # TODO: 測試 CalDAV 連線
-    # try:
-    #     client = caldav.DAVClient(
-    #         url="https://caldav.icloud.com/",
-    #         username=connect_data.apple_id_email,
-    #         password=connect_data.app_specific_password
-    #     )
-    #     principal = client.principal()
-    #     calendars = principal.calendars()
-    # except Exception as e:
-    #     raise HTTPException(status_code=400, detail=f"Connection failed: {str(e)}")
+    """連線 Apple Calendar（先確認帳號可以登入並找到行事曆）"""
+    if not provider_enabled("apple"):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Apple Calendar integration disabled"
+        )
+    
+    session = CalDAVSession(
+        connect_data.apple_id_email,
+        connect_data.app_specific_password,
+        base_url=caldav_sessions.base_url,
+        transport=caldav_sessions.transport
+    )
+    try:
+        await session.default_calendar()
+    except CalDAVError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Connection failed: {e}")
+    finally:
+        await session.close()
     
     # 加密並儲存
     encrypted_password = encrypt_app_password(connect_data.app_specific_password)
     
-    # 檢查是否已存在
-    result = await db.execute(
-        select(AppleCalendarCredential).where(AppleCalendarCredential.user_id == current_user.id)
-    )
-    existing = result.scalar_one_or_none()
-    
-    if existing:
-        existing.apple_id_email = connect_data.apple_id_email
-        existing.encrypted_app_password = encrypted_password
-    else:
-        cred = AppleCalendarCredential(
-            user_id=current_user.id,
-            apple_id_email=connect_data.apple_id_email,
-            encrypted_app_password=encrypted_password
-        )
-        db.add(cred)
+    # 新增或更新（同一個使用者只有一組憑證）
+    await db.execute(upsert(
+        db,
+        AppleCalendarCredential,
+        {
+            "user_id": current_user.id,
+            "apple_id_email": connect_data.apple_id_email,
+            "encrypted_app_password": encrypted_password
+        },
+        ["user_id"],
+        ["apple_id_email", "encrypted_app_password"]
+    ))
+    # 帳號可能已更換，舊的忙碌時段快取、行事曆鏡像與 CalDAV session 不再適用
+    await calendar_busy_store.invalidate(db, current_user.id, "apple")
+    await drop_mirror(db, current_user.id, "apple")
     
     await db.commit()
+    await caldav_sessions.discard(current_user.id)
     
     return {"message": "Apple Calendar connected successfully"}
 
@@ -6,7 +6,7 @@ from app.api.deps import get_current_user
 from app.models.user import User
 from app.schemas.calendar import GoogleAuthResponse, CalendarStatusResponse
 from app.schemas.auth import MessageResponse
-from app.core.config import settings
+from app.services.calendar_service import provider_enabled
 
 # TODO: 實作 Google OAuth
 # from google_auth_oauthlib.flow import Flow
@@ -20,7 +20,7 @@ async def google_auth(
     current_user: User = Depends(get_current_user)
 ):
     """取得 Google OAuth 授權 URL"""
-    if not settings.GOOGLE_CLIENT_ID:
+    if not provider_enabled("google"):
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Google Calendar integration not configured"
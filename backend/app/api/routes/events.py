@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
 from app.api.deps import get_current_user
 from app.models.user import User
-from sqlalchemy import select
+from sqlalchemy import select, func
 from app.models.event import Event
+from app.core.http_cache import http_date, is_not_modified
+from app.core.pagination import fetch_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.core.serialization import trusted_response
 from app.schemas.event import (
     PrivateEventCreate,
     PublicEventCreate,
@@ -19,15 +22,22 @@ from app.services.event_service import (
     create_public_event,
     vote_event,
     get_event_vote_stats,
-    get_public_events,
+    get_vote_stats_for_events,
+    get_public_feed_page,
+    event_to_dict,
+    load_time_options,
+    delete_event_rows,
+    mark_public_feed_changed,
+    invalidate_public_feed_cache,
+    public_event_page_keys,
     join_event,
     leave_event,
-    get_event_attendees
+    get_event_attendees,
+    get_attendees_for_events
 )
-from app.services.discord_service import send_event_notification
+from app.services.calendar_sync import calendar_sync_worker
 from typing import Optional
 from datetime import datetime
-import json
 
 router = APIRouter()
 
@@ -48,15 +58,25 @@ async def create_public_event_endpoint(
 
 @router.get("/public", response_model=list[EventResponse])
 async def get_public_events_endpoint(
+    request: Request,
     school: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     from_date: Optional[datetime] = Query(None),
     to_date: Optional[datetime] = Query(None),
     sort: str = Query("time"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: Optional[User] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """取得公開活動列表（管理員可以看到所有活動，包含私人活動）"""
+    """
+    取得公開活動列表（管理員可以看到所有活動，包含私人活動）
+    
+    使用 keyset 分頁，下一頁的游標放在 X-Next-Cursor 回應標頭。
+    一般使用者的結果由短 TTL 快取提供，支援 ETag / Last-Modified 條件式請求。
+    """
+    sort = "time" if sort == "time" else "created_at"
+    
     # 如果是管理員，顯示所有活動（包含私人活動）
     if current_user and current_user.is_admin:
         query = select(Event)
@@ -71,68 +91,54 @@ async def get_public_events_endpoint(
             query = query.where(Event.start_time <= to_date)
         
         if sort == "time":
-            query = query.order_by(Event.start_time)
+            # 私人活動沒有 start_time，以建立時間代替，讓排序鍵不為 NULL
+            keys, descending = [func.coalesce(Event.start_time, Event.created_at), Event.id], False
         else:
-            query = query.order_by(Event.created_at.desc())
-        
-        result = await db.execute(query)
-        events = result.scalars().all()
+            keys, descending = public_event_page_keys(sort)
         
-        # 取得所有建立者的資訊
+        try:
+            events, next_cursor = await fetch_page(db, query, keys, cursor, limit, descending, tag=sort)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        # 取得所有建立者的姓名
         creator_ids = list(set([e.created_by for e in events]))
         if creator_ids:
-            users_result = await db.execute(select(User).where(User.id.in_(creator_ids)))
-            users = {u.id: u for u in users_result.scalars().all()}
+            users_result = await db.execute(select(User.id, User.name).where(User.id.in_(creator_ids)))
+            names = dict(users_result.fetchall())
         else:
-            users = {}
+            names = {}
         
-        events_list = []
-        for e in events:
-            creator = users.get(e.created_by)
-            vote_stats = None
-            attendees = []
-            
-            if e.public == 0 and e.proposed_times_json:
-                vote_stats = await get_event_vote_stats(db, e.id)
-            elif e.public == 1:
-                attendees = await get_event_attendees(db, e.id)
-            
-            events_list.append({
-                "id": e.id,
-                "room_id": e.room_id,
-                "created_by": e.created_by,
-                "created_by_name": creator.name if creator else None,
-                "title": e.title,
-                "description": e.description,
-                "category": e.category,
-                "location": e.location,
-                "public": e.public,
-                "proposed_times": json.loads(e.proposed_times_json) if e.proposed_times_json else None,
-                "start_time": e.start_time,
-                "end_time": e.end_time,
-                "created_at": e.created_at,
-                "updated_at": e.updated_at,
-                "vote_stats": vote_stats,
-                "attendees": attendees
-            })
+        private_ids = [e.id for e in events if e.public == 0]
+        all_vote_stats = await get_vote_stats_for_events(db, private_ids)
+        all_options = await load_time_options(db, private_ids)
+        all_attendees = await get_attendees_for_events(db, [e.id for e in events if e.public == 1])
         
-        return events_list
+        events_list = [
+            event_to_dict(
+                e, names.get(e.created_by), all_vote_stats.get(e.id), all_attendees.get(e.id), all_options.get(e.id)
+            )
+            for e in events
+        ]
+        
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return trusted_response(EventResponse, events_list, headers)
     else:
         # 一般使用者只能看到公開活動
-        events = await get_public_events(db, school, category, from_date, to_date, sort)
-        # 為每個活動添加建立者姓名
-        creator_ids = list(set([e.get("created_by") for e in events if e.get("created_by")]))
-        if creator_ids:
-            users_result = await db.execute(select(User).where(User.id.in_(creator_ids)))
-            users = {u.id: u for u in users_result.scalars().all()}
-        else:
-            users = {}
+        try:
+            page = await get_public_feed_page(db, school, category, from_date, to_date, sort, cursor, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         
-        for event in events:
-            creator = users.get(event.get("created_by"))
-            event["created_by_name"] = creator.name if creator else None
+        headers = {"ETag": page["etag"], "Cache-Control": "no-cache"}
+        if page["last_modified"]:
+            headers["Last-Modified"] = http_date(page["last_modified"])
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
         
-        return events
+        if is_not_modified(request, page["etag"], page["last_modified"]):
+            return Response(status_code=304, headers=headers)
+        # 已依 EventResponse 序列化，直接回傳
+        return Response(content=page["body"], media_type="application/json", headers=headers)
 
 
 @router.post("/{event_id}/join", response_model=MessageResponse)
@@ -144,9 +150,8 @@ async def join_event_endpoint(
     """報名公開活動"""
     try:
         result = await join_event(db, event_id, current_user.id)
-        
-        # TODO: 同步到行事曆
-        
+        # 行事曆同步已排入佇列，不等待行事曆 API
+        calendar_sync_worker.wake()
         return result
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
@@ -160,8 +165,7 @@ async def leave_event_endpoint(
 ):
     """退出活動"""
     result = await leave_event(db, event_id, current_user.id)
-    
-    # TODO: 從行事曆刪除
+    calendar_sync_worker.wake()
     
     return result
 
@@ -172,11 +176,6 @@ async def get_event_endpoint(
     db: AsyncSession = Depends(get_db)
 ):
     """取得活動詳細資訊"""
-    from sqlalchemy import select
-    from app.models.event import Event
-    from app.services.event_service import get_event_vote_stats, get_event_attendees
-    import json
-    
     result = await db.execute(select(Event).where(Event.id == event_id))
     event = result.scalar_one_or_none()
     
@@ -184,35 +183,20 @@ async def get_event_endpoint(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
     
     vote_stats = None
-    if event.public == 0 and event.proposed_times_json:
+    proposed_times = None
+    if event.public == 0:
         vote_stats = await get_event_vote_stats(db, event.id)
+        proposed_times = (await load_time_options(db, [event.id]))[event.id]
     
     attendees = []
     if event.public == 1:
         attendees = await get_event_attendees(db, event.id)
     
     # 取得建立者資訊
-    creator_result = await db.execute(select(User).where(User.id == event.created_by))
-    creator = creator_result.scalar_one_or_none()
+    creator_result = await db.execute(select(User.name).where(User.id == event.created_by))
+    creator_name = creator_result.scalar_one_or_none()
     
-    return {
-        "id": event.id,
-        "room_id": event.room_id,
-        "created_by": event.created_by,
-        "created_by_name": creator.name if creator else None,
-        "title": event.title,
-        "description": event.description,
-        "category": event.category,
-        "location": event.location,
-        "public": event.public,
-        "proposed_times": json.loads(event.proposed_times_json) if event.proposed_times_json else None,
-        "start_time": event.start_time,
-        "end_time": event.end_time,
-        "created_at": event.created_at,
-        "updated_at": event.updated_at,
-        "vote_stats": vote_stats,
-        "attendees": attendees
-    }
+    return trusted_response(EventResponse, event_to_dict(event, creator_name, vote_stats, attendees, proposed_times))
 
 
 @router.get("/{event_id}/attendees", response_model=list[EventAttendee])
@@ -222,7 +206,7 @@ async def get_event_attendees_endpoint(
 ):
     """取得活動參加者"""
     attendees = await get_event_attendees(db, event_id)
-    return attendees
+    return trusted_response(EventAttendee, attendees)
 
 
 @router.delete("/{event_id}", response_model=MessageResponse)
@@ -259,14 +243,18 @@ async def delete_event(
                 detail="Only event creator, room owner or admin can delete this event"
             )
     
-    # 刪除相關的投票和參加者
-    from app.models.event import EventVote, event_attendees
-    await db.execute(EventVote.__table__.delete().where(EventVote.event_id == event_id))
-    await db.execute(event_attendees.delete().where(event_attendees.c.event_id == event_id))
+    # 刪除相關的投票、參加者和候選時間
+    await delete_event_rows(db, event_id)
     
     # 刪除活動
+    was_public = event.public == 1
     await db.delete(event)
+    if was_public:
+        await mark_public_feed_changed(db)
     await db.commit()
+    if was_public:
+        invalidate_public_feed_cache()
+    calendar_sync_worker.wake()
     
     return {"message": "Event deleted successfully"}
 
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.core.database import get_db
+from app.core.pagination import fetch_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.core.serialization import trusted_response
 from app.api.deps import get_current_user, get_current_admin
 from app.models.user import User
 from app.models.room import Room, room_members
@@ -9,14 +11,15 @@ from app.models.event import Event
 from app.schemas.room import (
     RoomCreate,
     RoomResponse,
+    RoomAvailabilityResponse,
     RoomInviteRequest,
     RoomJoinByCodeRequest,
     RoomJoinResponse
 )
 from app.services.room_service import (
     create_room,
-    get_user_rooms,
     get_room_detail,
+    RoomListLoader,
     join_room_by_invite_code,
     regenerate_invite_code
 )
@@ -25,15 +28,45 @@ from app.schemas.event import (
     PrivateEventCreate,
     EventResponse,
     EventVoteRequest,
-    EventVoteResponse
+    EventVoteResponse,
+    ProposedTimeScoresResponse
 )
-from app.services.event_service import create_private_event, vote_event, get_event_vote_stats
-from app.services.discord_service import send_event_notification, send_room_notification
+from app.services.event_service import (
+    create_private_event,
+    vote_event,
+    get_vote_stats_for_events,
+    load_time_options,
+    delete_event_rows,
+    event_to_dict
+)
+from app.services.availability_service import get_room_availability, get_event_time_scores
+from app.services.timetable_service import get_template_periods
+from app.services.discord_service import build_event_payload, build_message_payload
+from app.services.notification_outbox import enqueue_room_notification, notification_dispatcher
+from app.services.calendar_sync import calendar_sync_worker
+from typing import Optional
 import json
 
 router = APIRouter()
 
 
+async def _ensure_room_member(db: AsyncSession, room_id: str, user: User) -> None:
+    """非管理員必須是房間成員，否則回傳 403；管理員查詢不存在的房間回傳 404"""
+    if user.is_admin:
+        result = await db.execute(select(Room.id).where(Room.id == room_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found")
+        return
+    result = await db.execute(
+        select(room_members).where(
+            room_members.c.room_id == room_id,
+            room_members.c.user_id == user.id
+        )
+    )
+    if not result.fetchone():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a room member")
+
+
 @router.post("", response_model=RoomResponse)
 async def create_room_endpoint(
     room_data: RoomCreate,
@@ -47,90 +80,21 @@ async def create_room_endpoint(
 
 @router.get("", response_model=list[RoomResponse])
 async def get_rooms(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """取得使用者參與的房間列表（管理員可以看到所有房間）"""
-    if current_user.is_admin:
-        # 管理員可以看到所有房間
-        result = await db.execute(select(Room).order_by(Room.created_at.desc()))
-        all_rooms = result.scalars().all()
-        rooms = []
-        for r in all_rooms:
-            # 取得房間成員資訊（包含姓名）
-            members_result = await db.execute(
-                select(room_members).where(room_members.c.room_id == r.id)
-            )
-            members_data = members_result.fetchall()
-            member_ids = [row[1] for row in members_data]
-            
-            # 取得使用者資訊
-            if member_ids:
-                users_result = await db.execute(
-                    select(User).where(User.id.in_(member_ids))
-                )
-                users = {u.id: u for u in users_result.scalars().all()}
-            else:
-                users = {}
-            
-            # 取得擁有者資訊
-            owner_result = await db.execute(select(User).where(User.id == r.owner_id))
-            owner = owner_result.scalar_one_or_none()
-            
-            members = [
-                {
-                    "user_id": row[1],
-                    "name": users.get(row[1]).name if row[1] in users else None,
-                    "role": row[2]
-                }
-                for row in members_data
-            ]
-            
-            rooms.append({
-                "id": r.id,
-                "name": r.name,
-                "owner_id": r.owner_id,
-                "owner_name": owner.name if owner else None,
-                "school": r.school,
-                "invite_code": r.invite_code,
-                "created_at": r.created_at,
-                "updated_at": r.updated_at,
-                "members": members
-            })
-        return rooms
-    else:
-        # 一般使用者只能看到自己參與的房間
-        rooms = await get_user_rooms(db, current_user.id)
-        # 為每個房間添加成員姓名和擁有者姓名
-        for room in rooms:
-            # 取得擁有者資訊
-            owner_result = await db.execute(select(User).where(User.id == room["owner_id"]))
-            owner = owner_result.scalar_one_or_none()
-            room["owner_name"] = owner.name if owner else None
-            
-            members_result = await db.execute(
-                select(room_members).where(room_members.c.room_id == room["id"])
-            )
-            members_data = members_result.fetchall()
-            member_ids = [row[1] for row in members_data]
-            
-            if member_ids:
-                users_result = await db.execute(
-                    select(User).where(User.id.in_(member_ids))
-                )
-                users = {u.id: u for u in users_result.scalars().all()}
-            else:
-                users = {}
-            
-            room["members"] = [
-                {
-                    "user_id": row[1],
-                    "name": users.get(row[1]).name if row[1] in users else None,
-                    "role": row[2]
-                }
-                for row in members_data
-            ]
-        return rooms
+    """取得使用者參與的房間列表（管理員可以看到所有房間），依建立時間新到舊分頁"""
+    loader = RoomListLoader(db)
+    try:
+        # 管理員可以看到所有房間，一般使用者只能看到自己參與的房間
+        rooms = await loader.load(None if current_user.is_admin else current_user.id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    headers = {"X-Next-Cursor": loader.next_cursor} if loader.next_cursor else None
+    return trusted_response(RoomResponse, rooms, headers)
 
 
 @router.get("/{room_id}", response_model=RoomResponse)
@@ -142,9 +106,30 @@ async def get_room(
     """取得房間詳細資訊"""
     try:
         result = await get_room_detail(db, room_id)
-        return result
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return trusted_response(RoomResponse, result)
+
+
+@router.get("/{room_id}/availability", response_model=RoomAvailabilityResponse)
+async def get_room_availability_endpoint(
+    room_id: str,
+    weekday: Optional[str] = Query(None, description="Weekday: monday ... sunday (or mon ... sun); omit for the whole week"),
+    template_id: Optional[int] = Query(None, description="Template ID to use for periods"),
+    min_free: Optional[int] = Query(None, ge=1, description="At least this many members free; omit for all members"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """取得房間成員的共同空堂（依空堂人數排序）"""
+    await _ensure_room_member(db, room_id, current_user)
+    
+    periods = await get_template_periods(db, template_id)
+    
+    try:
+        result = await get_room_availability(db, room_id, periods, weekday, min_free)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return trusted_response(RoomAvailabilityResponse, result)
 
 
 @router.get("/{room_id}/invite-code", response_model=MessageResponse)
@@ -226,15 +211,14 @@ async def create_room_event(
     if not result.fetchone():
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a room member")
     
-    result = await create_private_event(db, room_id, current_user.id, event_data)
-    
-    # 發送 Discord 通知
-    await send_event_notification(
+    # Discord 通知寫入 outbox，與活動在同一個交易中提交，由背景 dispatcher 送出
+    await enqueue_room_notification(
         db,
         room_id,
-        f"新活動：{event_data.title}",
-        event_data.description
+        build_event_payload(f"新活動：{event_data.title}", event_data.description)
     )
+    result = await create_private_event(db, room_id, current_user.id, event_data)
+    notification_dispatcher.wake()
     
     return result
 
@@ -242,47 +226,64 @@ async def create_room_event(
 @router.get("/{room_id}/events", response_model=list[EventResponse])
 async def get_room_events(
     room_id: str,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """取得房間活動列表"""
-    result = await db.execute(
-        select(Event).where(Event.room_id == room_id).order_by(Event.created_at.desc())
-    )
-    events = result.scalars().all()
+    """取得房間活動列表，依建立時間新到舊分頁"""
+    try:
+        events, next_cursor = await fetch_page(
+            db,
+            select(Event).where(Event.room_id == room_id),
+            [Event.created_at, Event.id],
+            cursor,
+            limit,
+            descending=True,
+            tag="room-events"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
-    # 取得所有建立者的資訊
+    # 取得所有建立者的姓名
     creator_ids = list(set([e.created_by for e in events]))
     if creator_ids:
-        users_result = await db.execute(select(User).where(User.id.in_(creator_ids)))
-        users = {u.id: u for u in users_result.scalars().all()}
+        users_result = await db.execute(select(User.id, User.name).where(User.id.in_(creator_ids)))
+        names = dict(users_result.fetchall())
     else:
-        users = {}
+        names = {}
     
-    events_list = []
-    for e in events:
-        creator = users.get(e.created_by)
-        vote_stats = await get_event_vote_stats(db, e.id)
-        events_list.append({
-            "id": e.id,
-            "room_id": e.room_id,
-            "created_by": e.created_by,
-            "created_by_name": creator.name if creator else None,
-            "title": e.title,
-            "description": e.description,
-            "category": e.category,
-            "location": e.location,
-            "public": e.public,
-            "proposed_times": json.loads(e.proposed_times_json) if e.proposed_times_json else None,
-            "start_time": e.start_time,
-            "end_time": e.end_time,
-            "created_at": e.created_at,
-            "updated_at": e.updated_at,
-            "vote_stats": vote_stats,
-            "attendees": []
-        })
+    event_ids = [e.id for e in events]
+    vote_stats = await get_vote_stats_for_events(db, event_ids)
+    options = await load_time_options(db, event_ids)
     
-    return events_list
+    events_list = [event_to_dict(e, names.get(e.created_by), vote_stats[e.id], proposed_times=options[e.id]) for e in events]
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return trusted_response(EventResponse, events_list, headers)
+
+
+@router.get("/{room_id}/events/{event_id}/time-scores", response_model=ProposedTimeScoresResponse)
+async def get_room_event_time_scores(
+    room_id: str,
+    event_id: str,
+    template_id: Optional[int] = Query(None, description="Template ID to use for periods"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """依成員課表與已連結行事曆，計算活動每個候選時間的空閒 / 忙碌人數（依空閒人數排序）"""
+    await _ensure_room_member(db, room_id, current_user)
+    
+    result = await db.execute(
+        select(Event.id).where(Event.id == event_id, Event.room_id == room_id)
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
+    
+    periods = await get_template_periods(db, template_id)
+    options = await load_time_options(db, [event_id])
+    result = await get_event_time_scores(db, room_id, event_id, options[event_id], periods)
+    return trusted_response(ProposedTimeScoresResponse, result)
 
 
 @router.post("/{room_id}/events/{event_id}/vote", response_model=EventVoteResponse)
@@ -302,17 +303,16 @@ async def vote_room_event(
     if not event:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Event not found")
     
-    result = await vote_event(db, event_id, current_user.id, vote_data.vote)
-    
-    # 發送 Discord 通知
-    try:
-        await send_room_notification(
-            db,
-            room_id,
+    # Discord 通知寫入 outbox，與投票在同一個交易中提交
+    await enqueue_room_notification(
+        db,
+        room_id,
+        build_message_payload(
             f"{current_user.name or current_user.email} 對「{event.title}」投了 {vote_data.vote}"
         )
-    except Exception as e:
-        print(f"Failed to send Discord notification: {e}")
+    )
+    result = await vote_event(db, event_id, current_user.id, vote_data.vote)
+    notification_dispatcher.wake()
     
     return result
 
@@ -342,10 +342,8 @@ async def delete_room(
     events_result = await db.execute(select(Event).where(Event.room_id == room_id))
     events = events_result.scalars().all()
     for event in events:
-        # 刪除活動相關的投票和參加者
-        from app.models.event import EventVote, event_attendees
-        await db.execute(EventVote.__table__.delete().where(EventVote.event_id == event.id))
-        await db.execute(event_attendees.delete().where(event_attendees.c.event_id == event.id))
+        # 刪除活動相關的投票、參加者和候選時間
+        await delete_event_rows(db, event.id)
         await db.delete(event)
     
     # 刪除成員關係
@@ -363,6 +361,7 @@ async def delete_room(
     # 刪除房間
     await db.delete(room)
     await db.commit()
+    calendar_sync_worker.wake()
     
     return {"message": "Room deleted successfully"}
 
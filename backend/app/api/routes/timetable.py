@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from app.core.database import get_db
+from app.core.http_cache import is_not_modified
 from app.api.deps import get_current_user
 from app.models.user import User
 from app.schemas.timetable import (
@@ -12,10 +12,11 @@ from app.schemas.timetable import (
     TimetableTemplateCreate
 )
 from app.services.timetable_service import (
-    get_templates,
+    get_template_snapshot,
     save_timetable,
     get_timetable,
     get_free_slots,
+    get_template_periods,
     submit_template
 )
 
@@ -23,9 +24,22 @@ router = APIRouter()
 
 
 @router.get("/templates", response_model=list[TimetableTemplateResponse])
-async def get_timetable_templates(db: AsyncSession = Depends(get_db)):
-    """取得已通過審核的課表模板"""
-    templates = await get_templates(db)
+async def get_timetable_templates(
+    request: Request,
+    response: Response,
+    school: str = Query(None, description="Only return templates of this school"),
+    db: AsyncSession = Depends(get_db)
+):
+    """取得已通過審核的課表模板（支援 ETag / If-None-Match）"""
+    snapshot = await get_template_snapshot(db)
+    etag = snapshot.etag(school)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    templates = snapshot.filter(school)
     return [
         TimetableTemplateResponse(
             id=t["id"],
@@ -99,31 +113,7 @@ async def get_free_slots_endpoint(
     db: AsyncSession = Depends(get_db)
 ):
     """取得空堂時間"""
-    periods = []
-    
-    if template_id:
-        # 從模板取得 periods
-        from app.models.timetable import TimetableTemplate
-        result = await db.execute(
-            select(TimetableTemplate).where(TimetableTemplate.id == template_id)
-        )
-        template = result.scalar_one_or_none()
-        if template and template.status == "approved":
-            import json
-            periods = json.loads(template.periods_json)
-    
-    # 如果沒有指定模板或模板不存在，使用預設節次
-    if not periods:
-        periods = [
-            {"name": "1", "start": "08:10", "end": "09:00"},
-            {"name": "2", "start": "09:10", "end": "10:00"},
-            {"name": "3", "start": "10:10", "end": "11:00"},
-            {"name": "4", "start": "11:10", "end": "12:00"},
-            {"name": "5", "start": "13:10", "end": "14:00"},
-            {"name": "6", "start": "14:10", "end": "15:00"},
-            {"name": "7", "start": "15:10", "end": "16:00"},
-            {"name": "8", "start": "16:10", "end": "17:00"},
-        ]
+    periods = await get_template_periods(db, template_id)
     
     slots = await get_free_slots(db, current_user.id, weekday, periods)
     return {"weekday": weekday, "slots": [{"start": s.start, "end": s.end} for s in slots]}
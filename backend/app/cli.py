@@ -0,0 +1,257 @@
+"""
+後端維運指令
+
+用法（在 backend/ 目錄下執行）：
+    python -m app.cli vote-tallies --check
+    python -m app.cli vote-tallies --rebuild
+    python -m app.cli timetable-occupancy --check
+    python -m app.cli timetable-occupancy --backfill
+    python -m app.cli upgrade-db
+    python -m app.cli init
+    python -m app.cli import-report
+    python -m app.cli serialization-bench
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from app.core.database import AsyncSessionLocal
+
+
+async def _vote_tallies(args: argparse.Namespace) -> int:
+    from app.services.event_service import check_vote_tallies, rebuild_vote_tallies
+
+    async with AsyncSessionLocal() as db:
+        if args.rebuild:
+            count = await rebuild_vote_tallies(db)
+            print(f"Rebuilt vote tallies for {count} events")
+            return 0
+
+        mismatches = await check_vote_tallies(db)
+        for m in mismatches:
+            print(f"{m['event_id']}: expected {m['expected']}, found {m['actual']}")
+        print(f"{len(mismatches)} inconsistent vote tallies")
+        return 1 if mismatches else 0
+
+
+async def _timetable_occupancy(args: argparse.Namespace) -> int:
+    from app.services.availability_service import backfill_occupancy, check_occupancy
+
+    async with AsyncSessionLocal() as db:
+        if args.backfill:
+            count = await backfill_occupancy(db)
+            print(f"Computed occupancy for {count} timetables")
+            return 0
+
+        mismatches = await check_occupancy(db)
+        for m in mismatches:
+            print(f"timetable {m['id']} ({m['user_id']}): expected {m['expected']}, found {m['actual']}")
+        print(f"{len(mismatches)} inconsistent timetable occupancy rows")
+        return 1 if mismatches else 0
+
+
+async def _upgrade_db(args: argparse.Namespace) -> int:
+    from app.core.migrations import current_revision, head_revision, upgrade_database
+
+    before = await current_revision()
+    await upgrade_database(args.revision)
+    after = await current_revision()
+    if before == after:
+        print(f"Database already at revision {after} (head: {head_revision()})")
+    else:
+        print(f"Upgraded database from {before or 'empty'} to {after}")
+    return 0
+
+
+async def _init(args: argparse.Namespace) -> int:
+    from app.core.startup import run_startup
+
+    ran = await run_startup(force=args.force)
+    print("Initialization complete" if ran else "Database already initialized")
+    return 0
+
+
+def _import_report(args: argparse.Namespace) -> int:
+    """以 python -X importtime 在新的 process 中 import 模組，統計冷啟動的 import 時間"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+        cwd=Path(__file__).resolve().parents[1],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        return result.returncode
+
+    # 每行格式：import time: self [us] | cumulative | imported package
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    total_us = sum(packages.values())
+
+    print(f"import {args.module}: {total_us / 1000:.1f}ms, {len(modules)} modules")
+    print(f"\nTop {args.top} packages (self time):")
+    for package, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {package}")
+    print(f"\nTop {args.top} app modules (cumulative):")
+    app_modules = [m for m in modules if m[0].startswith("app.")]
+    for name, _, cumulative_us in sorted(app_modules, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+    return 0
+
+
+def _serialization_samples(rows: int) -> dict:
+    """各端點回應格式的測試資料（與路由組出的 dict 相同）"""
+    from datetime import datetime, timedelta
+    from app.schemas.event import EventResponse
+    from app.schemas.room import RoomResponse, RoomAvailabilityResponse
+
+    now = datetime(2026, 10, 1, 12, 0, 0, 123456)
+    events = [
+        {
+            "id": f"event-{i:06d}",
+            "room_id": f"room-{i % 50:04d}",
+            "created_by": f"user-{i % 200:04d}",
+            "created_by_name": f"使用者 {i % 200}",
+            "title": f"期中考後聚餐 #{i}",
+            "description": "一起去逢甲夜市吃東西，時間再投票決定",
+            "category": "food",
+            "location": "逢甲夜市",
+            "public": 0,
+            "proposed_times": [
+                {"start": (now + timedelta(days=d)).isoformat(), "end": (now + timedelta(days=d, hours=2)).isoformat()}
+                for d in range(3)
+            ],
+            "start_time": None,
+            "end_time": None,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+            "vote_stats": {"yes": i % 7, "no": i % 3, "maybe": i % 5},
+            "attendees": []
+        }
+        for i in range(rows)
+    ]
+    rooms = [
+        {
+            "id": f"room-{i:04d}",
+            "name": f"資工三甲 {i}",
+            "owner_id": f"user-{i:04d}",
+            "owner_name": f"使用者 {i}",
+            "school": "逢甲大學",
+            "invite_code": "ABCD1234",
+            "created_at": now - timedelta(hours=i),
+            "updated_at": now - timedelta(hours=i),
+            "members": [{"user_id": f"user-{j:04d}", "name": f"使用者 {j}", "role": "member"} for j in range(8)]
+        }
+        for i in range(rows)
+    ]
+    availability = {
+        "room_id": "room-0000",
+        "member_count": 8,
+        "min_free": 6,
+        "slots": [
+            {"weekday": "monday", "period": str(i % 14 + 1), "start": "08:10", "end": "09:00", "free_count": 8, "busy_count": 0}
+            for i in range(min(rows, 98))
+        ]
+    }
+    return {
+        "GET /api/rooms/{id}/events": (EventResponse, events),
+        "GET /api/rooms": (RoomResponse, rooms),
+        "GET /api/rooms/{id}/availability": (RoomAvailabilityResponse, availability),
+    }
+
+
+async def _serialization_bench(args: argparse.Namespace) -> int:
+    """比較 FastAPI 預設的 response_model 驗證 + 編碼與 trusted_response 的耗時"""
+    import json
+    import time
+    from typing import List
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from app.core.serialization import orjson, trusted_response
+
+    print(f"{args.rows} rows, best of {args.repeat} runs, encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'endpoint':<36}{'response_model':>16}{'trusted':>12}{'speedup':>10}")
+    for endpoint, (model, data) in _serialization_samples(args.rows).items():
+        field = create_model_field(
+            name="bench_response",
+            type_=model if isinstance(data, dict) else List[model],
+            mode="serialization"
+        )
+
+        async def default_path() -> bytes:
+            content = await serialize_response(field=field, response_content=data)
+            return JSONResponse(content).body
+
+        def fast_path() -> bytes:
+            return trusted_response(model, data).body
+
+        if json.loads(await default_path()) != json.loads(fast_path()):
+            print(f"{endpoint}: output differs from the response_model path")
+            return 1
+
+        default_best = fast_best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            await default_path()
+            default_best = min(default_best, time.perf_counter() - start)
+            start = time.perf_counter()
+            fast_path()
+            fast_best = min(fast_best, time.perf_counter() - start)
+
+        print(f"{endpoint:<36}{default_best * 1000:>14.2f}ms{fast_best * 1000:>10.2f}ms{default_best / fast_best:>9.1f}x")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Jiu-Pluck backend commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    tallies = subparsers.add_parser("vote-tallies", help="Check or rebuild event_vote_tallies from event_votes")
+    mode = tallies.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true", help="Report inconsistent tallies (default)")
+    mode.add_argument("--rebuild", action="store_true", help="Recompute every tally from the raw votes")
+    tallies.set_defaults(handler=_vote_tallies)
+
+    occupancy = subparsers.add_parser("timetable-occupancy", help="Check or backfill timetables.busy_* from data_json")
+    mode = occupancy.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true", help="Report rows whose masks differ from data_json (default)")
+    mode.add_argument("--backfill", action="store_true", help="Compute masks for rows that do not have them yet")
+    occupancy.set_defaults(handler=_timetable_occupancy)
+
+    upgrade = subparsers.add_parser("upgrade-db", help="Apply Alembic migrations (run once before starting workers)")
+    upgrade.add_argument("revision", nargs="?", default="head", help="Target revision (default: head)")
+    upgrade.set_defaults(handler=_upgrade_db)
+
+    init = subparsers.add_parser("init", help="Run migrations and seed default data under the startup lock")
+    init.add_argument("--force", action="store_true", help="Run even if the database is already initialized")
+    init.set_defaults(handler=_init)
+
+    report = subparsers.add_parser("import-report", help="Show cold-start import time by package")
+    report.add_argument("--module", default="app.main", help="Module to import (default: app.main)")
+    report.add_argument("--top", type=int, default=15, help="Number of rows to show (default: 15)")
+    report.set_defaults(handler=_import_report)
+
+    bench = subparsers.add_parser("serialization-bench", help="Compare response_model validation with trusted_response")
+    bench.add_argument("--rows", type=int, default=500, help="Items per list response (default: 500)")
+    bench.add_argument("--repeat", type=int, default=20, help="Runs per endpoint, best is reported (default: 20)")
+    bench.set_defaults(handler=_serialization_bench)
+
+    args = parser.parse_args(argv)
+    if asyncio.iscoroutinefunction(args.handler):
+        return asyncio.run(args.handler(args))
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
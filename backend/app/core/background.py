@@ -0,0 +1,74 @@
+import asyncio
+import random
+from typing import Optional
+
+
+def backoff_delay(attempts: int, base: float = 2.0, cap: float = 300.0) -> float:
+    """指數退避（含 50%~100% 隨機抖動），attempts 為已失敗次數"""
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class BackgroundWorker:
+    """
+    在 event loop 中輪詢執行的背景工作。
+
+    子類別實作 run_once()，回傳本輪處理的筆數；有處理到資料就立刻再跑一輪，
+    否則等待 poll_interval 秒或直到 wake() 被呼叫。
+    start() / stop() 由 app.main 的 startup / shutdown 事件呼叫。
+    """
+
+    name = "worker"
+
+    def __init__(self, poll_interval: float):
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+
+    def wake(self) -> None:
+        """有新工作時呼叫，讓 worker 不必等到下一次輪詢"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_once(self) -> int:
+        raise NotImplementedError
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                print(f"[{self.name}] {e}")
+                processed = 0
+
+            if processed:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
@@ -9,8 +9,39 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # 已驗證使用者快取（get_current_user），TTL 設為 0 可停用
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+
+    # 已通過課表模板的快取：TTL 內不查詢資料庫，過期後比對版本，0 表示每次都比對版本
+    TIMETABLE_TEMPLATE_CACHE_TTL_SECONDS: float = 5.0
+
+    # 公開活動列表（非管理員）的回應快取，TTL 設為 0 可停用
+    PUBLIC_EVENTS_CACHE_TTL_SECONDS: float = 10.0
+    PUBLIC_EVENTS_CACHE_MAX_SIZE: int = 256
+
+    # 課表節次時間的時區（活動候選時間以 UTC 儲存，評分時換算到此時區對照節次）
+    TIMETABLE_TIMEZONE: str = "Asia/Taipei"
+
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./app.db"
+    DB_AUTO_MIGRATE: bool = True  # 啟動時執行 migration（多個 worker 由啟動鎖確保只執行一次）
+    STARTUP_LOCK_TIMEOUT_SECONDS: float = 120.0  # 等待其他 worker 完成啟動初始化的上限
+    DB_ECHO: bool = False  # 印出所有 SQL（僅除錯時開啟）
+    DB_SLOW_QUERY_MS: float = 200.0  # 超過此毫秒數的 SQL 印出 [slow-query]，0 停用
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # PostgreSQL：定期更換連線，避免被伺服器或防火牆切斷
+    DB_STATEMENT_CACHE_SIZE: int = 100  # PostgreSQL（asyncpg）每條連線的 prepared statement 快取
+
+    # SQLite 連線設定（每條連線建立時以 PRAGMA 套用）
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 等待寫入鎖的時間，避免 "database is locked"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_CACHE_SIZE_KB: int = 65536  # 每條連線的 page cache（64 MiB）
+    SQLITE_MMAP_SIZE_BYTES: int = 268435456  # 256 MiB，0 停用
 
     # SMTP
     SMTP_HOST: Optional[str] = None
@@ -20,6 +51,27 @@ class Settings(BaseSettings):
     SMTP_FROM: Optional[str] = None
     SMTP_USE_TLS: bool = True
     SMTP_USE_SSL: bool = False  # 使用 SSL 直連（port 465），否則使用 STARTTLS（port 587）
+    SMTP_POOL_SIZE: int = 4  # 同時保持的 SMTP 連線數
+    SMTP_POOL_IDLE_TIMEOUT_SECONDS: float = 60.0  # 閒置超過此時間的連線重新建立
+
+    # Email 佇列（背景 dispatcher）
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_CONCURRENCY: int = 4  # 同時使用的 SMTP 連線數，不超過 SMTP_POOL_SIZE
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_POLL_INTERVAL_SECONDS: float = 2.0
+    EMAIL_JOB_RETENTION_DAYS: int = 1
+
+    # Discord 通知 outbox（背景 dispatcher）
+    NOTIFICATION_BATCH_SIZE: int = 50
+    NOTIFICATION_CONCURRENCY: int = 8
+    NOTIFICATION_MAX_ATTEMPTS: int = 6
+    NOTIFICATION_POLL_INTERVAL_SECONDS: float = 2.0
+    NOTIFICATION_RETENTION_DAYS: int = 7
+
+    # Discord webhook HTTP client
+    DISCORD_TIMEOUT_SECONDS: float = 5.0
+    DISCORD_MAX_CONNECTIONS: int = 20
+    DISCORD_MAX_RATE_LIMIT_WAIT_SECONDS: float = 2.0  # 429 時願意原地等待的上限，超過就交給 outbox 延後
 
     # Google Calendar
     GOOGLE_CLIENT_ID: Optional[str] = None
@@ -27,6 +79,36 @@ class Settings(BaseSettings):
     GOOGLE_REDIRECT_URI: str = "http://localhost:8000/api/calendar/google/callback"
     GOOGLE_CALENDAR_SCOPES: str = "https://www.googleapis.com/auth/calendar.events https://www.googleapis.com/auth/calendar.readonly"
 
+    # 行事曆忙碌時段快取：同時向行事曆查詢的數量、新鮮度、每次取得的天數，
+    # 閒置超過 CALENDAR_BUSY_IDLE_SECONDS 的快取不再背景更新並會刪除
+    CALENDAR_FREEBUSY_CONCURRENCY: int = 8
+    CALENDAR_BUSY_CACHE_TTL_SECONDS: float = 300.0
+    CALENDAR_BUSY_WINDOW_DAYS: int = 14
+    CALENDAR_BUSY_IDLE_SECONDS: float = 86400.0
+    CALENDAR_BUSY_REFRESH_BATCH_SIZE: int = 50
+    CALENDAR_BUSY_REFRESH_INTERVAL_SECONDS: float = 30.0
+
+    # 行事曆事件鏡像（calendar_mirror_events）：以 syncToken / ctag / etag 增量更新，
+    # 重複事件在過去 CALENDAR_MIRROR_PAST_DAYS 天到未來 CALENDAR_MIRROR_DAYS 天內展開
+    CALENDAR_MIRROR_DAYS: int = 90
+    CALENDAR_MIRROR_PAST_DAYS: int = 7
+
+    # 背景同步活動到行事曆（calendar_sync_jobs）
+    CALENDAR_SYNC_BATCH_SIZE: int = 50
+    CALENDAR_SYNC_CONCURRENCY: int = 4  # 每個 provider 同時進行的 API 呼叫數
+    CALENDAR_SYNC_MAX_ATTEMPTS: int = 5
+    CALENDAR_SYNC_POLL_INTERVAL_SECONDS: float = 5.0
+    CALENDAR_SYNC_DEBOUNCE_SECONDS: float = 2.0  # 延後執行，期間的連續修改合併為一次同步
+    CALENDAR_SYNC_RETENTION_DAYS: int = 7
+
+    # Apple Calendar（CalDAV）：每個使用者的 session 重用連線與探索結果
+    APPLE_CALENDAR_ENABLED: bool = True  # 關閉後不提供 Apple Calendar 整合
+    APPLE_CALDAV_URL: str = "https://caldav.icloud.com/"
+    APPLE_CALDAV_TIMEOUT_SECONDS: float = 15.0
+    APPLE_CALDAV_MAX_SESSIONS: int = 256
+    APPLE_CALDAV_SESSION_IDLE_SECONDS: float = 600.0
+    APPLE_CALDAV_DISCOVERY_TTL_SECONDS: float = 3600.0  # principal / 行事曆列表的快取時間
+
     # Admin Account (no password needed, uses OTP login)
     ADMIN_EMAIL: Optional[str] = None
 
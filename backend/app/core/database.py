@@ -1,12 +1,74 @@
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import event, DateTime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=True,
-    future=True
-)
+
+def _engine_options(url: str) -> dict:
+    """依 DATABASE_URL 組出 create_async_engine 的參數"""
+    options = {
+        "echo": settings.DB_ECHO,
+        "future": True,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    # SQLite 記憶體資料庫只能有一條連線，不套用連線池大小
+    database = make_url(url).database
+    if not (url.startswith("sqlite") and database in (None, "", ":memory:")):
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+        options["pool_timeout"] = settings.DB_POOL_TIMEOUT_SECONDS
+
+    if url.startswith("postgresql+asyncpg"):
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE_SECONDS
+        options["connect_args"] = {
+            # 每條連線快取的 prepared statement 數；經過 PgBouncer transaction 模式時需設為 0
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {"application_name": "jiu-pluck", "timezone": "UTC"},
+        }
+
+    return options
+
+
+engine = create_async_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        每條新連線套用 SQLite 設定：
+        - WAL：讀寫不互相阻擋，多個 uvicorn worker 同時寫入時等待鎖而不是直接 "database is locked"
+        - busy_timeout：等待寫入鎖的毫秒數
+        - synchronous=NORMAL：WAL 模式下安全且少一次 fsync
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE_KB) * -1}")  # 負數代表 KiB
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_BYTES)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+if settings.DB_SLOW_QUERY_MS > 0:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+        if elapsed_ms >= settings.DB_SLOW_QUERY_MS:
+            print(f"[slow-query] {elapsed_ms:.1f}ms: {' '.join(statement.split())[:500]}")
+
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -17,6 +79,59 @@ AsyncSessionLocal = async_sessionmaker(
 Base = declarative_base()
 
 
+class UTCDateTime(TypeDecorator):
+    """
+    時間欄位：程式內一律使用 naive UTC（datetime.utcnow()）。
+    - PostgreSQL（timestamptz）：寫入時補上 UTC 時區，讀出時轉回 naive UTC
+    - SQLite：照舊存成字串，不改變既有資料的格式；有時區的值先轉為 UTC（否則只會存下當地時間）
+    """
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[datetime], dialect):
+        if value is None:
+            return value
+        if dialect.name == "sqlite":
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        elif value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+    def process_result_value(self, value: Optional[datetime], dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+def upsert(
+    db: AsyncSession,
+    table,
+    values: Dict,
+    index_elements: List[str],
+    update_columns: Optional[List[str]] = None,
+    update_values: Optional[Dict] = None
+):
+    """
+    INSERT ... ON CONFLICT 語句（SQLite / PostgreSQL）。
+    update_columns 與 update_values 都為空時衝突即略過（DO NOTHING），
+    否則以新值更新 update_columns，並以 update_values 的運算式更新其他欄位（例如計數加一）。
+    """
+    dialect = db.bind.dialect.name
+    if dialect == "sqlite":
+        stmt = sqlite.insert(table).values(**values)
+    elif dialect == "postgresql":
+        stmt = postgresql.insert(table).values(**values)
+    else:
+        raise NotImplementedError(f"upsert is not supported for {dialect}")
+
+    if not update_columns and not update_values:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    set_ = {column: stmt.excluded[column] for column in update_columns or []}
+    set_.update(update_values or {})
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+
 async def get_db():
     """Dependency for getting database session"""
     async with AsyncSessionLocal() as session:
@@ -24,4 +139,3 @@ async def get_db():
             yield session
         finally:
             await session.close()
-
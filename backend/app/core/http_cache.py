@@ -0,0 +1,36 @@
+"""
+HTTP 條件式 GET（ETag / Last-Modified）的共用判斷
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request
+
+
+def http_date(value: datetime) -> str:
+    """naive UTC datetime 轉為 Last-Modified 使用的 HTTP 日期格式"""
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    依 If-None-Match / If-Modified-Since 判斷是否回傳 304。
+    有 If-None-Match 時只比對 ETag（RFC 9110），否則才比對 If-Modified-Since（秒為單位）。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
@@ -0,0 +1,54 @@
+"""
+資料庫 schema 管理（Alembic）
+
+schema 由 backend/migrations 中的 migration 定義，請在啟動 worker 之前執行一次：
+    python -m app.cli upgrade-db
+
+0001 以 IF NOT EXISTS 建立資料表與索引，所以舊版啟動時以 create_all 建立的資料庫
+也可以直接升級，不需要另外 stamp。
+"""
+from pathlib import Path
+from typing import Optional
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from app.core.database import Base, engine
+
+# 載入所有 model，讓 Base.metadata 完整（autogenerate 比對用）
+from app.models import user, room, event, timetable, calendar_integration, notification, email_job, app_state  # noqa: F401
+
+target_metadata = Base.metadata
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def alembic_config() -> Config:
+    """backend/alembic.ini 的設定（不論目前工作目錄在哪裡）"""
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    return config
+
+
+def head_revision() -> Optional[str]:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+async def current_revision() -> Optional[str]:
+    """資料庫目前的 migration 版本（尚未初始化時為 None）"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(
+            lambda sync_conn: MigrationContext.configure(sync_conn).get_current_revision()
+        )
+
+
+async def upgrade_database(revision: str = "head") -> None:
+    """把資料庫升級到指定版本"""
+    def run(sync_conn) -> None:
+        config = alembic_config()
+        config.attributes["connection"] = sync_conn
+        config.attributes["configure_logger"] = False
+        command.upgrade(config, revision)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(run)
@@ -0,0 +1,112 @@
+"""
+Keyset（cursor）分頁
+
+排序鍵必須是不為 NULL 的欄位組合，最後一個通常是主鍵以確保順序穩定，
+例如 (start_time, id)、(created_at, id)。游標是排序鍵值的 base64 JSON，
+對 client 來說是不透明字串。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from sqlalchemy import String, and_, or_, type_coerce
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(tag: str, values: Sequence[Any]) -> str:
+    """把排序鍵值編碼成游標，tag 用來區分不同的排序方式"""
+    items = [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps([tag, items], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, tag: str, key_count: int) -> List[Any]:
+    """解碼游標，格式錯誤或排序方式不符時丟出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_tag, items = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if cursor_tag != tag or not isinstance(items, list) or len(items) != key_count:
+        raise ValueError("Invalid cursor")
+
+    return [
+        datetime.fromisoformat(v["dt"]) if isinstance(v, dict) and "dt" in v else v
+        for v in items
+    ]
+
+
+def _bind(value: Any):
+    # SQLite 把時間存成字串，而且 server_default 與 Python 寫入的格式不同
+    # （有無微秒），所以游標直接保存資料庫裡的原始字串，並以字串比較。
+    # PostgreSQL 取回的是 datetime，會以 {"dt": ...} 編碼並以時間比較
+    if isinstance(value, str):
+        return type_coerce(value, String)
+    return value
+
+
+def _after(keys: Sequence, values: Sequence[Any], descending: bool):
+    """(k1, k2, ...) 在 (v1, v2, ...) 之後；展開成 OR/AND 以相容各種資料庫"""
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        equals = [keys[j] == _bind(values[j]) for j in range(i)]
+        compare = key < _bind(value) if descending else key > _bind(value)
+        clauses.append(and_(*equals, compare))
+    return or_(*clauses)
+
+
+def paginate_query(
+    query,
+    keys: Sequence,
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = False,
+    tag: str = ""
+):
+    """
+    為查詢加上游標條件、排序與 limit + 1。
+    排序鍵會以字串型別附加在每一列的最後面，交給 split_page 產生下一頁游標。
+    """
+    query = query.add_columns(
+        *[type_coerce(key, String).label(f"_cursor_{i}") for i, key in enumerate(keys)]
+    )
+    if cursor:
+        query = query.where(_after(keys, decode_cursor(cursor, tag, len(keys)), descending))
+
+    order = [key.desc() if descending else key.asc() for key in keys]
+    return query.order_by(*order).limit(limit + 1)
+
+
+def split_page(rows: Sequence, key_count: int, limit: int, tag: str = "") -> Tuple[List, Optional[str]]:
+    """
+    拆出本頁資料與下一頁游標。
+    回傳的每一列去掉排序鍵；只有一個欄位時直接回傳該欄位（例如 ORM 物件）。
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(tag, list(rows[-1][-key_count:]))
+
+    items = []
+    for row in rows:
+        values = tuple(row[:-key_count])
+        items.append(values[0] if len(values) == 1 else values)
+
+    return items, next_cursor
+
+
+async def fetch_page(
+    db,
+    query,
+    keys: Sequence,
+    cursor: Optional[str],
+    limit: int,
+    descending: bool = False,
+    tag: str = ""
+) -> Tuple[List, Optional[str]]:
+    """執行分頁查詢，回傳 (本頁資料, 下一頁游標)"""
+    result = await db.execute(paginate_query(query, keys, cursor, limit, descending, tag))
+    return split_page(result.all(), len(keys), limit, tag)
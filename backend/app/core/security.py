@@ -6,9 +6,22 @@ from cryptography.fernet import Fernet
 import base64
 import hashlib
 from app.core.config import settings
+from app.core.cache import TTLCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# 已驗證使用者快取：user_id -> User 欄位值（由 api.deps.get_current_user 使用）
+# 修改 is_active / is_admin / email_verified 或刪除使用者後需呼叫 invalidate_principal
+principal_cache = TTLCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_principal(user_id: str) -> None:
+    """使某位使用者的快取失效"""
+    principal_cache.invalidate(user_id)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """驗證密碼"""
@@ -0,0 +1,95 @@
+"""
+快速回應序列化
+
+路由回傳 dict 時，FastAPI 會再以 response_model 驗證一次並轉為 JSON；
+對於由資料庫資料直接組出、格式已確定的 dict，這一步只是重複工作。
+trusted_response() 依 response_model 的欄位順序整理 dict（補上預設值、去掉多餘的 key），
+不做驗證，直接以 orjson（未安裝時使用標準 json）編碼。
+
+路由仍保留 response_model=...，OpenAPI 文件不變。
+只在資料格式確定時使用；使用者輸入或第三方資料請照常讓 FastAPI 驗證。
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple, Type
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_MISSING = object()
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime) and value.utcoffset() == timedelta(0):
+        # 與 pydantic 相同：UTC 時間以 Z 結尾
+        return value.replace(tzinfo=None).isoformat() + "Z"
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """編碼為 JSON bytes（與 FastAPI 預設輸出相同的格式，不含多餘空白）"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _model_fields(model: Type[BaseModel]) -> Tuple[Tuple[str, Any], ...]:
+    """model 的欄位名稱與預設值（必填欄位為 _MISSING）"""
+    return tuple(
+        (name, _MISSING if field.is_required() else field)
+        for name, field in model.model_fields.items()
+    )
+
+
+def project(model: Type[BaseModel], data: Mapping[str, Any]) -> Dict[str, Any]:
+    """依 model 的欄位整理 dict，不驗證型別；缺少必填欄位時拋出 KeyError"""
+    result = {}
+    for name, field in _model_fields(model):
+        if name in data:
+            result[name] = data[name]
+        elif field is _MISSING:
+            raise KeyError(f"{model.__name__}.{name} is required")
+        else:
+            result[name] = field.get_default(call_default_factory=True)
+    return result
+
+
+def trusted_response(
+    model: Type[BaseModel],
+    data: Any,
+    headers: Optional[Dict[str, str]] = None,
+    status_code: int = 200
+) -> FastJSONResponse:
+    """以 model 的格式回傳 dict 或 dict 的列表，不經過 response_model 驗證"""
+    if isinstance(data, Mapping):
+        content = project(model, data)
+    else:
+        content = [project(model, item) for item in data]
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+
+def encode_many(model: Type[BaseModel], items: Iterable[Mapping[str, Any]]) -> bytes:
+    """依 model 的格式編碼 dict 列表（供需要快取 JSON bytes 的地方使用）"""
+    return dumps([project(model, item) for item in items])
+
@@ -0,0 +1,291 @@
+"""
+啟動初始化（migration、建立 admin 帳號與預設課表模板、補上課表佔用遮罩）
+
+多個 uvicorn worker 同時啟動時，每個 worker 都會呼叫 run_startup()：
+1. 先檢查資料庫的 migration 版本與 app_state 中記錄的初始化版本，
+   都和目前程式一致就直接跳過（重新啟動時的一般情況）
+2. 否則取得跨 process 的啟動鎖（PostgreSQL advisory lock / SQLite 旁的 lock 檔），
+   取得後再檢查一次，仍需要才執行初始化，最後寫入初始化版本
+
+每個階段花費的時間會印成一行 [startup]。
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine, upsert
+from app.core.migrations import current_revision, head_revision, upgrade_database
+from app.models.app_state import AppState
+from app.models.timetable import TimetableTemplate
+from app.models.user import User
+from app.services.availability_service import backfill_occupancy
+from app.services.timetable_service import bump_templates_version, invalidate_template_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 預設資料有變動時加一，讓已初始化的資料庫重新執行一次
+SEED_VERSION = 2
+
+STARTUP_STATE_KEY = "startup"
+
+# pg_advisory_lock 的 key（任意固定值，同一個資料庫內不可與其他用途重複）
+ADVISORY_LOCK_KEY = 0x4A69755F5374
+
+# 逢甲大學一般學期的14個節次
+DEFAULT_TEMPLATE_SCHOOL = "逢甲大學"
+DEFAULT_TEMPLATE_NAME = "一般學期"
+DEFAULT_TEMPLATE_PERIODS = [
+    {"name": "1", "start": "08:10", "end": "09:00"},
+    {"name": "2", "start": "09:10", "end": "10:00"},
+    {"name": "3", "start": "10:10", "end": "11:00"},
+    {"name": "4", "start": "11:10", "end": "12:00"},
+    {"name": "5", "start": "12:10", "end": "13:00"},
+    {"name": "6", "start": "13:10", "end": "14:00"},
+    {"name": "7", "start": "14:10", "end": "15:00"},
+    {"name": "8", "start": "15:10", "end": "16:00"},
+    {"name": "9", "start": "16:10", "end": "17:00"},
+    {"name": "10", "start": "17:10", "end": "18:00"},
+    {"name": "11", "start": "18:30", "end": "19:20"},
+    {"name": "12", "start": "19:25", "end": "20:15"},
+    {"name": "13", "start": "20:25", "end": "21:15"},
+    {"name": "14", "start": "21:20", "end": "22:10"},
+]
+
+
+class StartupTimer:
+    """記錄每個啟動階段花費的時間"""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        self._started = time.perf_counter()
+
+    @asynccontextmanager
+    async def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, (time.perf_counter() - start) * 1000))
+
+    def summary(self) -> str:
+        total = (time.perf_counter() - self._started) * 1000
+        parts = ", ".join(f"{name} {ms:.1f}ms" for name, ms in self.phases)
+        return f"{parts} (total {total:.1f}ms)"
+
+
+def startup_fingerprint(revision: Optional[str]) -> str:
+    """初始化完成後記錄的版本：schema 版本、預設資料版本與 admin email"""
+    return f"{revision}:{SEED_VERSION}:{settings.ADMIN_EMAIL or ''}"
+
+
+async def _initialized() -> bool:
+    """資料庫已在目前版本完成初始化（任何錯誤都視為尚未初始化）"""
+    try:
+        revision = await current_revision()
+        if revision != head_revision():
+            return False
+        async with AsyncSessionLocal() as db:
+            state = await db.get(AppState, STARTUP_STATE_KEY)
+        return state is not None and state.value == startup_fingerprint(revision)
+    except SQLAlchemyError:
+        return False
+
+
+def _lock_file_path() -> Optional[str]:
+    """SQLite 檔案資料庫旁的 lock 檔；記憶體資料庫只有單一 process，不需要鎖"""
+    database = make_url(settings.DATABASE_URL).database
+    if database in (None, "", ":memory:"):
+        return None
+    return f"{database}.startup.lock"
+
+
+@asynccontextmanager
+async def startup_lock(timeout: float):
+    """
+    跨 process 的啟動鎖，timeout 秒內取不到就拋出 TimeoutError。
+    - PostgreSQL：session 層級的 advisory lock（多台主機也有效）
+    - SQLite：對資料庫旁的 lock 檔 flock（同一台主機的 worker）
+    """
+    deadline = time.monotonic() + timeout
+
+    if engine.dialect.name == "postgresql":
+        async with engine.connect() as conn:
+            while not (await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            )).scalar():
+                if time.monotonic() >= deadline:
+                    raise TimeoutError("Timed out waiting for the startup advisory lock")
+                await asyncio.sleep(0.2)
+            await conn.commit()
+            try:
+                yield
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                await conn.commit()
+        return
+
+    path = _lock_file_path() if engine.dialect.name == "sqlite" else None
+    if path is None or fcntl is None:
+        yield
+        return
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for {path}")
+                await asyncio.sleep(0.2)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+async def seed_admin_user() -> None:
+    """建立 ADMIN_EMAIL 的管理員帳號（不需要密碼，使用 OTP 登入）"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.email == settings.ADMIN_EMAIL))
+        admin_user = result.scalar_one_or_none()
+
+        if not admin_user:
+            db.add(User(
+                id=str(uuid.uuid4()),
+                email=settings.ADMIN_EMAIL,
+                password_hash="",  # No password, uses OTP
+                name="Admin",
+                is_active=1,
+                email_verified=1,  # Admin email is pre-verified
+                is_admin=1  # 設定為管理員
+            ))
+            await db.commit()
+            print(f"Admin account created: {settings.ADMIN_EMAIL}")
+        else:
+            # Ensure admin email is verified and is_admin is set
+            if not admin_user.email_verified:
+                admin_user.email_verified = 1
+            if not admin_user.is_admin:
+                admin_user.is_admin = 1
+            await db.commit()
+            print(f"Admin account already exists: {settings.ADMIN_EMAIL}")
+
+
+async def seed_default_templates() -> None:
+    """
+    建立預設課表模板：逢甲大學 - 一般學期。
+    舊版多個 worker 同時啟動可能建立了重複的系統預設模板，只保留最早的一筆。
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(TimetableTemplate)
+            .where(
+                TimetableTemplate.school == DEFAULT_TEMPLATE_SCHOOL,
+                TimetableTemplate.name == DEFAULT_TEMPLATE_NAME
+            )
+            .order_by(TimetableTemplate.id)
+        )
+        existing = result.scalars().all()
+
+        if existing:
+            duplicates = [t for t in existing if t.created_by is None][1:]
+            for template in duplicates:
+                await db.delete(template)
+            if duplicates:
+                await bump_templates_version(db)
+            await db.commit()
+            if duplicates:
+                print(f"Removed {len(duplicates)} duplicate default timetable templates")
+            print(f"Default timetable template already exists: {DEFAULT_TEMPLATE_SCHOOL} - {DEFAULT_TEMPLATE_NAME}")
+            return
+
+        now = datetime.utcnow()
+        db.add(TimetableTemplate(
+            school=DEFAULT_TEMPLATE_SCHOOL,
+            name=DEFAULT_TEMPLATE_NAME,
+            periods_json=json.dumps(DEFAULT_TEMPLATE_PERIODS),
+            created_by=None,  # NULL 表示系統預設
+            status="approved",  # 系統預設模板直接通過
+            submitted_at=now,
+            reviewed_at=now,
+            reviewed_by=None  # 系統預設不需要審核者
+        ))
+        await bump_templates_version(db)
+        await db.commit()
+        print(f"Default timetable template created: {DEFAULT_TEMPLATE_SCHOOL} - {DEFAULT_TEMPLATE_NAME}")
+
+
+async def _record_initialized(revision: Optional[str]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(upsert(
+            db,
+            AppState.__table__,
+            {"key": STARTUP_STATE_KEY, "value": startup_fingerprint(revision), "updated_at": datetime.utcnow()},
+            index_elements=["key"],
+            update_columns=["value", "updated_at"]
+        ))
+        await db.commit()
+
+
+async def run_startup(migrate: bool = True, force: bool = False) -> bool:
+    """
+    執行一次性的啟動初始化，回傳是否實際執行（False 表示已初始化而跳過）。
+    migrate=False 時不執行 migration（schema 需已由 python -m app.cli upgrade-db 升級）。
+    """
+    timer = StartupTimer()
+    try:
+        async with timer.phase("check"):
+            ready = not force and await _initialized()
+        if ready:
+            return False
+
+        async with AsyncExitStack() as stack:
+            async with timer.phase("lock"):
+                await stack.enter_async_context(startup_lock(settings.STARTUP_LOCK_TIMEOUT_SECONDS))
+
+            # 等待鎖的期間可能已由其他 worker 完成
+            async with timer.phase("recheck"):
+                ready = not force and await _initialized()
+            if ready:
+                return False
+
+            if migrate:
+                async with timer.phase("migrate"):
+                    await upgrade_database()
+
+            revision = await current_revision()
+            if revision != head_revision():
+                print(f"[startup] database is at revision {revision}, expected {head_revision()}; "
+                      "run python -m app.cli upgrade-db")
+
+            if settings.ADMIN_EMAIL:
+                async with timer.phase("seed-admin"):
+                    await seed_admin_user()
+            async with timer.phase("seed-templates"):
+                await seed_default_templates()
+                invalidate_template_cache()
+            if revision == head_revision():
+                async with timer.phase("backfill-occupancy"):
+                    async with AsyncSessionLocal() as db:
+                        await backfill_occupancy(db)
+
+            if revision == head_revision():
+                await _record_initialized(revision)
+            return True
+    finally:
+        print(f"[startup] {timer.summary()}")
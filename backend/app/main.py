@@ -1,14 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import auth, users, timetable, rooms, events, webhooks, calendar_google, calendar_apple, admin
-from app.core.database import engine, Base, AsyncSessionLocal
 from app.core.config import settings
-from app.models.user import User
-from app.models.timetable import TimetableTemplate
-from sqlalchemy import select
-import uuid
-import json
-from datetime import datetime
+from app.core.startup import run_startup
+from app.services.calendar_service import preload_calendar_providers
+from app.services.calendar_busy_store import calendar_busy_store
+from app.services.calendar_sync import calendar_sync_worker
+from app.services.caldav_client import caldav_sessions
+from app.services.notification_outbox import notification_dispatcher
+from app.services.discord_service import close_client as close_discord_client
+from app.services.email_service import smtp_pool
+from app.services.email_queue import email_dispatcher
 
 app = FastAPI(title="Jiu-Pluck API", version="1.0.0")
 
@@ -19,6 +21,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -35,89 +38,32 @@ app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 @app.on_event("startup")
 async def startup():
-    # Create tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
-    # Create admin account if configured
-    if settings.ADMIN_EMAIL:
-        async with AsyncSessionLocal() as db:
-            # Check if admin user already exists
-            result = await db.execute(select(User).where(User.email == settings.ADMIN_EMAIL))
-            admin_user = result.scalar_one_or_none()
-            
-            if not admin_user:
-                # Create admin user (no password needed, uses OTP)
-                admin_id = str(uuid.uuid4())
-                
-                admin_user = User(
-                    id=admin_id,
-                    email=settings.ADMIN_EMAIL,
-                    password_hash="",  # No password, uses OTP
-                    name="Admin",
-                    is_active=1,
-                    email_verified=1,  # Admin email is pre-verified
-                    is_admin=1  # 設定為管理員
-                )
-                
-                db.add(admin_user)
-                await db.commit()
-                print(f"Admin account created: {settings.ADMIN_EMAIL}")
-            else:
-                # Ensure admin email is verified and is_admin is set
-                if not admin_user.email_verified:
-                    admin_user.email_verified = 1
-                if not admin_user.is_admin:
-                    admin_user.is_admin = 1
-                await db.commit()
-                print(f"Admin account already exists: {settings.ADMIN_EMAIL}")
-    
-    # Create default timetable template: 逢甲大學 - 一般學期
-    async with AsyncSessionLocal() as db:
-        result = await db.execute(
-            select(TimetableTemplate).where(
-                TimetableTemplate.school == "逢甲大學",
-                TimetableTemplate.name == "一般學期"
-            )
-        )
-        existing_template = result.scalar_one_or_none()
-        
-        if not existing_template:
-            # 逢甲大學一般學期的14個節次
-            default_periods = [
-                {"name": "1", "start": "08:10", "end": "09:00"},
-                {"name": "2", "start": "09:10", "end": "10:00"},
-                {"name": "3", "start": "10:10", "end": "11:00"},
-                {"name": "4", "start": "11:10", "end": "12:00"},
-                {"name": "5", "start": "12:10", "end": "13:00"},
-                {"name": "6", "start": "13:10", "end": "14:00"},
-                {"name": "7", "start": "14:10", "end": "15:00"},
-                {"name": "8", "start": "15:10", "end": "16:00"},
-                {"name": "9", "start": "16:10", "end": "17:00"},
-                {"name": "10", "start": "17:10", "end": "18:00"},
-                {"name": "11", "start": "18:30", "end": "19:20"},
-                {"name": "12", "start": "19:25", "end": "20:15"},
-                {"name": "13", "start": "20:25", "end": "21:15"},
-                {"name": "14", "start": "21:20", "end": "22:10"},
-            ]
-            
-            now = datetime.utcnow()
-            default_template = TimetableTemplate(
-                school="逢甲大學",
-                name="一般學期",
-                periods_json=json.dumps(default_periods),
-                created_by=None,  # NULL 表示系統預設
-                status="approved",  # 系統預設模板直接通過
-                submitted_at=now,
-                reviewed_at=now,
-                reviewed_by=None  # 系統預設不需要審核者
-            )
-            
-            db.add(default_template)
-            await db.commit()
-            print("Default timetable template created: 逢甲大學 - 一般學期")
-        else:
-            print("Default timetable template already exists: 逢甲大學 - 一般學期")
+    # migration 與預設資料：多個 worker 時只有取得啟動鎖的一個執行，已初始化則直接跳過
+    await run_startup(migrate=settings.DB_AUTO_MIGRATE)
+
+    # 有設定的行事曆整合先載入，其餘第一次使用時才 import
+    providers = preload_calendar_providers()
+    print(f"Calendar providers: {', '.join(providers) or 'none'}")
+
+    # 背景送出 Discord 通知
+    notification_dispatcher.start()
+    # 背景寄送驗證碼 email
+    email_dispatcher.start()
+    # 背景更新過期的行事曆忙碌時段快取
+    calendar_busy_store.start()
+    # 背景同步活動到行事曆
+    calendar_sync_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await notification_dispatcher.stop()
+    await email_dispatcher.stop()
+    await calendar_busy_store.stop()
+    await calendar_sync_worker.stop()
+    await close_discord_client()
+    await caldav_sessions.close()
+    await smtp_pool.close()
 
 
 @app.get("/")
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, Text
+from app.core.database import Base, UTCDateTime
+
+
+class AppState(Base):
+    """
+    系統層級的 key/value 狀態，例如啟動初始化完成時記錄的版本（app.core.startup），
+    之後重新啟動的 worker 比對相同就跳過初始化。
+    """
+    __tablename__ = "app_state"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    updated_at = Column(UTCDateTime, nullable=False)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Index
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, UTCDateTime
 
 
 class GoogleToken(Base):
@@ -9,7 +9,7 @@ class GoogleToken(Base):
     user_id = Column(String, primary_key=True)
     access_token = Column(Text, nullable=False)
     refresh_token = Column(Text, nullable=False)
-    token_expiry = Column(DateTime(timezone=True), nullable=False)
+    token_expiry = Column(UTCDateTime, nullable=False)
 
 
 class AppleCalendarCredential(Base):
@@ -18,7 +18,47 @@ class AppleCalendarCredential(Base):
     user_id = Column(String, primary_key=True)
     apple_id_email = Column(String, nullable=False)
     encrypted_app_password = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
+
+
+class CalendarMirrorCollection(Base):
+    """
+    行事曆鏡像的增量同步狀態：每個使用者、provider、遠端行事曆一列。
+    Google 記錄 events.list 的 syncToken；Apple 記錄 CalDAV sync-collection 的 sync-token 與 ctag。
+    window 為鏡像展開重複事件的範圍。
+    """
+    __tablename__ = "calendar_mirror_collections"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    provider = Column(String, primary_key=True)  # 'google' | 'apple'
+    collection_id = Column(String, primary_key=True)  # Google calendarId / CalDAV 行事曆 URL
+    sync_token = Column(Text, nullable=True)
+    ctag = Column(String, nullable=True)  # 行事曆沒有變動時 ctag 不變，不需要送 sync 請求
+    window_start = Column(UTCDateTime, nullable=False)
+    window_end = Column(UTCDateTime, nullable=False)
+    synced_at = Column(UTCDateTime, nullable=False)
+
+
+class CalendarMirrorEvent(Base):
+    """
+    遠端行事曆事件的鏡像：每個事件的每個忙碌時段一列。
+    沒有忙碌時段的事件（透明、已取消、不在範圍內）也保留一列 start_time / end_time 為 NULL 的記錄，
+    etag 沒有變動就不重新下載。
+    """
+    __tablename__ = "calendar_mirror_events"
+    __table_args__ = (
+        Index("ix_calendar_mirror_events_user_id_provider_start_time", "user_id", "provider", "start_time"),
+        Index("ix_calendar_mirror_events_user_id_provider_collection_id_resource_id", "user_id", "provider", "collection_id", "resource_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    provider = Column(String, nullable=False)
+    collection_id = Column(String, nullable=False)
+    resource_id = Column(String, nullable=False)  # Google event id / CalDAV 事件 URL
+    etag = Column(String, nullable=True)
+    start_time = Column(UTCDateTime, nullable=True)
+    end_time = Column(UTCDateTime, nullable=True)
 
 
 class CalendarEvent(Base):
@@ -29,3 +69,59 @@ class CalendarEvent(Base):
     provider = Column(String, primary_key=True)  # 'google' | 'apple'
     external_event_id = Column(String, nullable=False)
 
+
+
+class CalendarSyncJob(Base):
+    """
+    待同步到行事曆的活動：每個活動、使用者、provider 一列，尚未執行的動作合併為最後的狀態。
+    由背景的 calendar_sync_worker 執行，完成後對應記錄在 calendar_events。
+    """
+    __tablename__ = "calendar_sync_jobs"
+    __table_args__ = (
+        Index("ix_calendar_sync_jobs_event_id_user_id_provider", "event_id", "user_id", "provider", unique=True),
+        Index("ix_calendar_sync_jobs_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(String, nullable=False)  # 不設 foreign key：活動刪除後仍要刪除行事曆上的事件
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    provider = Column(String, nullable=False)  # 'google' | 'apple'
+    action = Column(String, nullable=False)  # upsert / delete
+    external_event_id = Column(String, nullable=True)  # delete 時要刪除的行事曆事件
+    status = Column(String, nullable=False, default="pending")  # pending / done / dead
+    version = Column(Integer, nullable=False, default=1)  # 每次排入加一，執行期間有新的動作就不標記完成
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(UTCDateTime, nullable=False)
+    claim_token = Column(String, nullable=True)  # 取得這一列的 worker
+    locked_until = Column(UTCDateTime, nullable=True)  # 逾時後其他 worker 可重新取得
+    last_error = Column(Text, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False)
+    updated_at = Column(UTCDateTime, nullable=False)
+
+
+class CalendarBusyWindow(Base):
+    """已快取的忙碌時段範圍：每個使用者、每個 provider 一列"""
+    __tablename__ = "calendar_busy_windows"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    provider = Column(String, primary_key=True)  # 'google' | 'apple'
+    window_start = Column(UTCDateTime, nullable=False)
+    window_end = Column(UTCDateTime, nullable=False)
+    fetched_at = Column(UTCDateTime, nullable=False)
+    last_used_at = Column(UTCDateTime, nullable=False)
+    locked_until = Column(UTCDateTime, nullable=True)  # 背景更新的認領期限
+    last_error = Column(Text, nullable=True)
+
+
+class CalendarBusyInterval(Base):
+    """CalendarBusyWindow 範圍內的忙碌時段"""
+    __tablename__ = "calendar_busy_intervals"
+    __table_args__ = (
+        Index("ix_calendar_busy_intervals_user_id_provider_start_time", "user_id", "provider", "start_time"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    provider = Column(String, nullable=False)
+    start_time = Column(UTCDateTime, nullable=False)
+    end_time = Column(UTCDateTime, nullable=False)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, Integer, Text, Index
+from app.core.database import Base, UTCDateTime
+
+
+class EmailJob(Base):
+    """
+    待寄送的 email：與驗證碼在同一個交易中寫入，由背景 dispatcher 寄出。
+    API 立即回傳 job id，前端可用 /api/auth/email-jobs/{id} 查詢寄送狀態。
+    """
+    __tablename__ = "email_jobs"
+
+    id = Column(String, primary_key=True)  # UUID，不可猜測（查詢狀態不需登入）
+    kind = Column(String, nullable=False)  # verification / login_otp
+    recipient = Column(String, nullable=False)
+    payload_json = Column(Text, nullable=False)  # 組信所需的參數，例如 {"code": "..."}
+    status = Column(String, nullable=False, default="queued")  # queued / sending / sent / failed / dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(UTCDateTime, nullable=False)
+    claim_token = Column(String, nullable=True)  # 取得這一列的 dispatcher
+    locked_until = Column(UTCDateTime, nullable=True)  # 逾時後其他 dispatcher 可重新取得
+    expires_at = Column(UTCDateTime, nullable=True)  # 驗證碼過期後就不再寄送
+    last_error = Column(Text, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False)
+    sent_at = Column(UTCDateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_jobs_status_next_attempt_at", "status", "next_attempt_at"),
+    )
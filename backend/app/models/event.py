@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Table, ForeignKey
+from sqlalchemy import Column, String, Integer, Text, Table, ForeignKey, Index
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, UTCDateTime
 
 # 多對多關係表
 event_attendees = Table(
@@ -8,7 +8,8 @@ event_attendees = Table(
     Base.metadata,
     Column("event_id", String, ForeignKey("events.id"), primary_key=True),
     Column("user_id", String, ForeignKey("users.id"), primary_key=True),
-    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("created_at", UTCDateTime, server_default=func.now()),
+    Index("ix_event_attendees_user_id", "user_id"),
 )
 
 
@@ -23,11 +24,35 @@ class Event(Base):
     category = Column(String)  # food, study, sport, etc.
     location = Column(String)
     public = Column(Integer, default=0)  # 0=private, 1=public
-    proposed_times_json = Column(Text)  # JSON: [ { start, end }, ... ]
-    start_time = Column(DateTime(timezone=True))
-    end_time = Column(DateTime(timezone=True))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    start_time = Column(UTCDateTime)
+    end_time = Column(UTCDateTime)
+    created_at = Column(UTCDateTime, server_default=func.now())
+    updated_at = Column(UTCDateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # 房間活動列表的分頁排序鍵 (created_at, id)
+        Index("ix_events_room_id_created_at", "room_id", "created_at"),
+        # 公開活動列表（public = 1，依 start_time 排序）
+        Index("ix_events_public_start_time", "public", "start_time"),
+    )
+
+
+class EventTimeOption(Base):
+    """私人活動的候選時間（每個選項一列，依 position 排序）"""
+    __tablename__ = "event_time_options"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event_id = Column(String, ForeignKey("events.id"), nullable=False)
+    position = Column(Integer, nullable=False)
+    start_time = Column(UTCDateTime, nullable=False)
+    end_time = Column(UTCDateTime, nullable=False)
+
+    __table_args__ = (
+        # 批次載入活動的候選時間
+        Index("ix_event_time_options_event_id_position", "event_id", "position"),
+        # 查詢與時間區間重疊的候選時間（start_time < 區間結束 AND end_time > 區間開始）
+        Index("ix_event_time_options_start_time_end_time", "start_time", "end_time"),
+    )
 
 
 class EventVote(Base):
@@ -37,3 +62,17 @@ class EventVote(Base):
     user_id = Column(String, ForeignKey("users.id"), primary_key=True)
     vote = Column(String, nullable=False)  # yes / no / maybe
 
+    __table_args__ = (
+        Index("ix_event_votes_event_id", "event_id"),
+    )
+
+
+
+class EventVoteTally(Base):
+    """投票統計（由 vote_event 在同一個交易中維護，可用 CLI 從 event_votes 重建）"""
+    __tablename__ = "event_vote_tallies"
+
+    event_id = Column(String, ForeignKey("events.id"), primary_key=True)
+    yes = Column(Integer, nullable=False, default=0)
+    no = Column(Integer, nullable=False, default=0)
+    maybe = Column(Integer, nullable=False, default=0)
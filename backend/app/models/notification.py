@@ -0,0 +1,27 @@
+from sqlalchemy import Column, String, Integer, Text, Index
+from app.core.database import Base, UTCDateTime
+
+
+class NotificationOutbox(Base):
+    """
+    Discord 通知 outbox：與活動 / 投票在同一個交易中寫入，由背景 dispatcher 送出。
+    每個 webhook 一列，重試時不會重複送給已成功的 webhook。
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    room_id = Column(String, nullable=False, index=True)
+    webhook_url = Column(String, nullable=False)
+    payload_json = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / sending / sent / dead
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(UTCDateTime, nullable=False)
+    claim_token = Column(String, nullable=True)  # 取得這一列的 dispatcher
+    locked_until = Column(UTCDateTime, nullable=True)  # 逾時後其他 dispatcher 可重新取得
+    last_error = Column(Text, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False)
+    sent_at = Column(UTCDateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_notification_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
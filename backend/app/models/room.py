@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, DateTime, Table, ForeignKey
+from sqlalchemy import Column, String, Table, ForeignKey, Index
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, UTCDateTime
 
 # 使用 Table 定義多對多關係
 room_members = Table(
@@ -9,6 +9,8 @@ room_members = Table(
     Column("room_id", String, ForeignKey("rooms.id"), primary_key=True),
     Column("user_id", String, ForeignKey("users.id"), primary_key=True),
     Column("role", String, default="member"),  # owner / member
+    # 使用者的房間列表（主鍵以 room_id 開頭，查 user_id 用不到）
+    Index("ix_room_members_user_id", "user_id"),
 )
 
 
@@ -20,8 +22,8 @@ class Room(Base):
     owner_id = Column(String, nullable=False, index=True)
     school = Column(String)
     invite_code = Column(String, unique=True, nullable=True, index=True)  # 邀請碼
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now(), index=True)  # 列表分頁排序鍵
+    updated_at = Column(UTCDateTime, server_default=func.now(), onupdate=func.now())
 
 
 class RoomWebhook(Base):
@@ -30,5 +32,5 @@ class RoomWebhook(Base):
     id = Column(String, primary_key=True)
     room_id = Column(String, nullable=False, index=True)
     url = Column(String, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
 
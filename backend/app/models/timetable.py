@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import BigInteger, Column, Integer, String, Text
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, UTCDateTime
 
 
 class TimetableTemplate(Base):
@@ -12,11 +12,11 @@ class TimetableTemplate(Base):
     periods_json = Column(Text, nullable=False)  # JSON: [ { name, start, end }, ... ]
     created_by = Column(String, nullable=True)  # 提交者的 user_id，NULL 表示系統預設
     status = Column(String, default="pending")  # pending=待審核, approved=已通過, rejected=已拒絕
-    submitted_at = Column(DateTime(timezone=True), nullable=True)  # 提交時間
-    reviewed_at = Column(DateTime(timezone=True), nullable=True)  # 審核時間
+    submitted_at = Column(UTCDateTime, nullable=True)  # 提交時間
+    reviewed_at = Column(UTCDateTime, nullable=True)  # 審核時間
     reviewed_by = Column(String, nullable=True)  # 審核者的 user_id
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
+    updated_at = Column(UTCDateTime, server_default=func.now(), onupdate=func.now())
 
 
 class Timetable(Base):
@@ -25,6 +25,15 @@ class Timetable(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String, nullable=False, index=True)
     data_json = Column(Text, nullable=False)  # JSON: 按星期 + 節次
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # 由 data_json 衍生的每日佔用遮罩：第 k 個 bit 代表節次名稱 "k+1" 有課（與模板無關）
+    # 全部為 NULL 表示尚未計算，或節次名稱無法編碼（非 1~63 的數字），此時改讀 data_json
+    busy_monday = Column(BigInteger, nullable=True)
+    busy_tuesday = Column(BigInteger, nullable=True)
+    busy_wednesday = Column(BigInteger, nullable=True)
+    busy_thursday = Column(BigInteger, nullable=True)
+    busy_friday = Column(BigInteger, nullable=True)
+    busy_saturday = Column(BigInteger, nullable=True)
+    busy_sunday = Column(BigInteger, nullable=True)
+    created_at = Column(UTCDateTime, server_default=func.now())
+    updated_at = Column(UTCDateTime, server_default=func.now(), onupdate=func.now())
 
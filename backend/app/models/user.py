@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Integer, DateTime, Boolean
+from sqlalchemy import Column, String, Integer, Boolean, Index
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, UTCDateTime
 
 
 class User(Base):
@@ -12,8 +12,8 @@ class User(Base):
     name = Column(String, nullable=False)  # 必填
     school = Column(String)
     major = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now(), index=True)  # 列表分頁排序鍵
+    updated_at = Column(UTCDateTime, server_default=func.now(), onupdate=func.now())
     is_active = Column(Integer, default=1)
     email_verified = Column(Integer, default=0)
     is_admin = Column(Integer, default=0)  # 0=一般使用者, 1=管理員
@@ -23,8 +23,13 @@ class EmailVerificationCode(Base):
     __tablename__ = "email_verification_codes"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    email = Column(String, nullable=False, index=True)
+    email = Column(String, nullable=False)
     code = Column(String, nullable=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(UTCDateTime, nullable=False)
     used = Column(Integer, default=0)
 
+    __table_args__ = (
+        # 驗證碼 / OTP 查詢：email + 未使用 + 未過期
+        Index("ix_email_verification_codes_email_used_expires_at", "email", "used", "expires_at"),
+    )
+
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
+from datetime import datetime
 
 
 class SignupRequest(BaseModel):
@@ -36,3 +37,16 @@ class RefreshTokenRequest(BaseModel):
 class MessageResponse(BaseModel):
     message: str
 
+
+
+class EmailJobResponse(MessageResponse):
+    job_id: str  # 可用 /api/auth/email-jobs/{job_id} 查詢寄送狀態
+
+
+class EmailJobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # queued / sending / sent / failed（稍後重試）/ dead（放棄）
+    attempts: int
+    created_at: datetime
+    sent_at: Optional[datetime] = None
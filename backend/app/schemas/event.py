@@ -66,6 +66,23 @@ class EventResponse(BaseModel):
     attendees: List[EventAttendee] = []
 
 
+class ProposedTimeScore(BaseModel):
+    index: int  # proposed_times 中的位置
+    start: datetime
+    end: datetime
+    free_count: int
+    busy_count: int
+    timetable_busy_count: int  # 課表有課的人數
+    calendar_busy_count: int  # 已連結行事曆忙碌的人數（可能與有課的人重複）
+
+
+class ProposedTimeScoresResponse(BaseModel):
+    event_id: str
+    room_id: str
+    member_count: int
+    options: List[ProposedTimeScore]
+
+
 class PublicEventQuery(BaseModel):
     school: Optional[str] = None
     category: Optional[str] = None
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class NotificationOutboxStats(BaseModel):
+    queue_depth: int
+    pending: int
+    sending: int
+    dead: int
+    oldest_pending_age_seconds: Optional[float] = None
+    delivered: int  # 以下為本 worker 的統計
+    failed_attempts: int
+    latency_p50_seconds: Optional[float] = None
+    latency_p95_seconds: Optional[float] = None
@@ -26,6 +26,22 @@ class RoomResponse(BaseModel):
     members: List[RoomMember] = []
 
 
+class RoomAvailabilitySlot(BaseModel):
+    weekday: str
+    period: str
+    start: str  # "HH:MM"
+    end: str
+    free_count: int
+    busy_count: int
+
+
+class RoomAvailabilityResponse(BaseModel):
+    room_id: str
+    member_count: int
+    min_free: int
+    slots: List[RoomAvailabilitySlot]
+
+
 class RoomInviteRequest(BaseModel):
     email: str
 
@@ -36,5 +36,6 @@ class UserUpdate(BaseModel):
 
 class UserListResponse(BaseModel):
     users: List[UserResponse]
-    total: int
+    total: Optional[int] = None  # 只有第一頁（沒有 cursor）會計算
+    next_cursor: Optional[str] = None
 
@@ -1,61 +1,167 @@
-from typing import List
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 from datetime import datetime
 from app.services.calendar_service import CalendarProvider, BusySlot
+from app.services.caldav_client import (
+    CalDAVCalendar,
+    CalDAVError,
+    CalDAVSession,
+    CalDAVSessionPool,
+    build_vevent,
+    caldav_sessions,
+    parse_busy_intervals
+)
+from app.services.calendar_mirror import (
+    MirrorChanges,
+    apply_mirror_changes,
+    drop_mirror,
+    load_mirror_etags,
+    load_mirror_intervals,
+    load_mirror_states,
+    mirror_covers,
+    mirror_window,
+    needs_rebuild
+)
 from app.models.user import User
 from app.models.event import Event
-from app.core.security import decrypt_app_password
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.models.calendar_integration import AppleCalendarCredential
-
-# TODO: 實作 CalDAV 整合
-# 需要安裝: pip install caldav
+from app.models.calendar_integration import AppleCalendarCredential, CalendarMirrorCollection
 
 
 class AppleCalendarProvider(CalendarProvider):
-    """Apple Calendar (CalDAV) Provider"""
-    
-    def __init__(self, db: AsyncSession):
+    """
+    Apple Calendar (CalDAV) Provider
+    以非同步 CalDAV client 存取 iCloud，每個使用者的連線與探索結果由 caldav_sessions 重用。
+    external_event_id 為事件在 CalDAV 伺服器上的 URL。
+    忙碌時段從 calendar_mirror 讀取，查詢前以 ctag / sync-collection / etag 增量更新鏡像。
+    """
+
+    def __init__(self, db: AsyncSession, sessions: CalDAVSessionPool = caldav_sessions):
         self.db = db
-    
-    async def _get_credentials(self, user: User) -> tuple[str, str]:
-        """取得 Apple 認證資訊"""
+        self.sessions = sessions
+
+    @asynccontextmanager
+    async def _session(self, user: User):
+        """
+        取得使用者的 CalDAV session（app password 只在建立 session 時解密）。
+        使用期間連線池不會關閉這個 session。
+        """
         result = await self.db.execute(
-            select(AppleCalendarCredential).where(AppleCalendarCredential.user_id == user.id)
+            select(AppleCalendarCredential.apple_id_email, AppleCalendarCredential.encrypted_app_password)
+            .where(AppleCalendarCredential.user_id == user.id)
         )
-        cred = result.scalar_one_or_none()
+        cred = result.first()
         if not cred:
             raise ValueError("Apple Calendar not connected")
-        
-        password = decrypt_app_password(cred.encrypted_app_password)
-        return cred.apple_id_email, password
-    
+
+        async with self.sessions.lease(user.id, cred.apple_id_email, cred.encrypted_app_password) as session:
+            yield session
+
+    @staticmethod
+    def _to_ics(event: Event) -> str:
+        if event.start_time is None or event.end_time is None:
+            raise ValueError("Event has no fixed time")
+        return build_vevent(
+            f"{event.id}@jiu-pluck",
+            event.title,
+            event.start_time,
+            event.end_time,
+            event.description,
+            event.location
+        )
+
     async def create_event(self, user: User, event: Event) -> str:
-        """建立 Apple Calendar 事件"""
-        # TODO: 實作 CalDAV 建立事件
-        # 1. 取得 credentials
-        # 2. 連線到 caldav.icloud.com
-        # 3. 建立 VEVENT
-        # 4. 回傳 external_event_id
-        raise NotImplementedError("Apple Calendar integration not implemented yet")
-    
+        """建立 Apple Calendar 事件（放在第一個可放事件的行事曆）"""
+        async with self._session(user) as session:
+            # 以活動 id 命名，重試時覆寫同一個事件
+            return await session.put_event(None, self._to_ics(event), resource_name=event.id)
+
     async def update_event(self, user: User, event: Event, external_event_id: str) -> None:
         """更新 Apple Calendar 事件"""
-        # TODO: 實作
-        raise NotImplementedError("Apple Calendar integration not implemented yet")
-    
+        async with self._session(user) as session:
+            await session.put_event(external_event_id, self._to_ics(event))
+
     async def delete_event(self, user: User, external_event_id: str) -> None:
         """刪除 Apple Calendar 事件"""
-        # TODO: 實作
-        raise NotImplementedError("Apple Calendar integration not implemented yet")
-    
+        async with self._session(user) as session:
+            await session.delete_event(external_event_id)
+
+    async def _sync_calendar(
+        self,
+        session: CalDAVSession,
+        calendar: CalDAVCalendar,
+        state: Optional[CalendarMirrorCollection],
+        etags: Dict[str, Optional[str]],
+        now: datetime
+    ) -> MirrorChanges:
+        """取得一個行事曆自上次同步後的變動，只下載 etag 改變的事件"""
+        reset = needs_rebuild(state, now)
+        window = mirror_window(now) if reset else (state.window_start, state.window_end)
+        try:
+            changed, removed, sync_token = await session.sync_collection(calendar.url, None if reset else state.sync_token)
+        except CalDAVError as e:
+            if reset or e.status not in (403, 409):
+                raise
+            # sync-token 已失效（valid-sync-token 前置條件）：重新完整同步
+            reset, window = True, mirror_window(now)
+            changed, removed, sync_token = await session.sync_collection(calendar.url, None)
+        if reset:
+            etags, removed = {}, []
+
+        fetch = [href for href, etag in changed.items() if etags.get(href) != etag]
+        documents = await session.multiget(calendar.url, fetch, *window) if fetch else {}
+        updates = {}
+        for href in fetch:
+            etag, ics = documents.get(href, (changed[href], None))
+            updates[href] = (etag or changed[href], parse_busy_intervals(ics) if ics else [])
+        return MirrorChanges(updates, removed, sync_token, window, ctag=calendar.ctag, reset=reset)
+
+    async def sync_mirror(self, user: User, session: CalDAVSession) -> Dict[str, CalendarMirrorCollection]:
+        """
+        更新使用者的 Apple 行事曆鏡像，回傳每個行事曆的同步狀態。
+        一次 PROPFIND 取得所有行事曆的 ctag，ctag 沒變的行事曆不再送請求；有變動的行事曆同時同步。
+        """
+        now = datetime.utcnow()
+        calendars = await session.calendars(refresh=True)
+        states = await load_mirror_states(self.db, user.id, "apple")
+
+        gone = states.keys() - {c.url for c in calendars}
+        if gone:
+            await drop_mirror(self.db, user.id, "apple", gone)
+
+        stale = [
+            c for c in calendars
+            if needs_rebuild(states.get(c.url), now) or not c.ctag or c.ctag != states[c.url].ctag
+        ]
+        etags = {}
+        for calendar in stale:
+            if not needs_rebuild(states.get(calendar.url), now):
+                etags[calendar.url] = await load_mirror_etags(self.db, user.id, "apple", calendar.url)
+
+        results = await asyncio.gather(*(
+            self._sync_calendar(session, c, states.get(c.url), etags.get(c.url, {}), now) for c in stale
+        ))
+        for calendar, changes in zip(stale, results):
+            await apply_mirror_changes(self.db, user.id, "apple", calendar.url, changes)
+        await self.db.commit()
+
+        if not gone and not stale:
+            return states
+        return await load_mirror_states(self.db, user.id, "apple")
+
     async def get_busy_slots(
         self,
         user: User,
         start_time: datetime,
         end_time: datetime
     ) -> List[BusySlot]:
-        """取得 Apple Calendar 忙碌時段"""
-        # TODO: 實作 CalDAV 查詢事件
-        raise NotImplementedError("Apple Calendar integration not implemented yet")
+        """取得 Apple Calendar 忙碌時段（從鏡像讀取；超出鏡像範圍時直接查詢所有行事曆）"""
+        async with self._session(user) as session:
+            states = await self.sync_mirror(user, session)
+            if mirror_covers(states.values(), start_time, end_time):
+                return await load_mirror_intervals(self.db, user.id, "apple", start_time, end_time)
 
+            intervals = await session.busy_intervals(start_time, end_time)
+        return [BusySlot(start, end) for start, end in intervals]
@@ -4,9 +4,9 @@ from datetime import datetime, timedelta
 import secrets
 import uuid
 from app.models.user import User, EmailVerificationCode
-from app.core.security import create_access_token, create_refresh_token
+from app.core.security import create_access_token, create_refresh_token, invalidate_principal
 from app.schemas.auth import SignupRequest, LoginRequest
-from app.services.email_service import send_verification_email, send_login_otp_email
+from app.services.email_queue import enqueue_email, email_dispatcher
 
 
 async def signup(db: AsyncSession, signup_data: SignupRequest) -> dict:
@@ -45,17 +45,16 @@ async def signup(db: AsyncSession, signup_data: SignupRequest) -> dict:
     )
     
     db.add(verification_code)
-    await db.commit()
     
-    # 寄送驗證碼（非同步，不等待）
-    # TODO: 使用背景任務處理
-    try:
-        await send_verification_email(signup_data.email, code)
-    except Exception as e:
-        # 記錄錯誤但不影響註冊流程
-        print(f"Failed to send verification email: {e}")
+    # 寄送驗證碼：與驗證碼一起寫入 email 佇列，由背景 worker 寄出
+    job_id = enqueue_email(db, "verification", signup_data.email, {"code": code}, expires_at)
+    await db.commit()
+    email_dispatcher.wake()
     
-    return {"message": "Registration successful. Please check your email for verification code."}
+    return {
+        "message": "Registration successful. Please check your email for verification code.",
+        "job_id": job_id
+    }
 
 
 async def verify_email(db: AsyncSession, email: str, code: str) -> dict:
@@ -81,6 +80,7 @@ async def verify_email(db: AsyncSession, email: str, code: str) -> dict:
     user.email_verified = 1
     
     await db.commit()
+    invalidate_principal(user.id)
     
     return {"message": "Email verified successfully"}
 
@@ -123,16 +123,13 @@ async def request_login_otp(db: AsyncSession, email: str) -> dict:
     )
     
     db.add(otp_code)
-    await db.commit()
     
-    # 寄送 OTP
-    try:
-        await send_login_otp_email(email, code)
-    except Exception as e:
-        print(f"Failed to send login OTP email: {e}")
-        raise ValueError("Failed to send login code. Please try again later.")
+    # 寄送 OTP：寫入 email 佇列，由背景 worker 寄出
+    job_id = enqueue_email(db, "login_otp", email, {"code": code}, expires_at)
+    await db.commit()
+    email_dispatcher.wake()
     
-    return {"message": "Login code sent to your email"}
+    return {"message": "Login code sent to your email", "job_id": job_id}
 
 
 async def login(db: AsyncSession, login_data: LoginRequest) -> dict:
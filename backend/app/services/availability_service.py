@@ -0,0 +1,401 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+import json
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Iterable, Tuple
+from zoneinfo import ZoneInfo
+from app.core.config import settings
+from app.models.timetable import Timetable
+from app.models.room import room_members
+from app.services.calendar_busy_store import calendar_busy_store
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Timetable.busy_<weekday> 欄位：第 k 個 bit 代表節次名稱 str(k + 1)，BigInteger 可放 63 節
+OCCUPANCY_COLUMNS = [getattr(Timetable, f"busy_{day}") for day in WEEKDAYS]
+MAX_ENCODED_PERIOD = 63
+
+
+def normalize_weekday(weekday: str) -> str:
+    """將 mon / monday 等寫法統一為課表 JSON 使用的完整星期名稱"""
+    key = weekday.strip().lower()
+    for day in WEEKDAYS:
+        if key == day or key == day[:3]:
+            return day
+    raise ValueError(f"Invalid weekday: {weekday}")
+
+
+def build_week_occupancy(data: Dict, periods: List[Dict]) -> List[int]:
+    """
+    將課表 JSON 轉為 7 個整數的佔用遮罩（依 WEEKDAYS 排序）。
+    第 i 個 bit 代表 periods[i] 這一節有課。
+    """
+    index = {p.get("name"): i for i, p in enumerate(periods)}
+    masks = []
+    for day in WEEKDAYS:
+        mask = 0
+        for course in data.get(day) or []:
+            i = index.get(course.get("period"))
+            if i is not None:
+                mask |= 1 << i
+        masks.append(mask)
+    return masks
+
+
+def _period_number(name) -> Optional[int]:
+    """可編碼的節次名稱（"1" ~ "63"）回傳數字，否則 None"""
+    if isinstance(name, str) and name.isdigit() and 1 <= int(name) <= MAX_ENCODED_PERIOD:
+        return int(name)
+    return None
+
+
+def encode_occupancy(data: Dict) -> Optional[List[int]]:
+    """
+    將課表 JSON 編碼為與模板無關的 7 個遮罩（依 WEEKDAYS 排序），存入 Timetable.busy_* 欄位。
+    有無法編碼的節次名稱時回傳 None，讀取時改為解析 data_json。
+    """
+    masks = []
+    for day in WEEKDAYS:
+        mask = 0
+        for course in data.get(day) or []:
+            name = course.get("period")
+            if not name:
+                continue
+            number = _period_number(name)
+            if number is None:
+                return None
+            mask |= 1 << (number - 1)
+        masks.append(mask)
+    return masks
+
+
+def apply_occupancy(timetable: Timetable, data: Dict) -> None:
+    """寫入課表時同步更新 busy_* 欄位"""
+    masks = encode_occupancy(data) or [None] * len(WEEKDAYS)
+    for day, mask in zip(WEEKDAYS, masks):
+        setattr(timetable, f"busy_{day}", mask)
+
+
+def period_projection(periods: List[Dict]) -> Optional[List[int]]:
+    """
+    模板各節次在 busy_* 遮罩中的 bit 位置（periods[i] 對應第 result[i] 個 bit）。
+    模板有無法編碼的節次名稱時回傳 None，只能解析 data_json。
+    """
+    numbers = [_period_number(p.get("name")) for p in periods]
+    if any(n is None for n in numbers):
+        return None
+    return [n - 1 for n in numbers]
+
+
+def project_occupancy(masks: List[int], projection: List[int]) -> List[int]:
+    """將 busy_* 遮罩轉為模板節次的遮罩（與 build_week_occupancy 的結果相同）"""
+    projected = []
+    for mask in masks:
+        day_mask = 0
+        if mask:
+            for i, bit in enumerate(projection):
+                if mask >> bit & 1:
+                    day_mask |= 1 << i
+        projected.append(day_mask)
+    return projected
+
+
+def transpose_occupancy(member_masks: List[int], period_count: int) -> List[int]:
+    """
+    將「每位成員的節次遮罩」轉為「每個節次的成員遮罩」。
+    回傳的第 i 個整數中，第 j 個 bit 代表第 j 位成員在 periods[i] 忙碌，
+    之後用 bit_count() 就能一次算出該節的忙碌人數。
+    """
+    per_period = [0] * period_count
+    for j, mask in enumerate(member_masks):
+        member_bit = 1 << j
+        while mask:
+            low = mask & -mask
+            per_period[low.bit_length() - 1] |= member_bit
+            mask ^= low
+    return per_period
+
+
+async def get_room_member_ids(db: AsyncSession, room_id: str) -> List[str]:
+    """取得房間所有成員的 user_id"""
+    result = await db.execute(
+        select(room_members.c.user_id).where(room_members.c.room_id == room_id)
+    )
+    return [row[0] for row in result.fetchall()]
+
+
+async def load_member_occupancy(
+    db: AsyncSession,
+    user_ids: Iterable[str],
+    periods: List[Dict]
+) -> Dict[str, List[int]]:
+    """
+    取得多位使用者的每週佔用遮罩，沒有課表的使用者視為全部空堂。
+    只讀 busy_* 整數欄位；尚未計算遮罩的課表（或模板節次名稱無法編碼）才另外解析 data_json。
+    """
+    user_ids = list(user_ids)
+    occupancy = {user_id: [0] * len(WEEKDAYS) for user_id in user_ids}
+    if not user_ids:
+        return occupancy
+
+    projection = period_projection(periods)
+    pending = user_ids
+    if projection is not None:
+        result = await db.execute(
+            select(Timetable.user_id, *OCCUPANCY_COLUMNS).where(Timetable.user_id.in_(user_ids))
+        )
+        pending = []
+        for user_id, *masks in result.fetchall():
+            if masks[0] is None:
+                pending.append(user_id)
+            else:
+                occupancy[user_id] = project_occupancy(masks, projection)
+
+    if pending:
+        result = await db.execute(
+            select(Timetable.user_id, Timetable.data_json).where(Timetable.user_id.in_(pending))
+        )
+        for user_id, data_json in result.fetchall():
+            occupancy[user_id] = build_week_occupancy(json.loads(data_json), periods)
+
+    return occupancy
+
+
+async def backfill_occupancy(db: AsyncSession, batch_size: int = 500) -> int:
+    """為 busy_* 尚未計算的課表補上遮罩，回傳處理的筆數（無法編碼的課表維持 NULL）"""
+    processed = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Timetable)
+            .where(Timetable.busy_monday.is_(None), Timetable.id > last_id)
+            .order_by(Timetable.id)
+            .limit(batch_size)
+        )
+        timetables = result.scalars().all()
+        if not timetables:
+            return processed
+
+        for timetable in timetables:
+            apply_occupancy(timetable, json.loads(timetable.data_json))
+        await db.commit()
+        processed += len(timetables)
+        last_id = timetables[-1].id
+
+
+async def check_occupancy(db: AsyncSession) -> List[Dict]:
+    """比對 busy_* 與 data_json 重新計算的結果，回傳不一致的課表"""
+    result = await db.execute(select(Timetable.id, Timetable.user_id, Timetable.data_json, *OCCUPANCY_COLUMNS))
+    mismatches = []
+    for timetable_id, user_id, data_json, *masks in result.fetchall():
+        expected = encode_occupancy(json.loads(data_json)) or [None] * len(WEEKDAYS)
+        if list(masks) != expected:
+            mismatches.append({"id": timetable_id, "user_id": user_id, "expected": expected, "actual": list(masks)})
+    return mismatches
+
+
+def rank_common_free_periods(
+    member_masks: Dict[str, List[int]],
+    periods: List[Dict],
+    weekdays: List[str],
+    min_free: Optional[int] = None
+) -> List[Dict]:
+    """
+    依空堂人數排序各節次。
+    min_free 為 None 時只回傳全員都有空的節次，否則回傳至少 min_free 人有空的節次。
+    """
+    masks = list(member_masks.values())
+    total = len(masks)
+    required = total if min_free is None else min(min_free, total)
+    full = (1 << len(periods)) - 1
+
+    slots = []
+    for weekday in weekdays:
+        day_index = WEEKDAYS.index(weekday)
+        day_masks = [m[day_index] for m in masks]
+
+        if required == total:
+            # 全員有空：把所有人的佔用遮罩 OR 起來取補集即可
+            busy_any = 0
+            for mask in day_masks:
+                busy_any |= mask
+            free_all = ~busy_any & full
+            candidates = [i for i in range(len(periods)) if free_all >> i & 1]
+            busy_counts = {i: 0 for i in candidates}
+        else:
+            per_period = transpose_occupancy(day_masks, len(periods))
+            busy_counts = {i: per_period[i].bit_count() for i in range(len(periods))}
+            candidates = [i for i in range(len(periods)) if total - busy_counts[i] >= required]
+
+        for i in candidates:
+            period = periods[i]
+            slots.append({
+                "weekday": weekday,
+                "period": period.get("name", ""),
+                "start": period["start"],
+                "end": period["end"],
+                "free_count": total - busy_counts[i],
+                "busy_count": busy_counts[i],
+                "_order": (day_index, i)
+            })
+
+    slots.sort(key=lambda s: (-s["free_count"], s["_order"]))
+    for slot in slots:
+        del slot["_order"]
+
+    return slots
+
+
+async def get_room_availability(
+    db: AsyncSession,
+    room_id: str,
+    periods: List[Dict],
+    weekday: Optional[str] = None,
+    min_free: Optional[int] = None
+) -> Dict:
+    """計算房間成員的共同空堂"""
+    weekdays = [normalize_weekday(weekday)] if weekday else WEEKDAYS
+
+    member_ids = await get_room_member_ids(db, room_id)
+    occupancy = await load_member_occupancy(db, member_ids, periods)
+
+    return {
+        "room_id": room_id,
+        "member_count": len(member_ids),
+        "min_free": len(member_ids) if min_free is None else min(min_free, len(member_ids)),
+        "slots": rank_common_free_periods(occupancy, periods, weekdays, min_free)
+    }
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def option_period_masks(
+    start: datetime,
+    end: datetime,
+    periods: List[Dict],
+    tz: ZoneInfo
+) -> List[Tuple[int, int]]:
+    """
+    候選時間（naive UTC）換算為課表時區後，與哪些節次重疊。
+    回傳 [(WEEKDAYS 索引, 節次遮罩), ...]；跨日的時間會拆成每天一段。
+    """
+    bounds = [(_minutes(p["start"]), _minutes(p["end"])) for p in periods]
+    local_start = start.replace(tzinfo=timezone.utc).astimezone(tz)
+    local_end = end.replace(tzinfo=timezone.utc).astimezone(tz)
+
+    segments = []
+    day = local_start.date()
+    while day <= local_end.date():
+        seg_start = local_start.hour * 60 + local_start.minute if day == local_start.date() else 0
+        seg_end = local_end.hour * 60 + local_end.minute if day == local_end.date() else 24 * 60
+        mask = 0
+        for i, (period_start, period_end) in enumerate(bounds):
+            if period_start < seg_end and seg_start < period_end:
+                mask |= 1 << i
+        if mask:
+            segments.append((day.weekday(), mask))
+        day += timedelta(days=1)
+    return segments
+
+
+def _calendar_busy_members(
+    member_ids: List[str],
+    busy_intervals: Dict,
+    options: List[Dict]
+) -> List[int]:
+    """每個候選時間的行事曆忙碌成員遮罩（第 j 個 bit 對應 member_ids[j]）"""
+    busy = [0] * len(options)
+    for j, user_id in enumerate(member_ids):
+        slots = sorted(busy_intervals.get(user_id) or [], key=lambda slot: slot.start)
+        if not slots:
+            continue
+        starts = [slot.start for slot in slots]
+        # 前綴最大結束時間：開始時間早於候選結束時間的忙碌時段中，只要最晚結束的超過候選開始就是重疊
+        max_ends = []
+        latest = None
+        for slot in slots:
+            latest = slot.end if latest is None or slot.end > latest else latest
+            max_ends.append(latest)
+        member_bit = 1 << j
+        for k, option in enumerate(options):
+            n = bisect_left(starts, option["end"])
+            if n and max_ends[n - 1] > option["start"]:
+                busy[k] |= member_bit
+    return busy
+
+
+async def score_time_options(
+    db: AsyncSession,
+    member_ids: List[str],
+    options: List[Dict],
+    periods: List[Dict]
+) -> List[Dict]:
+    """
+    依出席人數排序活動的候選時間（options 為 load_time_options 的格式，時間為 naive UTC）。
+    全部成員的課表一次查詢、行事曆忙碌時段一次從快取取得，
+    每個星期只轉置一次成「每節的成員遮罩」，每個候選時間以 OR 合併節次遮罩後 bit_count() 計數。
+    """
+    if not options:
+        return []
+
+    occupancy = await load_member_occupancy(db, member_ids, periods)
+    busy_intervals = await calendar_busy_store.get_busy_intervals(
+        db,
+        member_ids,
+        min(o["start"] for o in options),
+        max(o["end"] for o in options)
+    )
+
+    tz = ZoneInfo(settings.TIMETABLE_TIMEZONE)
+    per_day: Dict[int, List[int]] = {}
+    calendar_busy = _calendar_busy_members(member_ids, busy_intervals, options)
+    total = len(member_ids)
+
+    scores = []
+    for index, option in enumerate(options):
+        timetable_busy = 0
+        for day_index, period_mask in option_period_masks(option["start"], option["end"], periods, tz):
+            if day_index not in per_day:
+                per_day[day_index] = transpose_occupancy(
+                    [occupancy[user_id][day_index] for user_id in member_ids], len(periods)
+                )
+            while period_mask:
+                low = period_mask & -period_mask
+                timetable_busy |= per_day[day_index][low.bit_length() - 1]
+                period_mask ^= low
+
+        busy = timetable_busy | calendar_busy[index]
+        scores.append({
+            "index": index,
+            # 候選時間為 naive UTC，回應中加上時區
+            "start": option["start"].replace(tzinfo=timezone.utc),
+            "end": option["end"].replace(tzinfo=timezone.utc),
+            "free_count": total - busy.bit_count(),
+            "busy_count": busy.bit_count(),
+            "timetable_busy_count": timetable_busy.bit_count(),
+            "calendar_busy_count": calendar_busy[index].bit_count()
+        })
+
+    scores.sort(key=lambda s: (-s["free_count"], s["start"], s["index"]))
+    return scores
+
+
+async def get_event_time_scores(
+    db: AsyncSession,
+    room_id: str,
+    event_id: str,
+    options: List[Dict],
+    periods: List[Dict]
+) -> Dict:
+    """房間活動各候選時間的空閒 / 忙碌人數（依空閒人數排序）"""
+    member_ids = await get_room_member_ids(db, room_id)
+    return {
+        "event_id": event_id,
+        "room_id": room_id,
+        "member_count": len(member_ids),
+        "options": await score_time_options(db, member_ids, options, periods)
+    }
@@ -0,0 +1,574 @@
+"""
+非同步 CalDAV client（Apple Calendar / iCloud）
+
+同步的 caldav 套件在 async 路由中使用會卡住整個 event loop，這裡直接以 httpx.AsyncClient 發送 CalDAV 請求：
+- 每個使用者一個 CalDAVSession：自己的 keep-alive 連線與 cookie，並快取 principal / 行事曆的探索結果
+- CalDAVSessionPool 依 user_id 重用 session，憑證更換時重建；閒置或超過數量上限的 session 會關閉。
+  app password 只在建立 session 時解密一次
+- 多個行事曆的查詢同時送出
+
+base_url 與 transport 可以替換，測試時可指向本機的 CalDAV 模擬伺服器或 httpx.MockTransport。
+"""
+import asyncio
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from xml.sax.saxutils import escape
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import httpx
+from app.core.config import settings
+from app.core.security import decrypt_app_password
+
+DAV = "DAV:"
+CALDAV = "urn:ietf:params:xml:ns:caldav"
+CALENDARSERVER = "http://calendarserver.org/ns/"
+NAMESPACES = {"d": DAV, "c": CALDAV, "cs": CALENDARSERVER}
+
+
+class CalDAVError(Exception):
+    """CalDAV 請求失敗（status 為 HTTP 狀態碼，連線錯誤時為 None）"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class CalDAVCalendar:
+    """探索到的行事曆集合"""
+
+    def __init__(self, url: str, name: Optional[str], ctag: Optional[str] = None):
+        self.url = url
+        self.name = name
+        self.ctag = ctag
+
+
+def _utc_text(value: datetime) -> str:
+    """naive UTC（或有時區）的時間轉為 iCalendar 的 UTC 格式"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _escape_text(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """iCalendar 每行最多 75 個 octet，超過的以 CRLF + 空白接續"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # 不要切在 UTF-8 多位元組字元中間
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def build_vevent(
+    uid: str,
+    title: str,
+    start: datetime,
+    end: datetime,
+    description: Optional[str] = None,
+    location: Optional[str] = None
+) -> str:
+    """單一 VEVENT 的 iCalendar 文件"""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Jiu-Pluck//Calendar Sync//ZH",
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{_utc_text(datetime.utcnow())}",
+        f"DTSTART:{_utc_text(start)}",
+        f"DTEND:{_utc_text(end)}",
+        f"SUMMARY:{_escape_text(title)}",
+    ]
+    if description:
+        lines.append(f"DESCRIPTION:{_escape_text(description)}")
+    if location:
+        lines.append(f"LOCATION:{_escape_text(location)}")
+    lines += ["END:VEVENT", "END:VCALENDAR"]
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+
+def _parse_ical_time(params: Dict[str, str], value: str) -> datetime:
+    """DTSTART / DTEND 轉為 naive UTC；全天事件以 UTC 當天 00:00 計"""
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        day = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+        return datetime(day.year, day.month, day.day)
+    parsed = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    if value.endswith("Z"):
+        return parsed
+    tzid = params.get("TZID", "").strip('"')
+    if tzid:
+        try:
+            return parsed.replace(tzinfo=ZoneInfo(tzid)).astimezone(timezone.utc).replace(tzinfo=None)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    # 浮動時間（沒有時區）視為課表時區
+    return parsed.replace(tzinfo=ZoneInfo(settings.TIMETABLE_TIMEZONE)).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_duration(value: str) -> timedelta:
+    """iCalendar DURATION（例如 PT1H30M、P1D）"""
+    sign = -1 if value.startswith("-") else 1
+    value = value.lstrip("+-").lstrip("P")
+    days = seconds = 0
+    number = ""
+    in_time = False
+    for ch in value:
+        if ch == "T":
+            in_time = True
+        elif ch.isdigit():
+            number += ch
+        else:
+            n = int(number or 0)
+            number = ""
+            if ch == "W":
+                days += 7 * n
+            elif ch == "D":
+                days += n
+            elif ch == "H" and in_time:
+                seconds += 3600 * n
+            elif ch == "M" and in_time:
+                seconds += 60 * n
+            elif ch == "S" and in_time:
+                seconds += n
+    return sign * timedelta(days=days, seconds=seconds)
+
+
+def parse_busy_intervals(ics: str) -> List[Tuple[datetime, datetime]]:
+    """
+    取出 iCalendar 中佔用時間的 VEVENT（naive UTC）。
+    略過 TRANSP:TRANSPARENT 與 STATUS:CANCELLED；重複事件應由伺服器以 <C:expand> 展開。
+    """
+    # 先把折行接回去
+    text = ics.replace("\r\n ", "").replace("\r\n\t", "").replace("\n ", "").replace("\n\t", "")
+    intervals = []
+    current: Optional[Dict] = None
+    depth = 0
+    for line in text.splitlines():
+        if line == "BEGIN:VEVENT":
+            current, depth = {}, 0
+            continue
+        if current is None:
+            continue
+        if line.startswith("BEGIN:"):
+            depth += 1  # VALARM 等子元件
+            continue
+        if line.startswith("END:") and depth:
+            depth -= 1
+            continue
+        if line == "END:VEVENT":
+            start = current.get("DTSTART")
+            if start and current.get("TRANSP") != "TRANSPARENT" and current.get("STATUS") != "CANCELLED":
+                if "DTEND" in current:
+                    end = current["DTEND"]
+                elif "DURATION" in current:
+                    end = start + current["DURATION"]
+                else:
+                    end = start + (timedelta(days=1) if current.get("_all_day") else timedelta(0))
+                if end > start:
+                    intervals.append((start, end))
+            current = None
+            continue
+        if depth or ":" not in line:
+            continue
+
+        head, value = line.split(":", 1)
+        name, *raw_params = head.split(";")
+        params = dict(p.split("=", 1) for p in raw_params if "=" in p)
+        name = name.upper()
+        if name in ("DTSTART", "DTEND"):
+            current[name] = _parse_ical_time(params, value.strip())
+            if name == "DTSTART" and (params.get("VALUE") == "DATE" or len(value.strip()) == 8):
+                current["_all_day"] = True
+        elif name == "DURATION":
+            current[name] = _parse_duration(value.strip())
+        elif name in ("TRANSP", "STATUS"):
+            current[name] = value.strip().upper()
+    return intervals
+
+
+def _parse_xml(response: httpx.Response) -> ET.Element:
+    try:
+        return ET.fromstring(response.content)
+    except ET.ParseError as e:
+        raise CalDAVError(f"Invalid XML response from {response.request.url}: {e}")
+
+
+def _propfind_body(*props: str) -> str:
+    inner = "".join(f"<{p}/>" for p in props)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<d:propfind xmlns:d="{DAV}" xmlns:c="{CALDAV}" xmlns:cs="{CALENDARSERVER}">'
+        f"<d:prop>{inner}</d:prop></d:propfind>"
+    )
+
+
+class CalDAVSession:
+    """單一使用者的 CalDAV 連線與探索快取"""
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = base_url or settings.APPLE_CALDAV_URL
+        if not self.base_url:
+            raise CalDAVError("APPLE_CALDAV_URL is not configured")
+        self.client = httpx.AsyncClient(
+            auth=httpx.BasicAuth(username, password),
+            timeout=httpx.Timeout(settings.APPLE_CALDAV_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=60.0),
+            follow_redirects=True,
+            transport=transport
+        )
+        self.principal_url: Optional[str] = None
+        self.home_url: Optional[str] = None
+        self._calendars: Optional[List[CalDAVCalendar]] = None
+        self._discovered_at = 0.0
+        self._discover_lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        # 使用中的次數；連線池要關閉使用中的 session 時，等最後一個使用者結束再關
+        self._leases = 0
+        self._close_pending = False
+
+    @asynccontextmanager
+    async def lease(self):
+        """標記 session 使用中，期間不會被連線池關閉（逐出或憑證變更時延後到用完才關）"""
+        self._leases += 1
+        try:
+            yield self
+        finally:
+            self._leases -= 1
+            if self._close_pending and not self._leases:
+                await self.client.aclose()
+
+    async def close(self) -> None:
+        if self._leases:
+            self._close_pending = True
+            return
+        await self.client.aclose()
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
+        ok: Tuple[int, ...] = (200, 201, 204, 207)
+    ) -> httpx.Response:
+        self.last_used = time.monotonic()
+        request_headers = {"Content-Type": "application/xml; charset=utf-8"} if body and body.startswith("<?xml") else {}
+        request_headers.update(headers or {})
+        if self.client.is_closed:
+            # 已被連線池逐出或換掉（例如憑證變更）；呼叫端重新向連線池取得 session
+            raise CalDAVError(f"{method} {url} failed: session closed")
+
+        try:
+            async with self.lease():
+                response = await self.client.request(
+                    method,
+                    urljoin(self.base_url, url),
+                    content=body.encode("utf-8") if body is not None else None,
+                    headers=request_headers
+                )
+        except httpx.HTTPError as e:
+            raise CalDAVError(f"{method} {url} failed: {e}")
+        if response.status_code not in ok:
+            raise CalDAVError(f"{method} {url} returned {response.status_code}", response.status_code)
+        return response
+
+    async def _propfind(self, url: str, body: str, depth: str) -> ET.Element:
+        response = await self.request("PROPFIND", url, body, {"Depth": depth})
+        return _parse_xml(response)
+
+    @staticmethod
+    def _href(element: Optional[ET.Element]) -> Optional[str]:
+        if element is None:
+            return None
+        href = element.find("d:href", NAMESPACES)
+        return href.text.strip() if href is not None and href.text else None
+
+    async def calendars(self, refresh: bool = False) -> List[CalDAVCalendar]:
+        """
+        可放 VEVENT 的行事曆（探索結果快取 APPLE_CALDAV_DISCOVERY_TTL_SECONDS 秒）。
+        依序查詢 current-user-principal → calendar-home-set → 其下的行事曆集合。
+        """
+        async with self._discover_lock:
+            fresh = time.monotonic() - self._discovered_at < settings.APPLE_CALDAV_DISCOVERY_TTL_SECONDS
+            if self._calendars is not None and fresh and not refresh:
+                return self._calendars
+
+            if self.principal_url is None:
+                root = await self._propfind(self.base_url, _propfind_body("d:current-user-principal"), "0")
+                self.principal_url = self._href(root.find(".//d:current-user-principal", NAMESPACES))
+                if not self.principal_url:
+                    raise CalDAVError("current-user-principal not found")
+                self.principal_url = urljoin(self.base_url, self.principal_url)
+
+            if self.home_url is None:
+                root = await self._propfind(self.principal_url, _propfind_body("c:calendar-home-set"), "0")
+                self.home_url = self._href(root.find(".//c:calendar-home-set", NAMESPACES))
+                if not self.home_url:
+                    raise CalDAVError("calendar-home-set not found")
+                self.home_url = urljoin(self.principal_url, self.home_url)
+
+            root = await self._propfind(
+                self.home_url,
+                _propfind_body("d:resourcetype", "d:displayname", "c:supported-calendar-component-set", "cs:getctag"),
+                "1"
+            )
+            calendars = []
+            for response in root.findall("d:response", NAMESPACES):
+                href = response.find("d:href", NAMESPACES)
+                prop = response.find(".//d:prop", NAMESPACES)
+                if href is None or prop is None or prop.find("d:resourcetype/c:calendar", NAMESPACES) is None:
+                    continue
+                components = prop.find("c:supported-calendar-component-set", NAMESPACES)
+                if components is not None and len(components) and not any(
+                    comp.get("name") == "VEVENT" for comp in components.findall("c:comp", NAMESPACES)
+                ):
+                    continue
+                name = prop.find("d:displayname", NAMESPACES)
+                ctag = prop.find("cs:getctag", NAMESPACES)
+                calendars.append(CalDAVCalendar(
+                    urljoin(self.home_url, href.text.strip()),
+                    name.text if name is not None else None,
+                    ctag.text if ctag is not None else None
+                ))
+
+            self._calendars = calendars
+            self._discovered_at = time.monotonic()
+            return calendars
+
+    async def default_calendar(self) -> CalDAVCalendar:
+        calendars = await self.calendars()
+        if not calendars:
+            raise CalDAVError("No calendar that accepts events")
+        return calendars[0]
+
+    async def query_events(self, calendar_url: str, start: datetime, end: datetime) -> List[str]:
+        """calendar-query：取得與 [start, end) 重疊的事件（伺服器展開重複事件），回傳 iCalendar 文字"""
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<c:calendar-query xmlns:d="{DAV}" xmlns:c="{CALDAV}">'
+            "<d:prop><d:getetag/>"
+            f'<c:calendar-data><c:expand start="{_utc_text(start)}" end="{_utc_text(end)}"/></c:calendar-data>'
+            "</d:prop>"
+            '<c:filter><c:comp-filter name="VCALENDAR"><c:comp-filter name="VEVENT">'
+            f'<c:time-range start="{_utc_text(start)}" end="{_utc_text(end)}"/>'
+            "</c:comp-filter></c:comp-filter></c:filter>"
+            "</c:calendar-query>"
+        )
+        response = await self.request("REPORT", calendar_url, body, {"Depth": "1"})
+        root = _parse_xml(response)
+        return [
+            data.text
+            for data in root.findall(".//c:calendar-data", NAMESPACES)
+            if data.text
+        ]
+
+    async def sync_collection(self, calendar_url: str, sync_token: Optional[str]) -> Tuple[Dict[str, str], List[str], Optional[str]]:
+        """
+        sync-collection（RFC 6578）：自 sync_token 之後變動的事件，回傳 ({href: etag}, [已刪除的 href], 新的 sync token)。
+        sync_token 為 None 時列出全部事件；token 失效時伺服器回傳 403 / 409（CalDAVError.status）。
+        """
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<d:sync-collection xmlns:d="{DAV}">'
+            f"<d:sync-token>{escape(sync_token or '')}</d:sync-token>"
+            "<d:sync-level>1</d:sync-level>"
+            "<d:prop><d:getetag/></d:prop>"
+            "</d:sync-collection>"
+        )
+        response = await self.request("REPORT", calendar_url, body)
+        root = _parse_xml(response)
+
+        changed: Dict[str, str] = {}
+        removed: List[str] = []
+        for item in root.findall("d:response", NAMESPACES):
+            href = item.find("d:href", NAMESPACES)
+            if href is None or not href.text:
+                continue
+            url = urljoin(calendar_url, href.text.strip())
+            if url.rstrip("/") == calendar_url.rstrip("/"):
+                continue
+            status = item.find("d:status", NAMESPACES)
+            if status is not None and status.text and " 404 " in f"{status.text} ":
+                removed.append(url)
+                continue
+            etag = item.find(".//d:getetag", NAMESPACES)
+            if etag is not None and etag.text:
+                changed[url] = etag.text.strip()
+
+        token = root.find("d:sync-token", NAMESPACES)
+        return changed, removed, token.text.strip() if token is not None and token.text else None
+
+    async def multiget(
+        self,
+        calendar_url: str,
+        hrefs: List[str],
+        start: datetime,
+        end: datetime,
+        chunk_size: int = 100
+    ) -> Dict[str, Tuple[str, str]]:
+        """calendar-multiget：取得指定事件（重複事件在 [start, end) 內展開），回傳 {href: (etag, iCalendar 文字)}"""
+        documents: Dict[str, Tuple[str, str]] = {}
+        for i in range(0, len(hrefs), chunk_size):
+            inner = "".join(f"<d:href>{escape(urlsplit(href).path)}</d:href>" for href in hrefs[i:i + chunk_size])
+            body = (
+                '<?xml version="1.0" encoding="utf-8"?>'
+                f'<c:calendar-multiget xmlns:d="{DAV}" xmlns:c="{CALDAV}">'
+                "<d:prop><d:getetag/>"
+                f'<c:calendar-data><c:expand start="{_utc_text(start)}" end="{_utc_text(end)}"/></c:calendar-data>'
+                f"</d:prop>{inner}"
+                "</c:calendar-multiget>"
+            )
+            response = await self.request("REPORT", calendar_url, body, {"Depth": "1"})
+            root = _parse_xml(response)
+            for item in root.findall("d:response", NAMESPACES):
+                href = item.find("d:href", NAMESPACES)
+                data = item.find(".//c:calendar-data", NAMESPACES)
+                etag = item.find(".//d:getetag", NAMESPACES)
+                if href is None or not href.text or data is None or not data.text:
+                    continue
+                documents[urljoin(calendar_url, href.text.strip())] = (
+                    etag.text.strip() if etag is not None and etag.text else "",
+                    data.text
+                )
+        return documents
+
+    async def busy_intervals(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """所有行事曆在 [start, end) 內的忙碌時段（各行事曆同時查詢）"""
+        calendars = await self.calendars()
+        results = await asyncio.gather(*(self.query_events(c.url, start, end) for c in calendars))
+        intervals = []
+        for documents in results:
+            for ics in documents:
+                intervals.extend(
+                    (max(s, start), min(e, end)) for s, e in parse_busy_intervals(ics) if s < end and e > start
+                )
+        return sorted(intervals)
+
+    async def put_event(self, url: Optional[str], ics: str, resource_name: Optional[str] = None) -> str:
+        """
+        建立（url 為 None，放在預設行事曆的 <resource_name>.ics）或覆寫事件，回傳事件的 URL。
+        建立時以 If-None-Match: * 送出；資源已存在（先前的重試已建立）就改為覆寫，不會產生重複事件。
+        """
+        headers = {"Content-Type": "text/calendar; charset=utf-8"}
+        if url is None:
+            calendar = await self.default_calendar()
+            base = calendar.url if calendar.url.endswith("/") else calendar.url + "/"
+            url = urljoin(base, f"{resource_name or uuid.uuid4()}.ics")
+            response = await self.request("PUT", url, ics, {**headers, "If-None-Match": "*"}, ok=(200, 201, 204, 412))
+            if response.status_code != 412:
+                return url
+        await self.request("PUT", url, ics, headers)
+        return url
+
+    async def delete_event(self, url: str) -> None:
+        """刪除事件；已不存在（404 / 410）也視為成功"""
+        await self.request("DELETE", url, ok=(200, 204, 404, 410))
+
+
+class CalDAVSessionPool:
+    """
+    依 user_id 重用 CalDAVSession（LRU，閒置逾時關閉）。
+    需要連續送出多個請求時用 lease() 取得 session，使用中的 session 被逐出時等用完才關閉。
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        idle_seconds: float,
+        base_url: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.base_url = base_url
+        self.transport = transport
+        # user_id -> (憑證指紋, session)
+        self._sessions: "OrderedDict[str, Tuple[Tuple[str, str], CalDAVSession]]" = OrderedDict()
+
+    async def get(self, user_id: str, username: str, encrypted_password: str) -> CalDAVSession:
+        """取得使用者的 session；憑證與上次不同時重新建立（只在建立時解密密碼）"""
+        fingerprint = (username, encrypted_password)
+        entry = self._sessions.get(user_id)
+        if entry is not None and entry[0] == fingerprint:
+            self._sessions.move_to_end(user_id)
+            return entry[1]
+
+        if entry is not None:
+            del self._sessions[user_id]
+            await entry[1].close()
+
+        session = CalDAVSession(
+            username,
+            decrypt_app_password(encrypted_password),
+            base_url=self.base_url,
+            transport=self.transport
+        )
+        self._sessions[user_id] = (fingerprint, session)
+        await self._evict()
+        return session
+
+    @asynccontextmanager
+    async def lease(self, user_id: str, username: str, encrypted_password: str):
+        """取得使用者的 session 並標記使用中"""
+        session = await self.get(user_id, username, encrypted_password)
+        async with session.lease():
+            yield session
+
+    async def _evict(self) -> None:
+        now = time.monotonic()
+        expired = [
+            user_id for user_id, (_, session) in self._sessions.items()
+            if now - session.last_used > self.idle_seconds
+        ]
+        while len(self._sessions) - len(expired) > self.max_sessions:
+            oldest = next(user_id for user_id in self._sessions if user_id not in expired)
+            expired.append(oldest)
+        for user_id in expired:
+            _, session = self._sessions.pop(user_id)
+            await session.close()
+
+    async def discard(self, user_id: str) -> None:
+        entry = self._sessions.pop(user_id, None)
+        if entry is not None:
+            await entry[1].close()
+
+    async def close(self) -> None:
+        """關閉所有 session（app shutdown 時呼叫）"""
+        sessions = [session for _, session in self._sessions.values()]
+        self._sessions.clear()
+        for session in sessions:
+            await session.close()
+
+
+caldav_sessions = CalDAVSessionPool(
+    max_sessions=settings.APPLE_CALDAV_MAX_SESSIONS,
+    idle_seconds=settings.APPLE_CALDAV_SESSION_IDLE_SECONDS
+)
@@ -0,0 +1,360 @@
+"""
+行事曆忙碌時段快取
+
+排程功能（例如活動候選時間評分）一次需要數十位成員的忙碌時段，
+向 Google / Apple 查詢每位使用者都要數百毫秒。取得的結果存在
+calendar_busy_windows / calendar_busy_intervals，多個 worker 共用：
+
+- 每個使用者、每個 provider 記錄一段已取得的時間範圍（至少 CALENDAR_BUSY_WINDOW_DAYS 天）與取得時間
+- 查詢範圍在已取得的範圍內：直接讀資料庫；超過 CALENDAR_BUSY_CACHE_TTL_SECONDS 的先回傳舊資料，
+  由背景更新（CalendarBusyStore 本身是 BackgroundWorker）
+- 不在範圍內或從未取得：同時向行事曆查詢（最多 CALENDAR_FREEBUSY_CONCURRENCY 個）後存入
+- 超過 CALENDAR_BUSY_IDLE_SECONDS 沒有被查詢的範圍不再更新，並定期刪除
+
+provider 由 provider_factory(name, session) 建立，測試時可換成假的 provider。
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, insert, and_, or_
+import asyncio
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from app.core.background import BackgroundWorker
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, upsert
+from app.models.calendar_integration import CalendarBusyWindow, CalendarBusyInterval
+from app.models.user import User
+from app.services.calendar_service import (
+    BusySlot,
+    CalendarProvider,
+    PROVIDER_PLUGINS,
+    PROVIDER_CONNECTIONS,
+    connected_user_ids,
+    load_provider_class,
+    naive_utc,
+    provider_enabled
+)
+
+ProviderFactory = Callable[[str, AsyncSession], CalendarProvider]
+
+
+def _default_provider_factory(name: str, session: AsyncSession) -> CalendarProvider:
+    return load_provider_class(name)(session)
+
+
+class CalendarBusyStore(BackgroundWorker):
+    """忙碌時段快取與背景更新"""
+
+    name = "calendar-busy-store"
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        window_days: int,
+        idle_seconds: float,
+        concurrency: int,
+        batch_size: int,
+        poll_interval: float,
+        provider_factory: Optional[ProviderFactory] = None,
+        provider_names: Optional[List[str]] = None,
+        lease_seconds: float = 60.0
+    ):
+        super().__init__(poll_interval)
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.window = timedelta(days=window_days)
+        self.idle = timedelta(seconds=idle_seconds)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.provider_factory = provider_factory or _default_provider_factory
+        self.provider_names = provider_names
+        self.lease = timedelta(seconds=lease_seconds)
+        self._last_prune = datetime.min
+        # 查詢失敗的 (user_id, provider) 在此時間前不再向行事曆查詢（只記錄在本 worker）
+        self._retry_after: Dict[Tuple[str, str], datetime] = {}
+
+    def providers(self) -> List[str]:
+        """要查詢的 provider（預設為目前啟用的 provider）"""
+        if self.provider_names is not None:
+            return list(self.provider_names)
+        return [name for name in PROVIDER_PLUGINS if provider_enabled(name)]
+
+    async def _connected(self, db: AsyncSession, name: str, user_ids: List[str]) -> List[str]:
+        if name not in PROVIDER_CONNECTIONS:
+            # 沒有連結資料表的 provider（例如測試用的假 provider）視為所有使用者都已連結
+            return list(user_ids)
+        return await connected_user_ids(db, name, user_ids)
+
+    async def _fetch(
+        self,
+        name: str,
+        user: User,
+        start: datetime,
+        end: datetime
+    ) -> Optional[List[BusySlot]]:
+        """向行事曆查詢 [start, end) 並取代快取，provider 尚未實作時回傳 None；其他錯誤直接拋出"""
+        async with AsyncSessionLocal() as session:
+            try:
+                slots = await self.provider_factory(name, session).get_busy_slots(user, start, end)
+            except NotImplementedError:
+                return None
+            slots = sorted(
+                (BusySlot(naive_utc(slot.start), naive_utc(slot.end)) for slot in slots or []),
+                key=lambda slot: slot.start
+            )
+
+            now = datetime.utcnow()
+            await session.execute(
+                delete(CalendarBusyInterval).where(
+                    CalendarBusyInterval.user_id == user.id,
+                    CalendarBusyInterval.provider == name
+                )
+            )
+            if slots:
+                await session.execute(insert(CalendarBusyInterval), [
+                    {"user_id": user.id, "provider": name, "start_time": slot.start, "end_time": slot.end}
+                    for slot in slots
+                ])
+            await session.execute(upsert(
+                session,
+                CalendarBusyWindow.__table__,
+                {
+                    "user_id": user.id,
+                    "provider": name,
+                    "window_start": start,
+                    "window_end": end,
+                    "fetched_at": now,
+                    "last_used_at": now,
+                    "locked_until": None,
+                    "last_error": None
+                },
+                index_elements=["user_id", "provider"],
+                update_columns=["window_start", "window_end", "fetched_at", "last_used_at", "locked_until", "last_error"]
+            ))
+            await session.commit()
+            return slots
+
+    async def _load_users(self, db: AsyncSession, user_ids: Iterable[str]) -> Dict[str, User]:
+        result = await db.execute(select(User).where(User.id.in_(set(user_ids))))
+        return {u.id: u for u in result.scalars().all()}
+
+    async def get_busy_intervals(
+        self,
+        db: AsyncSession,
+        user_ids: Iterable[str],
+        start: datetime,
+        end: datetime
+    ) -> Dict[str, List[BusySlot]]:
+        """
+        多位使用者在 [start, end) 內的忙碌時段（naive UTC，依開始時間排序）。
+        沒有連結行事曆、provider 尚未實作或查詢失敗的使用者不會出現在結果中。
+        """
+        start, end = naive_utc(start), naive_utc(end)
+        user_ids = list(dict.fromkeys(user_ids))
+        names = self.providers()
+        if not user_ids or not names or start >= end:
+            return {}
+
+        pairs: List[Tuple[str, str]] = []
+        for name in names:
+            pairs.extend((user_id, name) for user_id in await self._connected(db, name, user_ids))
+        if not pairs:
+            return {}
+
+        result = await db.execute(
+            select(CalendarBusyWindow).where(
+                CalendarBusyWindow.user_id.in_({user_id for user_id, _ in pairs}),
+                CalendarBusyWindow.provider.in_(names)
+            )
+        )
+        windows = {(w.user_id, w.provider): w for w in result.scalars().all()}
+
+        now = datetime.utcnow()
+        covered, missing = [], []
+        stale = False
+        for key in pairs:
+            window = windows.get(key)
+            if window is not None and window.window_start <= start and window.window_end >= end:
+                covered.append(key)
+                stale = stale or window.fetched_at < now - self.ttl
+            elif self._retry_after.get(key, datetime.min) <= now:
+                missing.append(key)
+
+        busy: Dict[str, List[BusySlot]] = {}
+        if covered:
+            covered_keys = set(covered)
+            result = await db.execute(
+                select(
+                    CalendarBusyInterval.user_id,
+                    CalendarBusyInterval.provider,
+                    CalendarBusyInterval.start_time,
+                    CalendarBusyInterval.end_time
+                ).where(
+                    CalendarBusyInterval.user_id.in_({user_id for user_id, _ in covered}),
+                    CalendarBusyInterval.provider.in_({name for _, name in covered}),
+                    CalendarBusyInterval.start_time < end,
+                    CalendarBusyInterval.end_time > start
+                )
+            )
+            for user_id, name, slot_start, slot_end in result.all():
+                if (user_id, name) in covered_keys:
+                    busy.setdefault(user_id, []).append(BusySlot(slot_start, slot_end))
+            await self._touch(covered, now)
+
+        if missing:
+            users = await self._load_users(db, (user_id for user_id, _ in missing))
+            fetch_end = max(end, start + self.window)
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetch(name: str, user: User):
+                async with semaphore:
+                    try:
+                        return await self._fetch(name, user, start, fetch_end)
+                    except Exception as e:
+                        return e
+
+            jobs = [(user_id, name) for user_id, name in missing if user_id in users]
+            results = await asyncio.gather(*(fetch(name, users[user_id]) for user_id, name in jobs))
+            for (user_id, name), slots in zip(jobs, results):
+                if isinstance(slots, Exception):
+                    print(f"[{self.name}] {name} free/busy lookup for {user_id} failed: {slots}")
+                    self._retry_after[(user_id, name)] = now + self.lease
+                    continue
+                self._retry_after.pop((user_id, name), None)
+                overlapping = [slot for slot in slots or [] if slot.start < end and slot.end > start]
+                if overlapping:
+                    busy.setdefault(user_id, []).extend(overlapping)
+
+        for slots in busy.values():
+            slots.sort(key=lambda slot: slot.start)
+        if stale:
+            self.wake()
+        return busy
+
+    async def _touch(self, keys: List[Tuple[str, str]], now: datetime) -> None:
+        """更新最後查詢時間（使用自己的 session，不影響呼叫端的交易）"""
+        by_provider: Dict[str, List[str]] = {}
+        for user_id, name in keys:
+            by_provider.setdefault(name, []).append(user_id)
+        async with AsyncSessionLocal() as session:
+            for name, user_ids in by_provider.items():
+                await session.execute(
+                    update(CalendarBusyWindow)
+                    .where(CalendarBusyWindow.provider == name, CalendarBusyWindow.user_id.in_(user_ids))
+                    .values(last_used_at=now)
+                )
+            await session.commit()
+
+    async def invalidate(self, db: AsyncSession, user_id: str, provider: Optional[str] = None) -> None:
+        """刪除使用者的快取（重新連結或中斷行事曆時）；不 commit，由呼叫端一併提交"""
+        for model in (CalendarBusyInterval, CalendarBusyWindow):
+            query = delete(model).where(model.user_id == user_id)
+            if provider is not None:
+                query = query.where(model.provider == provider)
+            await db.execute(query)
+
+    async def run_once(self) -> int:
+        """重新取得過期且近期仍被查詢的範圍"""
+        now = datetime.utcnow()
+        claimable = and_(
+            CalendarBusyWindow.fetched_at < now - self.ttl,
+            CalendarBusyWindow.last_used_at >= now - self.idle,
+            CalendarBusyWindow.window_end > now,
+            or_(CalendarBusyWindow.locked_until.is_(None), CalendarBusyWindow.locked_until < now)
+        )
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    CalendarBusyWindow.user_id,
+                    CalendarBusyWindow.provider,
+                    CalendarBusyWindow.window_start,
+                    CalendarBusyWindow.window_end
+                )
+                .where(claimable)
+                .order_by(CalendarBusyWindow.fetched_at)
+                .limit(self.batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                await self._prune(db)
+                return 0
+
+            # 以 locked_until 認領，多個 worker 同時執行也不會重複查詢
+            claimed = []
+            for row in rows:
+                result = await db.execute(
+                    update(CalendarBusyWindow)
+                    .where(
+                        CalendarBusyWindow.user_id == row.user_id,
+                        CalendarBusyWindow.provider == row.provider,
+                        claimable
+                    )
+                    .values(locked_until=now + self.lease)
+                )
+                if result.rowcount:
+                    claimed.append(row)
+            await db.commit()
+
+            names = set(self.providers())
+            users = await self._load_users(db, (row.user_id for row in claimed))
+            connected = {
+                name: set(await self._connected(db, name, [row.user_id for row in claimed if row.provider == name]))
+                for name in names
+            }
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def refresh(row):
+                async with semaphore:
+                    try:
+                        await self._fetch(row.provider, users[row.user_id], row.window_start, row.window_end)
+                        return None
+                    except Exception as e:
+                        return e
+
+            active = [row for row in claimed if row.user_id in connected.get(row.provider, ())]
+            errors = await asyncio.gather(*(refresh(row) for row in active))
+
+            # 已停用或已中斷連結的 provider 不再保留快取
+            for row in claimed:
+                if row.user_id not in connected.get(row.provider, ()):
+                    await self.invalidate(db, row.user_id, row.provider)
+            for row, error in zip(active, errors):
+                if error is not None:
+                    print(f"[{self.name}] {row.provider} refresh for {row.user_id} failed: {error}")
+                    await db.execute(
+                        update(CalendarBusyWindow)
+                        .where(CalendarBusyWindow.user_id == row.user_id, CalendarBusyWindow.provider == row.provider)
+                        .values(last_error=str(error)[:500])
+                    )
+            await db.commit()
+            return len(claimed)
+
+    async def _prune(self, db: AsyncSession) -> None:
+        # 每小時刪除一次閒置超過 CALENDAR_BUSY_IDLE_SECONDS 的範圍與其忙碌時段
+        now = datetime.utcnow()
+        if now - self._last_prune < timedelta(hours=1):
+            return
+        self._last_prune = now
+        idle = CalendarBusyWindow.last_used_at < now - self.idle
+        await db.execute(
+            delete(CalendarBusyInterval).where(
+                select(CalendarBusyWindow.user_id)
+                .where(
+                    CalendarBusyWindow.user_id == CalendarBusyInterval.user_id,
+                    CalendarBusyWindow.provider == CalendarBusyInterval.provider,
+                    idle
+                )
+                .exists()
+            )
+        )
+        await db.execute(delete(CalendarBusyWindow).where(idle))
+        await db.commit()
+
+
+calendar_busy_store = CalendarBusyStore(
+    ttl_seconds=settings.CALENDAR_BUSY_CACHE_TTL_SECONDS,
+    window_days=settings.CALENDAR_BUSY_WINDOW_DAYS,
+    idle_seconds=settings.CALENDAR_BUSY_IDLE_SECONDS,
+    concurrency=settings.CALENDAR_FREEBUSY_CONCURRENCY,
+    batch_size=settings.CALENDAR_BUSY_REFRESH_BATCH_SIZE,
+    poll_interval=settings.CALENDAR_BUSY_REFRESH_INTERVAL_SECONDS
+)
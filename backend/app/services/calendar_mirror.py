@@ -0,0 +1,183 @@
+"""
+行事曆事件的本機鏡像
+
+每次查詢忙碌時段都列出使用者整個行事曆，延遲與 API 配額都隨事件數量成長。
+Google / Apple provider 把遠端事件的忙碌時段存在 calendar_mirror_events，只下載有變動的事件：
+- Google：events.list 的 syncToken，只回傳上次同步後變動 / 刪除的事件；token 過期（410）時重新完整同步
+- Apple：先比對行事曆的 ctag，沒有變動就不送任何請求；有變動時以 sync-collection 取得變動的 href 與 etag，
+  etag 和鏡像不同的事件才以 calendar-multiget 下載；sync-token 失效時重新完整同步
+- 重複事件在 window（過去 CALENDAR_MIRROR_PAST_DAYS 天到未來 CALENDAR_MIRROR_DAYS 天）內展開，
+  剩餘範圍不到一半時重建
+
+這裡只負責鏡像的讀寫，與遠端的同步由各 provider 的 sync_mirror() 實作。
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert
+from datetime import datetime, timedelta
+from typing import Collection, Dict, Iterable, List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import upsert
+from app.models.calendar_integration import CalendarMirrorCollection, CalendarMirrorEvent
+from app.services.calendar_service import BusySlot
+
+Intervals = List[Tuple[datetime, datetime]]
+
+# SQLite 一個查詢的參數數量有限，IN 條件分批執行
+_CHUNK_SIZE = 500
+
+
+class MirrorChanges:
+    """一個遠端行事曆的增量變動"""
+
+    def __init__(
+        self,
+        changed: Dict[str, Tuple[Optional[str], Intervals]],
+        removed: Iterable[str],
+        sync_token: Optional[str],
+        window: Tuple[datetime, datetime],
+        ctag: Optional[str] = None,
+        reset: bool = False
+    ):
+        self.changed = changed  # resource_id -> (etag, 忙碌時段)
+        self.removed = list(removed)
+        self.sync_token = sync_token
+        self.window = window
+        self.ctag = ctag
+        self.reset = reset  # 完整同步：先清掉這個行事曆原有的鏡像
+
+
+def mirror_window(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """新建鏡像時展開重複事件的範圍（以 UTC 日為單位）"""
+    today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (
+        today - timedelta(days=settings.CALENDAR_MIRROR_PAST_DAYS),
+        today + timedelta(days=settings.CALENDAR_MIRROR_DAYS)
+    )
+
+
+def needs_rebuild(state: Optional[CalendarMirrorCollection], now: Optional[datetime] = None) -> bool:
+    """沒有同步過、沒有 sync token，或 window 剩餘不到一半時需要完整同步"""
+    if state is None or not state.sync_token:
+        return True
+    now = now or datetime.utcnow()
+    return state.window_end < now + timedelta(days=settings.CALENDAR_MIRROR_DAYS / 2)
+
+
+def mirror_covers(states: Iterable[CalendarMirrorCollection], start: datetime, end: datetime) -> bool:
+    """所有行事曆的鏡像都涵蓋 [start, end)"""
+    return all(s.window_start <= start and s.window_end >= end for s in states)
+
+
+async def load_mirror_states(db: AsyncSession, user_id: str, provider: str) -> Dict[str, CalendarMirrorCollection]:
+    result = await db.execute(
+        select(CalendarMirrorCollection).where(
+            CalendarMirrorCollection.user_id == user_id,
+            CalendarMirrorCollection.provider == provider
+        )
+        # 同步狀態以 upsert 更新，重新讀取時覆寫 session 中已載入的物件
+        .execution_options(populate_existing=True)
+    )
+    return {s.collection_id: s for s in result.scalars().all()}
+
+
+async def load_mirror_etags(db: AsyncSession, user_id: str, provider: str, collection_id: str) -> Dict[str, Optional[str]]:
+    """鏡像中每個事件的 etag"""
+    result = await db.execute(
+        select(CalendarMirrorEvent.resource_id, CalendarMirrorEvent.etag).where(
+            CalendarMirrorEvent.user_id == user_id,
+            CalendarMirrorEvent.provider == provider,
+            CalendarMirrorEvent.collection_id == collection_id
+        )
+    )
+    return {row.resource_id: row.etag for row in result.all()}
+
+
+async def apply_mirror_changes(
+    db: AsyncSession,
+    user_id: str,
+    provider: str,
+    collection_id: str,
+    changes: MirrorChanges
+) -> None:
+    """把一個行事曆的變動寫入鏡像並記錄同步狀態（不 commit）"""
+    scope = (
+        CalendarMirrorEvent.user_id == user_id,
+        CalendarMirrorEvent.provider == provider,
+        CalendarMirrorEvent.collection_id == collection_id
+    )
+    if changes.reset:
+        await db.execute(delete(CalendarMirrorEvent).where(*scope))
+    else:
+        stale = list(set(changes.changed) | set(changes.removed))
+        for i in range(0, len(stale), _CHUNK_SIZE):
+            await db.execute(
+                delete(CalendarMirrorEvent).where(*scope, CalendarMirrorEvent.resource_id.in_(stale[i:i + _CHUNK_SIZE]))
+            )
+
+    rows = []
+    for resource_id, (etag, intervals) in changes.changed.items():
+        base = {
+            "user_id": user_id,
+            "provider": provider,
+            "collection_id": collection_id,
+            "resource_id": resource_id,
+            "etag": etag
+        }
+        if intervals:
+            rows.extend({**base, "start_time": start, "end_time": end} for start, end in intervals)
+        else:
+            rows.append({**base, "start_time": None, "end_time": None})
+    if rows:
+        await db.execute(insert(CalendarMirrorEvent), rows)
+
+    await db.execute(upsert(
+        db,
+        CalendarMirrorCollection.__table__,
+        {
+            "user_id": user_id,
+            "provider": provider,
+            "collection_id": collection_id,
+            "sync_token": changes.sync_token,
+            "ctag": changes.ctag,
+            "window_start": changes.window[0],
+            "window_end": changes.window[1],
+            "synced_at": datetime.utcnow()
+        },
+        index_elements=["user_id", "provider", "collection_id"],
+        update_columns=["sync_token", "ctag", "window_start", "window_end", "synced_at"]
+    ))
+
+
+async def drop_mirror(
+    db: AsyncSession,
+    user_id: str,
+    provider: str,
+    collection_ids: Optional[Collection[str]] = None
+) -> None:
+    """刪除鏡像（collection_ids 為 None 時刪除該 provider 全部行事曆；不 commit）"""
+    for model in (CalendarMirrorEvent, CalendarMirrorCollection):
+        query = delete(model).where(model.user_id == user_id, model.provider == provider)
+        if collection_ids is not None:
+            query = query.where(model.collection_id.in_(list(collection_ids)))
+        await db.execute(query)
+
+
+async def load_mirror_intervals(
+    db: AsyncSession,
+    user_id: str,
+    provider: str,
+    start: datetime,
+    end: datetime
+) -> List[BusySlot]:
+    """從鏡像讀取 [start, end) 內的忙碌時段"""
+    result = await db.execute(
+        select(CalendarMirrorEvent.start_time, CalendarMirrorEvent.end_time)
+        .where(
+            CalendarMirrorEvent.user_id == user_id,
+            CalendarMirrorEvent.provider == provider,
+            CalendarMirrorEvent.start_time < end,
+            CalendarMirrorEvent.end_time > start
+        )
+        .order_by(CalendarMirrorEvent.start_time)
+    )
+    return [BusySlot(max(row.start_time, start), min(row.end_time, end)) for row in result.all()]
@@ -1,6 +1,12 @@
+import importlib
+import importlib.util
 from abc import ABC, abstractmethod
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Type
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete
+from app.core.config import settings
+from app.core.database import upsert
+from app.models.calendar_integration import AppleCalendarCredential, GoogleToken, CalendarEvent, CalendarSyncJob
 from app.models.user import User
 from app.models.event import Event
 
@@ -41,31 +47,164 @@ class CalendarProvider(ABC):
         pass
 
 
+# 行事曆 provider 外掛：module 與 class 名稱，第一次使用時才 import。
+# provider 的 module 不在最上層 import google-api-python-client 等大型套件，
+# 只在實際呼叫 API 的方法內 import，沒有設定的整合不會增加 worker 啟動時間與記憶體。
+PROVIDER_PLUGINS: Dict[str, str] = {
+    "google": "app.services.google_calendar_provider:GoogleCalendarProvider",
+    "apple": "app.services.apple_calendar_provider:AppleCalendarProvider",
+}
+
+# provider 需要的第三方套件（只檢查是否安裝，不 import）
+PROVIDER_REQUIREMENTS: Dict[str, List[str]] = {
+    "google": ["googleapiclient", "google_auth_oauthlib"],
+    "apple": ["httpx"],  # 使用 app.services.caldav_client（非同步 CalDAV）
+}
+
+# provider 需要的設定：全部有值才啟用（沒有設定的整合不載入）
+PROVIDER_SETTINGS: Dict[str, List[str]] = {
+    "google": ["GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET"],
+    "apple": ["APPLE_CALENDAR_ENABLED"],
+}
+
+# 記錄使用者已連結該 provider 的資料表（以 user_id 查詢）
+PROVIDER_CONNECTIONS = {
+    "google": GoogleToken,
+    "apple": AppleCalendarCredential,
+}
+
+_provider_classes: Dict[str, Type[CalendarProvider]] = {}
+
+
+def provider_enabled(name: str) -> bool:
+    """
+    provider 是否可用：PROVIDER_SETTINGS 的設定都有值，且需要的套件已安裝
+    （Google 需要 OAuth client；Apple 預設啟用，帳號由每個使用者自己連結）
+    """
+    if not all(getattr(settings, key) for key in PROVIDER_SETTINGS[name]):
+        return False
+    return all(importlib.util.find_spec(module) is not None for module in PROVIDER_REQUIREMENTS[name])
+
+
+def load_provider_class(name: str) -> Type[CalendarProvider]:
+    """import 並快取 provider class"""
+    cls = _provider_classes.get(name)
+    if cls is None:
+        module_name, class_name = PROVIDER_PLUGINS[name].split(":")
+        cls = getattr(importlib.import_module(module_name), class_name)
+        _provider_classes[name] = cls
+    return cls
+
+
+def get_calendar_providers(db) -> List[CalendarProvider]:
+    """目前啟用的 provider 實例"""
+    return [
+        load_provider_class(name)(db)
+        for name in PROVIDER_PLUGINS
+        if provider_enabled(name)
+    ]
+
+
+def preload_calendar_providers() -> List[str]:
+    """啟動時預先載入有設定的 provider，回傳載入的名稱"""
+    loaded = [name for name in PROVIDER_PLUGINS if provider_enabled(name)]
+    for name in loaded:
+        load_provider_class(name)
+    return loaded
+
+
+def naive_utc(value: datetime) -> datetime:
+    """provider 回傳的時間統一為 naive UTC（有時區的換算，沒有的視為 UTC）"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def connected_user_ids(db, name: str, user_ids: Iterable[str]) -> List[str]:
+    """user_ids 中已連結該 provider 的使用者"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    model = PROVIDER_CONNECTIONS[name]
+    result = await db.execute(select(model.user_id).where(model.user_id.in_(user_ids)))
+    return [row[0] for row in result.fetchall()]
+
+
+# 同步動作合併後的狀態（活動目前不能編輯，沒有 update；重新加入時 upsert 會更新既有的行事曆事件）
+SYNC_ACTIONS = {"create": "upsert", "delete": "delete"}
+
+
 async def sync_event_to_calendars(
     db,
-    user: User,
-    event: Event,
-    action: str,  # create / update / delete
-    providers: List[CalendarProvider]
-) -> None:
-    """同步事件到使用者的所有行事曆"""
-    # TODO: 從 calendar_events 表查詢已同步的事件
-    # 根據 action 呼叫對應的 provider 方法
-    
-    for provider in providers:
-        try:
-            if action == "create":
-                external_id = await provider.create_event(user, event)
-                # 儲存到 calendar_events 表
-                # TODO: 實作
-            elif action == "update":
-                # TODO: 取得 external_event_id
-                # await provider.update_event(user, event, external_event_id)
-                pass
-            elif action == "delete":
-                # TODO: 取得 external_event_id
-                # await provider.delete_event(user, external_event_id)
-                pass
-        except Exception as e:
-            print(f"Failed to sync event to calendar: {e}")
+    event_id: str,
+    action: str,  # create / delete
+    user_ids: Optional[Iterable[str]] = None
+) -> int:
+    """
+    把活動同步到使用者已連結的行事曆，寫入 calendar_sync_jobs 後由背景的 calendar_sync_worker 執行，回傳工作數。
+    - 同一個活動、使用者、provider 只有一列，尚未執行的動作合併為最後的狀態，
+      並延後 CALENDAR_SYNC_DEBOUNCE_SECONDS 執行，連續修改只會呼叫一次行事曆 API
+    - delete 會把 calendar_events 的對應移到工作中（活動本身可能隨後被刪除）；
+      user_ids 為 None 時處理所有已同步或排程中的使用者
+    這裡不 commit：呼叫端提交後再呼叫 calendar_sync_worker.wake()。
+    """
+    if action not in SYNC_ACTIONS:
+        raise ValueError(f"Unknown calendar sync action: {action}")
+    desired = SYNC_ACTIONS[action]
+    user_ids = list(user_ids) if user_ids is not None else None
+
+    # (user_id, provider) -> 要刪除的行事曆事件 id
+    targets: Dict[tuple, Optional[str]] = {}
+    if desired == "upsert":
+        for name in PROVIDER_PLUGINS:
+            if provider_enabled(name):
+                for user_id in await connected_user_ids(db, name, user_ids or []):
+                    targets[(user_id, name)] = None
+    else:
+        mapping_filter = [CalendarEvent.event_id == event_id]
+        job_filter = [CalendarSyncJob.event_id == event_id, CalendarSyncJob.status == "pending"]
+        if user_ids is not None:
+            mapping_filter.append(CalendarEvent.user_id.in_(user_ids))
+            job_filter.append(CalendarSyncJob.user_id.in_(user_ids))
+
+        result = await db.execute(
+            select(CalendarEvent.user_id, CalendarEvent.provider, CalendarEvent.external_event_id).where(*mapping_filter)
+        )
+        for user_id, name, external_event_id in result.all():
+            targets[(user_id, name)] = external_event_id
+        if targets:
+            await db.execute(delete(CalendarEvent).where(*mapping_filter))
+
+        # 還沒執行（或正在建立）的工作也改為刪除
+        result = await db.execute(select(CalendarSyncJob.user_id, CalendarSyncJob.provider).where(*job_filter))
+        for user_id, name in result.all():
+            targets.setdefault((user_id, name), None)
 
+    now = datetime.utcnow()
+    due = now + timedelta(seconds=settings.CALENDAR_SYNC_DEBOUNCE_SECONDS)
+    for (user_id, name), external_event_id in targets.items():
+        update_columns = ["action", "status", "attempts", "next_attempt_at", "last_error", "updated_at"]
+        if external_event_id:
+            update_columns.append("external_event_id")
+        await db.execute(upsert(
+            db,
+            CalendarSyncJob.__table__,
+            {
+                "event_id": event_id,
+                "user_id": user_id,
+                "provider": name,
+                "action": desired,
+                "external_event_id": external_event_id,
+                "status": "pending",
+                "version": 1,
+                "attempts": 0,
+                "next_attempt_at": due,
+                "last_error": None,
+                "created_at": now,
+                "updated_at": now
+            },
+            index_elements=["event_id", "user_id", "provider"],
+            update_columns=update_columns,
+            update_values={"version": CalendarSyncJob.__table__.c.version + 1}
+        ))
+    return len(targets)
@@ -0,0 +1,259 @@
+"""
+活動同步到行事曆的背景 worker
+
+calendar_service.sync_event_to_calendars() 只寫入 calendar_sync_jobs，API 不等待行事曆回應；
+CalendarSyncWorker 取出到期的工作執行：
+- 以 claim_token + locked_until 認領，多個 worker 同時執行也不會重複呼叫
+- 每個 provider 以各自的 semaphore 限制同時進行的 API 呼叫數
+- 依 calendar_events 的對應決定建立或更新，重試不會在行事曆上建立重複的事件
+- 執行期間有新的動作排入（version 改變）就不標記完成，下一輪以最新的狀態再同步一次
+- 失敗時指數退避重試，超過 max_attempts 或 provider 尚未實作時標記為 dead
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.exc import IntegrityError
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from app.core.background import BackgroundWorker, backoff_delay
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, upsert
+from app.models.calendar_integration import CalendarEvent, CalendarSyncJob
+from app.models.event import Event
+from app.models.user import User
+from app.services.calendar_service import CalendarProvider, load_provider_class, provider_enabled
+
+ProviderFactory = Callable[[str, AsyncSession], CalendarProvider]
+
+
+class PermanentSyncError(Exception):
+    """不需要重試的錯誤"""
+
+
+class CalendarSyncWorker(BackgroundWorker):
+    """從 calendar_sync_jobs 取出到期的工作並同步到行事曆"""
+
+    name = "calendar-sync"
+
+    def __init__(
+        self,
+        batch_size: int,
+        concurrency: int,
+        max_attempts: int,
+        poll_interval: float,
+        lease_seconds: float = 120.0,
+        provider_factory: Optional[ProviderFactory] = None
+    ):
+        super().__init__(poll_interval)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.provider_factory = provider_factory or (lambda name, session: load_provider_class(name)(session))
+        self._last_prune = datetime.min
+
+    async def _claim(self, db: AsyncSession) -> List:
+        now = datetime.utcnow()
+        claimable = and_(
+            CalendarSyncJob.status == "pending",
+            CalendarSyncJob.next_attempt_at <= now,
+            or_(CalendarSyncJob.locked_until.is_(None), CalendarSyncJob.locked_until < now)
+        )
+
+        result = await db.execute(
+            select(CalendarSyncJob.id)
+            .where(claimable)
+            .order_by(CalendarSyncJob.next_attempt_at)
+            .limit(self.batch_size)
+        )
+        ids = [row[0] for row in result.all()]
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        await db.execute(
+            update(CalendarSyncJob)
+            .where(CalendarSyncJob.id.in_(ids), claimable)
+            .values(claim_token=token, locked_until=now + timedelta(seconds=self.lease_seconds))
+        )
+        await db.commit()
+
+        # 只讀取執行需要的欄位：執行期間同一列可能被新的動作更新
+        result = await db.execute(
+            select(
+                CalendarSyncJob.id,
+                CalendarSyncJob.event_id,
+                CalendarSyncJob.user_id,
+                CalendarSyncJob.provider,
+                CalendarSyncJob.action,
+                CalendarSyncJob.external_event_id,
+                CalendarSyncJob.version,
+                CalendarSyncJob.attempts,
+                CalendarSyncJob.claim_token
+            ).where(CalendarSyncJob.claim_token == token)
+        )
+        jobs = result.all()
+        await db.commit()
+        return jobs
+
+    async def _execute(self, job, user: Optional[User], event: Optional[Event]) -> Optional[str]:
+        """
+        執行一個工作，回傳新建立的行事曆事件 id（沒有建立則為 None）。
+        upsert：有對應就更新，否則建立；活動已不存在時不做任何事。
+        delete：刪除記錄在工作中的行事曆事件。
+        """
+        if not provider_enabled(job.provider):
+            raise PermanentSyncError(f"Calendar provider {job.provider} is not enabled")
+        if user is None:
+            raise PermanentSyncError("User not found")
+
+        async with AsyncSessionLocal() as session:
+            provider = self.provider_factory(job.provider, session)
+            try:
+                if job.action == "delete":
+                    if job.external_event_id:
+                        await provider.delete_event(user, job.external_event_id)
+                    return None
+
+                if event is None:
+                    return None
+                mapping = await session.get(CalendarEvent, (job.event_id, job.user_id, job.provider))
+                # 排程刪除後又重新加入時，工作中還保留原本的行事曆事件，沿用即可
+                external_event_id = mapping.external_event_id if mapping else job.external_event_id
+                if external_event_id:
+                    await provider.update_event(user, event, external_event_id)
+                    return None if mapping else external_event_id
+                return await provider.create_event(user, event)
+            except NotImplementedError as e:
+                raise PermanentSyncError(str(e) or f"{job.provider} sync is not implemented")
+
+    async def _finish(self, db: AsyncSession, job, created: Optional[str], error: Optional[Exception]) -> None:
+        """記錄結果並釋放工作；執行期間有新的動作排入時維持 pending"""
+        now = datetime.utcnow()
+        result = await db.execute(
+            select(CalendarSyncJob.version, CalendarSyncJob.action).where(CalendarSyncJob.id == job.id)
+        )
+        current = result.first()
+        if current is None:
+            return
+        changed = current.version != job.version
+
+        values = {"claim_token": None, "locked_until": None, "updated_at": now}
+        if created:
+            # 活動仍存在才記錄對應；建立期間已改為刪除或活動已刪除時，把剛建立的事件留在工作中交給刪除工作
+            recorded = current.action == "upsert" and await self._record_mapping(db, job, created)
+            values["external_event_id"] = None if recorded else created
+
+        if error is None:
+            if not changed:
+                values.update(status="done", last_error=None)
+                if job.action == "delete":
+                    values["external_event_id"] = None
+        elif not changed:
+            attempts = job.attempts + 1
+            values.update(attempts=attempts, last_error=str(error)[:500])
+            if isinstance(error, PermanentSyncError) or attempts >= self.max_attempts:
+                values["status"] = "dead"
+                print(f"Calendar sync {job.action} of {job.event_id} to {job.provider} for {job.user_id} failed permanently: {error}")
+            else:
+                values["next_attempt_at"] = now + timedelta(seconds=backoff_delay(attempts))
+
+        result = await db.execute(
+            update(CalendarSyncJob)
+            .where(
+                CalendarSyncJob.id == job.id,
+                CalendarSyncJob.claim_token == job.claim_token,
+                CalendarSyncJob.version == current.version
+            )
+            .values(**values)
+        )
+        if not result.rowcount:
+            # 讀取狀態後又有新的動作排入：只釋放工作（保留剛建立的事件），下一輪依最新的狀態執行
+            released = {"claim_token": None, "locked_until": None, "updated_at": now}
+            if created:
+                released["external_event_id"] = created
+            await db.execute(
+                update(CalendarSyncJob)
+                .where(CalendarSyncJob.id == job.id, CalendarSyncJob.claim_token == job.claim_token)
+                .values(**released)
+            )
+
+    async def _record_mapping(self, db: AsyncSession, job, external_event_id: str) -> bool:
+        """
+        記錄活動與行事曆事件的對應，活動已刪除時回傳 False。
+        活動可能在檢查後、提交前被刪除（PostgreSQL 上違反外鍵），以 savepoint 執行，
+        失敗時只放棄這筆對應，不讓整批工作回滾後一再重試。
+        """
+        exists = await db.execute(select(Event.id).where(Event.id == job.event_id))
+        if exists.scalar_one_or_none() is None:
+            return False
+        try:
+            async with db.begin_nested():
+                await db.execute(upsert(
+                    db,
+                    CalendarEvent.__table__,
+                    {
+                        "event_id": job.event_id,
+                        "user_id": job.user_id,
+                        "provider": job.provider,
+                        "external_event_id": external_event_id
+                    },
+                    index_elements=["event_id", "user_id", "provider"],
+                    update_columns=["external_event_id"]
+                ))
+        except IntegrityError:
+            return False
+        return True
+
+    async def run_once(self) -> int:
+        async with AsyncSessionLocal() as db:
+            jobs = await self._claim(db)
+            if not jobs:
+                await self._prune(db)
+                return 0
+
+            result = await db.execute(select(User).where(User.id.in_({job.user_id for job in jobs})))
+            users = {u.id: u for u in result.scalars().all()}
+            result = await db.execute(select(Event).where(Event.id.in_({job.event_id for job in jobs})))
+            events = {e.id: e for e in result.scalars().all()}
+            await db.commit()
+
+            semaphores: Dict[str, asyncio.Semaphore] = {}
+
+            async def run(job):
+                semaphore = semaphores.setdefault(job.provider, asyncio.Semaphore(self.concurrency))
+                async with semaphore:
+                    try:
+                        return await self._execute(job, users.get(job.user_id), events.get(job.event_id)), None
+                    except Exception as e:
+                        return None, e
+
+            results = await asyncio.gather(*[run(job) for job in jobs])
+
+            for job, (created, error) in zip(jobs, results):
+                await self._finish(db, job, created, error)
+            await db.commit()
+            return len(jobs)
+
+    async def _prune(self, db: AsyncSession) -> None:
+        # 每小時清掉一次超過保留期限的已完成工作
+        now = datetime.utcnow()
+        if now - self._last_prune < timedelta(hours=1):
+            return
+        self._last_prune = now
+        await db.execute(
+            delete(CalendarSyncJob).where(
+                CalendarSyncJob.status == "done",
+                CalendarSyncJob.updated_at < now - timedelta(days=settings.CALENDAR_SYNC_RETENTION_DAYS)
+            )
+        )
+        await db.commit()
+
+
+calendar_sync_worker = CalendarSyncWorker(
+    batch_size=settings.CALENDAR_SYNC_BATCH_SIZE,
+    concurrency=settings.CALENDAR_SYNC_CONCURRENCY,
+    max_attempts=settings.CALENDAR_SYNC_MAX_ATTEMPTS,
+    poll_interval=settings.CALENDAR_SYNC_POLL_INTERVAL_SECONDS
+)
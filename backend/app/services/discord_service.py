@@ -1,66 +1,139 @@
+"""
+Discord webhook client
+
+通知由 notification_outbox 寫入資料庫後，NotificationDispatcher 逐列呼叫 post_webhook 送出
+（同時送出的數量由 NOTIFICATION_CONCURRENCY 限制）。這裡只負責共用連線與 Discord 的限流處理。
+"""
+import asyncio
+import time
 import httpx
-from typing import List
-from app.models.room import RoomWebhook
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-
-
-async def send_room_notification(db: AsyncSession, room_id: str, message: str) -> None:
-    """發送 Discord Webhook 通知"""
-    # 取得房間的所有 webhooks
-    result = await db.execute(
-        select(RoomWebhook).where(RoomWebhook.room_id == room_id)
-    )
-    webhooks = result.scalars().all()
-    
-    if not webhooks:
+from typing import Dict, Optional
+from app.core.config import settings
+
+# 長駐的 HTTP client：保留連線（keep-alive），避免每則通知都重新 TLS 握手
+_client: Optional[httpx.AsyncClient] = None
+
+# webhook URL -> 可以再送出的時間（time.monotonic()），依 Discord 429 / rate limit 標頭設定
+_blocked_until: Dict[str, float] = {}
+_BLOCKED_PRUNE_INTERVAL_SECONDS = 60.0
+_last_blocked_prune = 0.0
+
+
+class WebhookRateLimited(Exception):
+    """webhook 被 Discord 限流，retry_after 秒後才能再送"""
+
+    def __init__(self, url: str, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after:.1f}s")
+        self.url = url
+        self.retry_after = retry_after
+
+
+def get_client() -> httpx.AsyncClient:
+    """取得共用的 HTTP client（第一次使用時建立）"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.DISCORD_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.DISCORD_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.DISCORD_MAX_CONNECTIONS,
+                keepalive_expiry=30.0
+            )
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """關閉共用的 HTTP client（app shutdown 時呼叫）"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    # Discord 會同時提供 Retry-After 標頭與 JSON body 的 retry_after（秒，可能有小數）
+    value = response.headers.get("Retry-After")
+    if value is None:
+        try:
+            value = response.json().get("retry_after")
+        except ValueError:
+            value = None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _remember_rate_limit(url: str, response: httpx.Response) -> None:
+    # 成功時如果已經沒有剩餘額度，先記下重置時間，下一則通知就不會撞到 429
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            reset_after = float(response.headers.get("X-RateLimit-Reset-After", "0"))
+        except ValueError:
+            return
+        _blocked_until[url] = time.monotonic() + reset_after
+
+
+def _prune_blocked(now: float) -> None:
+    """移除已過期的限流記錄（每個曾被限流的 URL 都會留下一筆，定期清掉）"""
+    global _last_blocked_prune
+    if now - _last_blocked_prune < _BLOCKED_PRUNE_INTERVAL_SECONDS:
         return
-    
-    # 準備 Discord webhook payload
-    payload = {
+    _last_blocked_prune = now
+    for url in [url for url, until in _blocked_until.items() if until <= now]:
+        del _blocked_until[url]
+
+
+def build_message_payload(message: str) -> Dict:
+    """一般文字訊息的 Discord webhook payload"""
+    return {
         "content": message
     }
-    
-    # 對每個 webhook 發送
-    async with httpx.AsyncClient() as client:
-        for webhook in webhooks:
-            try:
-                await client.post(webhook.url, json=payload, timeout=5.0)
-            except Exception as e:
-                # 記錄錯誤但不中斷流程
-                print(f"Failed to send Discord webhook to {webhook.url}: {e}")
-
-
-async def send_event_notification(
-    db: AsyncSession,
-    room_id: str,
-    title: str,
-    description: str = None
-) -> None:
-    """發送活動通知（使用 Discord embed）"""
-    result = await db.execute(
-        select(RoomWebhook).where(RoomWebhook.room_id == room_id)
-    )
-    webhooks = result.scalars().all()
-    
-    if not webhooks:
-        return
-    
+
+
+def build_event_payload(title: str, description: str = None) -> Dict:
+    """活動通知的 Discord webhook payload（使用 embed）"""
     # Discord embed 格式
     embed = {
         "title": title,
         "description": description or "",
         "color": 0x5865F2  # Discord 藍色
     }
-    
-    payload = {
+
+    return {
         "embeds": [embed]
     }
-    
-    async with httpx.AsyncClient() as client:
-        for webhook in webhooks:
-            try:
-                await client.post(webhook.url, json=payload, timeout=5.0)
-            except Exception as e:
-                print(f"Failed to send Discord webhook to {webhook.url}: {e}")
 
+
+async def post_webhook(url: str, payload: Dict) -> None:
+    """
+    送出單一 webhook，失敗時丟出例外（由呼叫端決定是否重試）。
+    遇到 429 時，等待時間在 DISCORD_MAX_RATE_LIMIT_WAIT_SECONDS 內就等完再送一次，
+    否則丟出 WebhookRateLimited，讓呼叫端延後重試。
+    """
+    max_wait = settings.DISCORD_MAX_RATE_LIMIT_WAIT_SECONDS
+
+    now = time.monotonic()
+    _prune_blocked(now)
+    wait = _blocked_until.get(url, now) - now
+    if wait > 0:
+        if wait > max_wait:
+            raise WebhookRateLimited(url, wait)
+        await asyncio.sleep(wait)
+
+    for attempt in range(2):
+        response = await get_client().post(url, json=payload)
+
+        if response.status_code == 429:
+            retry_after = _retry_after_seconds(response)
+            _blocked_until[url] = time.monotonic() + retry_after
+            if attempt == 0 and retry_after <= max_wait:
+                await asyncio.sleep(retry_after)
+                continue
+            raise WebhookRateLimited(url, retry_after)
+
+        response.raise_for_status()
+        _blocked_until.pop(url, None)
+        _remember_rate_limit(url, response)
+        return
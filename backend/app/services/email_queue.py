@@ -0,0 +1,215 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, and_, or_
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional
+from app.core.background import BackgroundWorker, backoff_delay
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.email_job import EmailJob
+from app.services.email_service import build_verification_email, build_login_otp_email, send_emails
+
+# kind -> 組信函式（參數來自 payload_json）
+EMAIL_BUILDERS = {
+    "verification": lambda recipient, payload: build_verification_email(recipient, payload["code"]),
+    "login_otp": lambda recipient, payload: build_login_otp_email(recipient, payload["code"]),
+}
+
+
+def enqueue_email(
+    db: AsyncSession,
+    kind: str,
+    recipient: str,
+    payload: Dict,
+    expires_at: Optional[datetime] = None
+) -> str:
+    """
+    把 email 寫入佇列，回傳 job id。
+    這裡不 commit：呼叫端提交驗證碼時一併寫入，提交後再呼叫 email_dispatcher.wake()。
+    """
+    if kind not in EMAIL_BUILDERS:
+        raise ValueError(f"Unknown email kind: {kind}")
+
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    db.add(EmailJob(
+        id=job_id,
+        kind=kind,
+        recipient=recipient,
+        payload_json=json.dumps(payload),
+        status="queued",
+        attempts=0,
+        next_attempt_at=now,
+        expires_at=expires_at,
+        created_at=now
+    ))
+    return job_id
+
+
+async def get_email_job_status(db: AsyncSession, job_id: str) -> dict:
+    """查詢寄送狀態（不回傳收件人與內容）"""
+    result = await db.execute(select(EmailJob).where(EmailJob.id == job_id))
+    job = result.scalar_one_or_none()
+
+    if not job:
+        raise ValueError("Email job not found")
+
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "sent_at": job.sent_at
+    }
+
+
+class EmailDispatcher(BackgroundWorker):
+    """
+    從佇列取出到期的 email 並寄出：
+    - 以 claim_token + locked_until 認領，多個 worker 同時執行也不會重複寄送
+    - 一批信平均分給 concurrency 條 SMTP 連線，每條連線在同一個 session 中連續寄出
+    - 失敗時標記為 failed 並指數退避重試，超過 max_attempts 或驗證碼已過期則標記為 dead
+    """
+
+    name = "email-dispatcher"
+
+    def __init__(
+        self,
+        batch_size: int,
+        concurrency: int,
+        max_attempts: int,
+        poll_interval: float,
+        lease_seconds: float = 120.0
+    ):
+        super().__init__(poll_interval)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self._last_prune = datetime.min
+
+    async def _claim(self, db: AsyncSession) -> List[EmailJob]:
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(EmailJob.status.in_(["queued", "failed"]), EmailJob.next_attempt_at <= now),
+            and_(EmailJob.status == "sending", EmailJob.locked_until < now)
+        )
+
+        result = await db.execute(
+            select(EmailJob.id)
+            .where(claimable)
+            .order_by(EmailJob.next_attempt_at)
+            .limit(self.batch_size)
+        )
+        ids = [row[0] for row in result.all()]
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        await db.execute(
+            update(EmailJob)
+            .where(EmailJob.id.in_(ids), claimable)
+            .values(
+                status="sending",
+                claim_token=token,
+                locked_until=now + timedelta(seconds=self.lease_seconds)
+            )
+        )
+        await db.commit()
+
+        result = await db.execute(
+            select(EmailJob).where(EmailJob.claim_token == token)
+        )
+        jobs = list(result.scalars().all())
+        # 結束讀取交易，寄信期間不佔用資料庫
+        await db.commit()
+        return jobs
+
+    async def _send(self, jobs: List[EmailJob]) -> List[Optional[Exception]]:
+        errors: List[Optional[Exception]] = [None] * len(jobs)
+        messages: List[MIMEText] = []
+        positions: List[int] = []
+        for i, job in enumerate(jobs):
+            try:
+                messages.append(EMAIL_BUILDERS[job.kind](job.recipient, json.loads(job.payload_json)))
+                positions.append(i)
+            except Exception as e:
+                errors[i] = e
+
+        # 分成 concurrency 組，每組共用一條 SMTP 連線
+        groups = max(1, min(self.concurrency, len(messages)))
+        chunks = [list(range(g, len(messages), groups)) for g in range(groups)]
+        results = await asyncio.gather(*[
+            send_emails([messages[k] for k in chunk]) for chunk in chunks
+        ], return_exceptions=True)
+
+        for chunk, chunk_result in zip(chunks, results):
+            for j, k in enumerate(chunk):
+                errors[positions[k]] = chunk_result if isinstance(chunk_result, BaseException) else chunk_result[j]
+        return errors
+
+    async def run_once(self) -> int:
+        async with AsyncSessionLocal() as db:
+            jobs = await self._claim(db)
+            if not jobs:
+                await self._prune(db)
+                return 0
+
+            now = datetime.utcnow()
+            expired = [job for job in jobs if job.expires_at and job.expires_at <= now]
+            pending = [job for job in jobs if job not in expired]
+            errors = await self._send(pending) if pending else []
+
+            now = datetime.utcnow()
+            for job in expired:
+                job.claim_token = None
+                job.locked_until = None
+                job.status = "dead"
+                job.last_error = "Expired before it could be sent"
+
+            for job, error in zip(pending, errors):
+                job.claim_token = None
+                job.locked_until = None
+                job.attempts += 1
+                if error is None:
+                    job.status = "sent"
+                    job.sent_at = now
+                    job.last_error = None
+                    continue
+
+                job.last_error = str(error)[:500]
+                if job.attempts >= self.max_attempts:
+                    job.status = "dead"
+                    print(f"Email {job.kind} to {job.recipient} failed permanently: {error}")
+                else:
+                    job.status = "failed"
+                    job.next_attempt_at = now + timedelta(seconds=backoff_delay(job.attempts))
+
+            await db.commit()
+            return len(jobs)
+
+    async def _prune(self, db: AsyncSession) -> None:
+        # 每小時清掉一次超過保留期限的已結束工作（內含驗證碼，不需要久留）
+        now = datetime.utcnow()
+        if now - self._last_prune < timedelta(hours=1):
+            return
+        self._last_prune = now
+        await db.execute(
+            delete(EmailJob).where(
+                EmailJob.status.in_(["sent", "dead"]),
+                EmailJob.created_at < now - timedelta(days=settings.EMAIL_JOB_RETENTION_DAYS)
+            )
+        )
+        await db.commit()
+
+
+email_dispatcher = EmailDispatcher(
+    batch_size=settings.EMAIL_BATCH_SIZE,
+    concurrency=settings.EMAIL_CONCURRENCY,
+    max_attempts=settings.EMAIL_MAX_ATTEMPTS,
+    poll_interval=settings.EMAIL_POLL_INTERVAL_SECONDS
+)
@@ -1,75 +1,230 @@
+import asyncio
+import time
 import aiosmtplib
+from contextlib import asynccontextmanager
 from email.mime.text import MIMEText
+from typing import List, Optional
 from app.core.config import settings
 
+# 連線中斷類的錯誤：丟掉這條連線、重新連線後再試一次
+_CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, ConnectionError)
+
+
+class SMTPPool:
+    """
+    SMTP 連線池：重複使用已完成 TLS 與登入的連線，省下每封信的握手成本。
+    - 同時最多 size 條連線
+    - 閒置超過 idle_timeout 秒的連線會先關掉再重新連線（多數伺服器會自行斷開閒置連線）
+    - 送信時遇到連線中斷會重新連線並重送一次
+    """
+
+    def __init__(self, size: int, idle_timeout: float):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle: List[tuple] = []  # (smtp, 上次使用時間)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        # 選擇 SSL 直連模式（port 465）或 STARTTLS（port 587）
+        use_ssl = settings.SMTP_USE_SSL
+        use_tls = settings.SMTP_USE_TLS
+
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            use_tls=use_ssl,  # SSL 模式 (port 465) -> True, STARTTLS (587) -> False
+            start_tls=False  # STARTTLS 由下面依設定手動執行
+        )
+
+        # 連線
+        await smtp.connect()
+
+        # STARTTLS：只在非 SSL 模式下啟用（通常是 port 587）
+        if use_tls and not use_ssl:
+            await smtp.starttls()
+
+        # 登入
+        await smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+
+        return smtp
+
+    @staticmethod
+    async def _discard(smtp: aiosmtplib.SMTP) -> None:
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _acquire(self) -> aiosmtplib.SMTP:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        await self._semaphore.acquire()
+
+        try:
+            while self._idle:
+                smtp, last_used = self._idle.pop()
+                if smtp.is_connected and time.monotonic() - last_used < self.idle_timeout:
+                    return smtp
+                await self._discard(smtp)
+
+            return await self._connect()
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    async def _release(self, smtp: aiosmtplib.SMTP, broken: bool) -> None:
+        try:
+            if broken or not smtp.is_connected:
+                await self._discard(smtp)
+            else:
+                self._idle.append((smtp, time.monotonic()))
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def connection(self):
+        """借用一條已登入的連線，用完歸還；發生連線錯誤時丟棄"""
+        smtp = await self._acquire()
+        broken = False
+        try:
+            yield smtp
+        except _CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            await self._release(smtp, broken)
+
+    async def send(self, message: MIMEText) -> None:
+        """寄送一封信，連線中斷時重新連線再送一次"""
+        for attempt in range(2):
+            try:
+                async with self.connection() as smtp:
+                    await smtp.send_message(message)
+                return
+            except _CONNECTION_ERRORS:
+                if attempt == 1:
+                    raise
+
+    async def send_batch(self, messages: List[MIMEText]) -> List[Optional[Exception]]:
+        """
+        在同一個 SMTP session 中依序寄出多封信，回傳每封的結果（成功為 None）。
+        中途斷線時重新連線並從失敗的那封繼續；無法連線或登入時只有尚未寄出的信算失敗，
+        已寄出的信不會被重送。
+        """
+        results: List[Optional[Exception]] = [None] * len(messages)
+        index = 0
+        reconnects = 0
+
+        while index < len(messages):
+            try:
+                async with self.connection() as smtp:
+                    while index < len(messages):
+                        try:
+                            await smtp.send_message(messages[index])
+                        except _CONNECTION_ERRORS:
+                            raise
+                        except Exception as e:
+                            # 收件人被拒等單封錯誤不影響其他信
+                            results[index] = e
+                        index += 1
+            except _CONNECTION_ERRORS as e:
+                reconnects += 1
+                if reconnects <= 2:
+                    continue
+                error = e
+            except Exception as e:
+                # 單封錯誤已在上面處理，會到這裡的是連線或登入失敗（例如 SMTPAuthenticationError）
+                error = e
+            else:
+                break
+
+            for i in range(index, len(messages)):
+                results[i] = error
+            break
+
+        return results
+
+    async def close(self) -> None:
+        """關閉所有閒置連線（app shutdown 時呼叫）"""
+        idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            await self._discard(smtp)
+
+
+smtp_pool = SMTPPool(
+    size=settings.SMTP_POOL_SIZE,
+    idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT_SECONDS
+)
+
 
 async def _send_email(message: MIMEText) -> None:
     """
-    通用郵件寄送邏輯，自動處理 SSL / STARTTLS。
+    通用郵件寄送邏輯，透過連線池寄出（自動處理 SSL / STARTTLS）。
     """
     # 開發模式：沒有 SMTP_HOST → 直接 print，不寄信
     if not settings.SMTP_HOST:
         print(f"[DEV] Email to {message['To']}:\n{message.as_string()}")
         return
 
-    # 選擇 SSL 直連模式（port 465）或 STARTTLS（port 587）
-    use_ssl = settings.SMTP_USE_SSL
-    use_tls = settings.SMTP_USE_TLS
+    await smtp_pool.send(message)
+
 
-    smtp = aiosmtplib.SMTP(
-        hostname=settings.SMTP_HOST,
-        port=settings.SMTP_PORT,
-        use_tls=use_ssl  # SSL 模式 (port 465) -> True, STARTTLS (587) -> False
-    )
+async def send_emails(messages: List[MIMEText]) -> List[Optional[Exception]]:
+    """
+    批次寄信：共用同一條 SMTP 連線，回傳每封的結果（成功為 None）
+    """
+    if not settings.SMTP_HOST:
+        for message in messages:
+            print(f"[DEV] Email to {message['To']}:\n{message.as_string()}")
+        return [None] * len(messages)
 
-    # 連線
-    await smtp.connect()
+    return await smtp_pool.send_batch(messages)
 
-    # STARTTLS：只在非 SSL 模式下啟用（通常是 port 587）
-    if use_tls and not use_ssl:
-        await smtp.starttls()
 
-    # 登入
-    await smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+def build_verification_email(email: str, code: str) -> MIMEText:
+    """註冊/驗證碼 email"""
+    message = MIMEText(f"Your verification code is: {code}\n\nThis code will expire in 10 minutes.")
+    message["Subject"] = "Jiu-Pluck Email Verification"
+    message["From"] = settings.SMTP_FROM
+    message["To"] = email
+    return message
 
-    # 寄信
-    await smtp.send_message(message)
 
-    # 關閉連線
-    await smtp.quit()
+def build_login_otp_email(email: str, code: str) -> MIMEText:
+    """登入用 OTP email"""
+    message = MIMEText(f"Your login code is: {code}\n\nThis code will expire in 10 minutes.")
+    message["Subject"] = "Jiu-Pluck Login Code"
+    message["From"] = settings.SMTP_FROM
+    message["To"] = email
+    return message
+
+
+def build_notification_email(email: str, subject: str, body: str) -> MIMEText:
+    """通知類 email"""
+    message = MIMEText(body)
+    message["Subject"] = subject
+    message["From"] = settings.SMTP_FROM
+    message["To"] = email
+    return message
 
 
 async def send_verification_email(email: str, code: str) -> None:
     """
     寄送註冊/驗證碼 email
     """
-    message = MIMEText(f"Your verification code is: {code}\n\nThis code will expire in 10 minutes.")
-    message["Subject"] = "Jiu-Pluck Email Verification"
-    message["From"] = settings.SMTP_FROM
-    message["To"] = email
-
-    await _send_email(message)
+    await _send_email(build_verification_email(email, code))
 
 
 async def send_login_otp_email(email: str, code: str) -> None:
     """
     寄送登入用 OTP
     """
-    message = MIMEText(f"Your login code is: {code}\n\nThis code will expire in 10 minutes.")
-    message["Subject"] = "Jiu-Pluck Login Code"
-    message["From"] = settings.SMTP_FROM
-    message["To"] = email
-
-    await _send_email(message)
+    await _send_email(build_login_otp_email(email, code))
 
 
 async def send_notification_email(email: str, subject: str, body: str) -> None:
     """
     寄送通知類 email
     """
-    message = MIMEText(body)
-    message["Subject"] = subject
-    message["From"] = settings.SMTP_FROM
-    message["To"] = email
-
-    await _send_email(message)
+    await _send_email(build_notification_email(email, subject, body))
@@ -1,12 +1,138 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, update, delete, and_, or_, func
+import hashlib
 import uuid
-import json
-from typing import List, Dict, Optional
-from datetime import datetime
-from app.models.event import Event, EventVote, event_attendees
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timezone
+from app.models.app_state import AppState
+from app.models.event import Event, EventTimeOption, EventVote, EventVoteTally, event_attendees
 from app.models.user import User
-from app.schemas.event import PrivateEventCreate, PublicEventCreate, ProposedTime
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import upsert
+from app.core.pagination import fetch_page, DEFAULT_PAGE_SIZE
+from app.core.serialization import encode_many
+from app.schemas.event import PrivateEventCreate, PublicEventCreate, ProposedTime, EventResponse
+from app.services.calendar_service import sync_event_to_calendars
+
+
+VOTE_CHOICES = ("yes", "no", "maybe")
+
+# 公開活動列表（非管理員）的回應快取：key 為正規化後的查詢參數，value 為已序列化的回應。
+# 新增或刪除公開活動時清除本 worker 的快取，其他 worker 最多 PUBLIC_EVENTS_CACHE_TTL_SECONDS 秒後更新。
+public_feed_cache = TTLCache(
+    max_size=settings.PUBLIC_EVENTS_CACHE_MAX_SIZE,
+    ttl=settings.PUBLIC_EVENTS_CACHE_TTL_SECONDS
+)
+
+# app_state 中記錄公開活動最後一次新增 / 刪除的時間（Last-Modified 用，刪除不會反映在活動本身）
+PUBLIC_FEED_STATE_KEY = "public_events"
+
+
+def _to_utc(value: datetime) -> datetime:
+    """有時區的時間轉為 naive UTC（資料庫內的時間一律為 naive UTC）"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _utc_aware(value: Optional[datetime]) -> Optional[datetime]:
+    """資料庫讀出的 naive UTC 加上時區，回應中輸出為 Z 結尾的 UTC 時間（沒有時區的字串會被前端當作當地時間）"""
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _utc_aware_times(times: List[Dict]) -> List[Dict]:
+    return [{"start": _utc_aware(t["start"]), "end": _utc_aware(t["end"])} for t in times]
+
+
+def build_time_options(event_id: str, proposed_times: List[ProposedTime]) -> List[EventTimeOption]:
+    return [
+        EventTimeOption(event_id=event_id, position=i, start_time=_to_utc(pt.start), end_time=_to_utc(pt.end))
+        for i, pt in enumerate(proposed_times)
+    ]
+
+
+async def load_time_options(db: AsyncSession, event_ids: List[str]) -> Dict[str, List[Dict]]:
+    """一次查詢取得多個活動的候選時間，回傳 {event_id: [{"start", "end"}, ...]}"""
+    options = {event_id: [] for event_id in event_ids}
+    if not event_ids:
+        return options
+    
+    result = await db.execute(
+        select(EventTimeOption.event_id, EventTimeOption.start_time, EventTimeOption.end_time)
+        .where(EventTimeOption.event_id.in_(event_ids))
+        .order_by(EventTimeOption.event_id, EventTimeOption.position)
+    )
+    for event_id, start_time, end_time in result.all():
+        options[event_id].append({"start": start_time, "end": end_time})
+    return options
+
+
+async def find_time_options_in_window(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    room_id: Optional[str] = None
+) -> List[Dict]:
+    """
+    與 [start, end) 重疊的候選時間（行事曆顯示、時間衝突檢查用），依開始時間排序。
+    以 (start_time, end_time) 索引查詢，不需要讀取活動本身。
+    """
+    query = (
+        select(EventTimeOption.event_id, EventTimeOption.id, EventTimeOption.start_time, EventTimeOption.end_time)
+        .where(EventTimeOption.start_time < _to_utc(end), EventTimeOption.end_time > _to_utc(start))
+        .order_by(EventTimeOption.start_time, EventTimeOption.id)
+    )
+    if room_id is not None:
+        query = query.join(Event, Event.id == EventTimeOption.event_id).where(Event.room_id == room_id)
+    
+    result = await db.execute(query)
+    return [
+        {"event_id": event_id, "option_id": option_id, "start": start_time, "end": end_time}
+        for event_id, option_id, start_time, end_time in result.all()
+    ]
+
+
+async def delete_event_rows(db: AsyncSession, event_id: str) -> None:
+    """
+    刪除活動的投票、參加者與候選時間（活動本身由呼叫端刪除），並排入從行事曆刪除的工作；
+    呼叫端提交後呼叫 calendar_sync_worker.wake()。
+    """
+    await sync_event_to_calendars(db, event_id, "delete")
+    await db.execute(EventVote.__table__.delete().where(EventVote.event_id == event_id))
+    await db.execute(EventVoteTally.__table__.delete().where(EventVoteTally.event_id == event_id))
+    await db.execute(EventTimeOption.__table__.delete().where(EventTimeOption.event_id == event_id))
+    await db.execute(event_attendees.delete().where(event_attendees.c.event_id == event_id))
+
+
+def event_to_dict(
+    e: Event,
+    created_by_name: Optional[str] = None,
+    vote_stats: Optional[Dict] = None,
+    attendees: Optional[List[Dict]] = None,
+    proposed_times: Optional[List[Dict]] = None
+) -> Dict:
+    """EventResponse 格式的活動資料（由資料庫欄位直接組成，可交給 trusted_response）"""
+    return {
+        "id": e.id,
+        "room_id": e.room_id,
+        "created_by": e.created_by,
+        "created_by_name": created_by_name,
+        "title": e.title,
+        "description": e.description,
+        "category": e.category,
+        "location": e.location,
+        "public": e.public,
+        "proposed_times": _utc_aware_times(proposed_times) if e.public == 0 and proposed_times is not None else None,
+        "start_time": _utc_aware(e.start_time),
+        "end_time": _utc_aware(e.end_time),
+        "created_at": _utc_aware(e.created_at),
+        "updated_at": _utc_aware(e.updated_at),
+        "vote_stats": vote_stats,
+        "attendees": attendees or []
+    }
 
 
 async def create_private_event(
@@ -17,11 +143,7 @@ async def create_private_event(
 ) -> Dict:
     """建立私人活動"""
     event_id = str(uuid.uuid4())
-    
-    proposed_times_json = json.dumps([
-        {"start": pt.start.isoformat(), "end": pt.end.isoformat()}
-        for pt in event_data.proposed_times
-    ])
+    options = build_time_options(event_id, event_data.proposed_times)
     
     event = Event(
         id=event_id,
@@ -31,11 +153,12 @@ async def create_private_event(
         description=event_data.description,
         category=event_data.category,
         location=event_data.location,
-        public=0,
-        proposed_times_json=proposed_times_json
+        public=0
     )
     
     db.add(event)
+    db.add_all(options)
+    db.add(EventVoteTally(event_id=event_id, yes=0, no=0, maybe=0))
     await db.commit()
     await db.refresh(event)
     
@@ -48,9 +171,9 @@ async def create_private_event(
         "category": event.category,
         "location": event.location,
         "public": event.public,
-        "proposed_times": json.loads(event.proposed_times_json),
-        "created_at": event.created_at,
-        "updated_at": event.updated_at
+        "proposed_times": [{"start": _utc_aware(o.start_time), "end": _utc_aware(o.end_time)} for o in options],
+        "created_at": _utc_aware(event.created_at),
+        "updated_at": _utc_aware(event.updated_at)
     }
 
 
@@ -76,7 +199,10 @@ async def create_public_event(
     )
     
     db.add(event)
+    db.add(EventVoteTally(event_id=event_id, yes=0, no=0, maybe=0))
+    await mark_public_feed_changed(db)
     await db.commit()
+    invalidate_public_feed_cache()
     await db.refresh(event)
     
     return {
@@ -87,10 +213,10 @@ async def create_public_event(
         "category": event.category,
         "location": event.location,
         "public": event.public,
-        "start_time": event.start_time,
-        "end_time": event.end_time,
-        "created_at": event.created_at,
-        "updated_at": event.updated_at
+        "start_time": _utc_aware(event.start_time),
+        "end_time": _utc_aware(event.end_time),
+        "created_at": _utc_aware(event.created_at),
+        "updated_at": _utc_aware(event.updated_at)
     }
 
 
@@ -101,7 +227,7 @@ async def vote_event(
     vote: str
 ) -> Dict:
     """投票"""
-    if vote not in ["yes", "no", "maybe"]:
+    if vote not in VOTE_CHOICES:
         raise ValueError("Invalid vote value")
     
     # 檢查活動是否存在
@@ -110,6 +236,9 @@ async def vote_event(
     if not event:
         raise ValueError("Event not found")
     
+    # 舊活動可能還沒有統計列，先依現有投票補上（必須在修改投票之前）
+    await _ensure_vote_tally(db, event_id)
+    
     # 更新或建立投票
     result = await db.execute(
         select(EventVote).where(
@@ -119,26 +248,133 @@ async def vote_event(
     existing_vote = result.scalar_one_or_none()
     
     if existing_vote:
-        existing_vote.vote = vote
+        old_vote = existing_vote.vote
+        if old_vote != vote:
+            existing_vote.vote = vote
+            await _shift_vote_tally(db, event_id, old_vote, vote)
     else:
         new_vote = EventVote(event_id=event_id, user_id=user_id, vote=vote)
         db.add(new_vote)
+        await _shift_vote_tally(db, event_id, None, vote)
     
+    # 投票與統計在同一個交易中提交
     await db.commit()
     
     return {"event_id": event_id, "user_id": user_id, "vote": vote}
 
 
+async def _ensure_vote_tally(db: AsyncSession, event_id: str) -> None:
+    """確保活動有統計列，沒有時從 event_votes 計算後建立"""
+    result = await db.execute(
+        select(EventVoteTally.event_id).where(EventVoteTally.event_id == event_id)
+    )
+    if result.scalar_one_or_none() is not None:
+        return
+    
+    # 兩個請求同時建立時，後到的略過（由 _shift_vote_tally 原子更新）
+    counts = (await count_votes_for_events(db, [event_id]))[event_id]
+    await db.execute(upsert(db, EventVoteTally, {"event_id": event_id, **counts}, ["event_id"]))
+
+
+async def _shift_vote_tally(
+    db: AsyncSession,
+    event_id: str,
+    old_vote: Optional[str],
+    new_vote: str
+) -> None:
+    """把一票從舊選項移到新選項（old_vote 為 None 表示新投票）"""
+    values = {getattr(EventVoteTally, new_vote): getattr(EventVoteTally, new_vote) + 1}
+    if old_vote in VOTE_CHOICES:
+        values[getattr(EventVoteTally, old_vote)] = getattr(EventVoteTally, old_vote) - 1
+    
+    await db.execute(
+        update(EventVoteTally).where(EventVoteTally.event_id == event_id).values(values)
+    )
+
+
+async def count_votes_for_events(db: AsyncSession, event_ids: List[str]) -> Dict[str, Dict]:
+    """直接從 event_votes 以一次 GROUP BY 查詢計算多個活動的投票數"""
+    stats = {event_id: {"yes": 0, "no": 0, "maybe": 0} for event_id in event_ids}
+    if not event_ids:
+        return stats
+    
+    result = await db.execute(
+        select(EventVote.event_id, EventVote.vote, func.count())
+        .where(EventVote.event_id.in_(event_ids))
+        .group_by(EventVote.event_id, EventVote.vote)
+    )
+    for event_id, vote, count in result.all():
+        stats[event_id][vote] = count
+    
+    return stats
+
+
+async def get_vote_stats_for_events(db: AsyncSession, event_ids: List[str]) -> Dict[str, Dict]:
+    """取得多個活動的投票統計（讀取統計表，缺少統計列的舊活動才回頭計算）"""
+    stats = {}
+    if not event_ids:
+        return stats
+    
+    result = await db.execute(
+        select(EventVoteTally).where(EventVoteTally.event_id.in_(event_ids))
+    )
+    for tally in result.scalars().all():
+        stats[tally.event_id] = {"yes": tally.yes, "no": tally.no, "maybe": tally.maybe}
+    
+    missing = [event_id for event_id in event_ids if event_id not in stats]
+    if missing:
+        stats.update(await count_votes_for_events(db, missing))
+    
+    return stats
+
+
 async def get_event_vote_stats(db: AsyncSession, event_id: str) -> Dict:
     """取得投票統計"""
-    result = await db.execute(select(EventVote).where(EventVote.event_id == event_id))
-    votes = result.scalars().all()
+    stats = await get_vote_stats_for_events(db, [event_id])
+    return stats[event_id]
+
+
+async def check_vote_tallies(db: AsyncSession) -> List[Dict]:
+    """比對統計表與 event_votes，回傳不一致的活動（沒有統計列視為尚未建立，有投票時才回報）"""
+    result = await db.execute(select(Event.id))
+    event_ids = [row[0] for row in result.all()]
     
-    stats = {"yes": 0, "no": 0, "maybe": 0}
-    for vote in votes:
-        stats[vote.vote] = stats.get(vote.vote, 0) + 1
+    expected = await count_votes_for_events(db, event_ids)
     
-    return stats
+    result = await db.execute(select(EventVoteTally))
+    actual = {
+        t.event_id: {"yes": t.yes, "no": t.no, "maybe": t.maybe}
+        for t in result.scalars().all()
+    }
+    
+    return [
+        {"event_id": event_id, "expected": counts, "actual": actual.get(event_id)}
+        for event_id, counts in expected.items()
+        # 舊活動的統計列在第一次投票時才建立（_ensure_vote_tally），沒有統計列也沒有投票不算不一致
+        if (actual[event_id] != counts if event_id in actual else any(counts.values()))
+    ]
+
+
+async def rebuild_vote_tallies(db: AsyncSession) -> int:
+    """從 event_votes 重新計算所有活動的統計，回傳重建的活動數"""
+    result = await db.execute(select(Event.id))
+    event_ids = [row[0] for row in result.all()]
+    
+    counts = await count_votes_for_events(db, event_ids)
+    
+    await db.execute(delete(EventVoteTally))
+    for event_id, stats in counts.items():
+        db.add(EventVoteTally(event_id=event_id, **stats))
+    await db.commit()
+    
+    return len(counts)
+
+
+def public_event_page_keys(sort: str) -> Tuple[List, bool]:
+    """公開活動的分頁排序鍵：依時間 (start_time, id) 遞增，或依建立時間 (created_at, id) 遞減"""
+    if sort == "time":
+        return [Event.start_time, Event.id], False
+    return [Event.created_at, Event.id], True
 
 
 async def get_public_events(
@@ -147,9 +383,11 @@ async def get_public_events(
     category: Optional[str] = None,
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
-    sort: str = "time"
-) -> List[Dict]:
-    """取得公開活動列表"""
+    sort: str = "time",
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Dict:
+    """取得公開活動列表（分頁），回傳 {"items": [...], "next_cursor": ...}"""
     query = select(Event).where(Event.public == 1)
     
     if school:
@@ -165,27 +403,111 @@ async def get_public_events(
     if to_date:
         query = query.where(Event.start_time <= to_date)
     
-    if sort == "time":
-        query = query.order_by(Event.start_time)
-    else:
-        query = query.order_by(Event.created_at.desc())
+    keys, descending = public_event_page_keys(sort)
+    events, next_cursor = await fetch_page(db, query, keys, cursor, limit, descending, tag=sort)
     
-    result = await db.execute(query)
-    events = result.scalars().all()
-    
-    return [
-        {
-            "id": e.id,
-            "title": e.title,
-            "description": e.description,
-            "category": e.category,
-            "location": e.location,
-            "start_time": e.start_time,
-            "end_time": e.end_time,
-            "created_at": e.created_at
-        }
-        for e in events
-    ]
+    return {
+        "items": [
+            {
+                "id": e.id,
+                "room_id": e.room_id,
+                "created_by": e.created_by,
+                "title": e.title,
+                "description": e.description,
+                "category": e.category,
+                "location": e.location,
+                "public": e.public,
+                "start_time": _utc_aware(e.start_time),
+                "end_time": _utc_aware(e.end_time),
+                "created_at": _utc_aware(e.created_at),
+                "updated_at": _utc_aware(e.updated_at)
+            }
+            for e in events
+        ],
+        "next_cursor": next_cursor
+    }
+
+
+async def mark_public_feed_changed(db: AsyncSession) -> None:
+    """記錄公開活動列表有異動，與異動在同一個交易中；commit 後再呼叫 invalidate_public_feed_cache()"""
+    await db.execute(upsert(
+        db,
+        AppState.__table__,
+        {"key": PUBLIC_FEED_STATE_KEY, "value": uuid.uuid4().hex[:16], "updated_at": datetime.utcnow()},
+        index_elements=["key"],
+        update_columns=["value", "updated_at"]
+    ))
+
+
+def invalidate_public_feed_cache() -> None:
+    public_feed_cache.clear()
+
+
+def public_feed_cache_key(
+    school: Optional[str],
+    category: Optional[str],
+    from_date: Optional[datetime],
+    to_date: Optional[datetime],
+    sort: str,
+    cursor: Optional[str],
+    limit: int
+) -> Tuple:
+    return (
+        school or None,
+        category or None,
+        from_date.isoformat() if from_date else None,
+        to_date.isoformat() if to_date else None,
+        sort,
+        cursor or None,
+        limit
+    )
+
+
+async def get_public_feed_page(
+    db: AsyncSession,
+    school: Optional[str] = None,
+    category: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    sort: str = "time",
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Dict:
+    """
+    非管理員的公開活動列表，回傳已序列化的 JSON 與快取標頭：
+    {"body": bytes, "etag": str, "last_modified": datetime, "next_cursor": ...}
+    同樣的查詢參數在 TTL 內直接使用快取，不查詢資料庫。
+    """
+    key = public_feed_cache_key(school, category, from_date, to_date, sort, cursor, limit)
+    page = public_feed_cache.get(key)
+    if page is not None:
+        return page
+
+    result = await get_public_events(db, school, category, from_date, to_date, sort, cursor, limit)
+    events = result["items"]
+
+    # 為每個活動添加建立者姓名
+    creator_ids = list({e["created_by"] for e in events if e.get("created_by")})
+    names = {}
+    if creator_ids:
+        users_result = await db.execute(select(User.id, User.name).where(User.id.in_(creator_ids)))
+        names = dict(users_result.fetchall())
+    for event in events:
+        event["created_by_name"] = names.get(event.get("created_by"))
+
+    state_result = await db.execute(select(AppState.updated_at).where(AppState.key == PUBLIC_FEED_STATE_KEY))
+    changed_at = state_result.scalar_one_or_none()
+    timestamps = [_to_utc(t) for t in [changed_at] + [e["updated_at"] or e["created_at"] for e in events] if t]
+
+    body = encode_many(EventResponse, events)
+    page = {
+        "body": body,
+        "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        "last_modified": max(timestamps) if timestamps else None,
+        "next_cursor": result["next_cursor"]
+    }
+    public_feed_cache.set(key, page)
+    return page
 
 
 async def join_event(db: AsyncSession, event_id: str, user_id: str) -> Dict:
@@ -212,6 +534,8 @@ async def join_event(db: AsyncSession, event_id: str, user_id: str) -> Dict:
     await db.execute(
         event_attendees.insert().values(event_id=event_id, user_id=user_id)
     )
+    # 同步到行事曆由背景執行，提交後呼叫 calendar_sync_worker.wake()
+    await sync_event_to_calendars(db, event_id, "create", [user_id])
     await db.commit()
     
     return {"message": "Joined event successfully"}
@@ -224,6 +548,7 @@ async def leave_event(db: AsyncSession, event_id: str, user_id: str) -> Dict:
             and_(event_attendees.c.event_id == event_id, event_attendees.c.user_id == user_id)
         )
     )
+    await sync_event_to_calendars(db, event_id, "delete", [user_id])
     await db.commit()
     
     return {"message": "Left event successfully"}
@@ -231,27 +556,20 @@ async def leave_event(db: AsyncSession, event_id: str, user_id: str) -> Dict:
 
 async def get_event_attendees(db: AsyncSession, event_id: str) -> List[Dict]:
     """取得活動參加者"""
+    return (await get_attendees_for_events(db, [event_id]))[event_id]
+
+
+async def get_attendees_for_events(db: AsyncSession, event_ids: List[str]) -> Dict[str, List[Dict]]:
+    """一次查詢取得多個活動的參加者（JOIN users），回傳 {event_id: [{"user_id", "name", "school"}, ...]}"""
+    attendees = {event_id: [] for event_id in event_ids}
+    if not event_ids:
+        return attendees
+
     result = await db.execute(
-        select(event_attendees).where(event_attendees.c.event_id == event_id)
+        select(event_attendees.c.event_id, event_attendees.c.user_id, User.name, User.school)
+        .outerjoin(User, User.id == event_attendees.c.user_id)
+        .where(event_attendees.c.event_id.in_(event_ids))
     )
-    attendee_rows = result.fetchall()
-    
-    if not attendee_rows:
-        return []
-    
-    user_ids = [row[1] for row in attendee_rows]
-    
-    result = await db.execute(select(User).where(User.id.in_(user_ids)))
-    users = result.scalars().all()
-    
-    user_dict = {u.id: u for u in users}
-    
-    return [
-        {
-            "user_id": user_id,
-            "name": user_dict.get(user_id).name if user_id in user_dict else None,
-            "school": user_dict.get(user_id).school if user_id in user_dict else None
-        }
-        for user_id in user_ids
-    ]
-
+    for event_id, user_id, name, school in result.all():
+        attendees[event_id].append({"user_id": user_id, "name": name, "school": school})
+    return attendees
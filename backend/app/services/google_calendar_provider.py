@@ -1,20 +1,96 @@
-from typing import List, Optional
+import asyncio
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from app.services.calendar_service import CalendarProvider, BusySlot
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.calendar_service import CalendarProvider, BusySlot, naive_utc
+from app.services.calendar_mirror import (
+    Intervals,
+    MirrorChanges,
+    apply_mirror_changes,
+    load_mirror_intervals,
+    load_mirror_states,
+    mirror_covers,
+    mirror_window,
+    needs_rebuild
+)
 from app.models.user import User
 from app.models.event import Event
+from app.models.calendar_integration import GoogleToken, CalendarMirrorCollection
 from app.core.config import settings
 
 # TODO: 實作 Google Calendar API 整合
 # 需要安裝: pip install google-auth google-auth-oauthlib google-auth-httplib2 google-api-python-client
+# googleapiclient 載入很慢，請在方法內 import，不要放在 module 最上層
+
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+MIRROR_CALENDAR_ID = "primary"
+
+
+class SyncTokenExpired(Exception):
+    """events.list 的 syncToken 已失效（HTTP 410），需要重新完整同步"""
+
+
+def _parse_event_time(value: Dict[str, str]) -> Optional[datetime]:
+    """Google 事件的 start / end 轉為 naive UTC；全天事件以 UTC 當天 00:00 計（與 CalDAV 相同）"""
+    if "dateTime" in value:
+        return naive_utc(datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")))
+    if "date" in value:
+        return datetime.fromisoformat(value["date"])
+    return None
+
+
+def _event_intervals(item: Dict) -> Intervals:
+    """events.list 的一個事件佔用的時段（singleEvents=True，重複事件已展開為個別的事件）"""
+    if item.get("status") == "cancelled" or item.get("transparency") == "transparent":
+        return []
+    start = _parse_event_time(item.get("start", {}))
+    end = _parse_event_time(item.get("end", {}))
+    if start is None or end is None or end <= start:
+        return []
+    return [(start, end)]
+
+
+def _list_changes(credentials, sync_token: Optional[str], window: Tuple[datetime, datetime]) -> Tuple[List[Dict], Optional[str]]:
+    """
+    events.list：有 sync_token 時只列出之後變動的事件（含已刪除），否則列出 window 內的全部事件。
+    googleapiclient 是同步的 HTTP client，在 thread 中執行。
+    """
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+
+    service = build("calendar", "v3", credentials=credentials, cache_discovery=False)
+    params = {"calendarId": MIRROR_CALENDAR_ID, "singleEvents": True, "showDeleted": True, "maxResults": 2500}
+    if sync_token:
+        params["syncToken"] = sync_token
+    else:
+        params["timeMin"] = window[0].isoformat() + "Z"
+        params["timeMax"] = window[1].isoformat() + "Z"
+
+    items: List[Dict] = []
+    page_token = None
+    while True:
+        try:
+            response = service.events().list(pageToken=page_token, **params).execute()
+        except HttpError as e:
+            if e.resp.status == 410:
+                raise SyncTokenExpired()
+            raise
+        items.extend(response.get("items", []))
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return items, response.get("nextSyncToken")
 
 
 class GoogleCalendarProvider(CalendarProvider):
-    """Google Calendar Provider"""
+    """
+    Google Calendar Provider
+    忙碌時段從 calendar_mirror 讀取，查詢前以 events.list 的 syncToken 增量更新鏡像（只同步主要行事曆）；
+    超出鏡像範圍的查詢直接列出該範圍內的事件。
+    """
     
-    def __init__(self):
-        # TODO: 初始化 Google API client
-        pass
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        # TODO: 初始化 Google API client（第一次呼叫 API 時才 import googleapiclient）
     
     async def create_event(self, user: User, event: Event) -> str:
         """建立 Google Calendar 事件"""
@@ -34,13 +110,92 @@ class GoogleCalendarProvider(CalendarProvider):
         # TODO: 實作
         raise NotImplementedError("Google Calendar integration not implemented yet")
     
+    async def _credentials(self, user: User):
+        """從 google_tokens 建立 OAuth 憑證（access token 過期時 googleapiclient 會以 refresh token 更新）"""
+        token = await self.db.get(GoogleToken, user.id)
+        if token is None:
+            raise ValueError("Google Calendar not connected")
+
+        from google.oauth2.credentials import Credentials
+
+        credentials = Credentials(
+            token=token.access_token,
+            refresh_token=token.refresh_token,
+            token_uri=GOOGLE_TOKEN_URI,
+            client_id=settings.GOOGLE_CLIENT_ID,
+            client_secret=settings.GOOGLE_CLIENT_SECRET,
+            scopes=settings.GOOGLE_CALENDAR_SCOPES.split(),
+            expiry=token.token_expiry
+        )
+        return token, credentials
+
+    @staticmethod
+    def _save_refreshed_token(token: GoogleToken, credentials) -> None:
+        """access token 已更新時存回 google_tokens（不 commit）"""
+        if credentials.token != token.access_token:
+            token.access_token = credentials.token
+            token.token_expiry = naive_utc(credentials.expiry) if credentials.expiry else token.token_expiry
+
+    async def sync_mirror(self, user: User) -> Dict[str, CalendarMirrorCollection]:
+        """更新使用者的 Google 行事曆鏡像，回傳同步狀態"""
+        now = datetime.utcnow()
+        states = await load_mirror_states(self.db, user.id, "google")
+        state = states.get(MIRROR_CALENDAR_ID)
+        token, credentials = await self._credentials(user)
+
+        reset = needs_rebuild(state, now)
+        window = mirror_window(now) if reset else (state.window_start, state.window_end)
+        try:
+            items, sync_token = await asyncio.to_thread(
+                _list_changes, credentials, None if reset else state.sync_token, window
+            )
+        except SyncTokenExpired:
+            reset, window = True, mirror_window(now)
+            items, sync_token = await asyncio.to_thread(_list_changes, credentials, None, window)
+
+        changed = {}
+        removed = []
+        for item in items:
+            if item.get("status") == "cancelled":
+                removed.append(item["id"])
+                changed.pop(item["id"], None)
+            else:
+                changed[item["id"]] = (item.get("etag"), _event_intervals(item))
+
+        self._save_refreshed_token(token, credentials)
+        await apply_mirror_changes(
+            self.db,
+            user.id,
+            "google",
+            MIRROR_CALENDAR_ID,
+            MirrorChanges(changed, [] if reset else removed, sync_token, window, reset=reset)
+        )
+        await self.db.commit()
+        return await load_mirror_states(self.db, user.id, "google")
+
     async def get_busy_slots(
         self,
         user: User,
         start_time: datetime,
         end_time: datetime
     ) -> List[BusySlot]:
-        """取得 Google Calendar 忙碌時段"""
-        # TODO: 使用 freebusy.query API
-        raise NotImplementedError("Google Calendar integration not implemented yet")
+        """
+        取得 Google Calendar 忙碌時段：從鏡像讀取；查詢範圍超出鏡像的 window 時，
+        直接以 events.list 列出該範圍內的事件（不寫入鏡像，也不影響 syncToken）
+        """
+        states = await self.sync_mirror(user)
+        start_time, end_time = naive_utc(start_time), naive_utc(end_time)
+        if mirror_covers(states.values(), start_time, end_time):
+            return await load_mirror_intervals(self.db, user.id, "google", start_time, end_time)
 
+        token, credentials = await self._credentials(user)
+        items, _ = await asyncio.to_thread(_list_changes, credentials, None, (start_time, end_time))
+        self._save_refreshed_token(token, credentials)
+        await self.db.commit()
+        slots = [
+            BusySlot(max(start, start_time), min(end, end_time))
+            for item in items
+            for start, end in _event_intervals(item)
+            if start < end_time and end > start_time
+        ]
+        return sorted(slots, key=lambda slot: slot.start)
@@ -0,0 +1,213 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func, and_, or_
+import asyncio
+import json
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List
+from app.core.background import BackgroundWorker, backoff_delay
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.notification import NotificationOutbox
+from app.models.room import RoomWebhook
+from app.services.discord_service import post_webhook, WebhookRateLimited
+
+
+async def enqueue_room_notification(db: AsyncSession, room_id: str, payload: Dict) -> int:
+    """
+    把房間通知寫入 outbox（每個 webhook 一列），回傳寫入筆數。
+    這裡不 commit：呼叫端提交活動或投票時一併寫入，提交後再呼叫 notification_dispatcher.wake()。
+    """
+    result = await db.execute(
+        select(RoomWebhook.url).where(RoomWebhook.room_id == room_id)
+    )
+    urls = [row[0] for row in result.all()]
+
+    now = datetime.utcnow()
+    payload_json = json.dumps(payload)
+    for url in urls:
+        db.add(NotificationOutbox(
+            room_id=room_id,
+            webhook_url=url,
+            payload_json=payload_json,
+            status="pending",
+            attempts=0,
+            next_attempt_at=now,
+            created_at=now
+        ))
+
+    return len(urls)
+
+
+class NotificationDispatcher(BackgroundWorker):
+    """
+    從 outbox 取出到期的通知並送出：
+    - 以 claim_token + locked_until 認領，多個 worker 同時執行也不會重複送出
+    - 以 semaphore 限制同時送出的數量
+    - 被 Discord 限流（429）時依 Retry-After 延後，不計入失敗次數
+    - 失敗時指數退避重試，超過 max_attempts 標記為 dead
+    """
+
+    name = "notification-dispatcher"
+
+    def __init__(
+        self,
+        batch_size: int,
+        concurrency: int,
+        max_attempts: int,
+        poll_interval: float,
+        lease_seconds: float = 60.0
+    ):
+        super().__init__(poll_interval)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.delivered = 0
+        self.failed_attempts = 0
+        # 最近送達的延遲（建立 → 送達，秒），只統計本 worker
+        self.latencies = deque(maxlen=1000)
+        self._last_prune = datetime.min
+
+    async def _claim(self, db: AsyncSession) -> List[NotificationOutbox]:
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(NotificationOutbox.status == "pending", NotificationOutbox.next_attempt_at <= now),
+            and_(NotificationOutbox.status == "sending", NotificationOutbox.locked_until < now)
+        )
+
+        result = await db.execute(
+            select(NotificationOutbox.id)
+            .where(claimable)
+            .order_by(NotificationOutbox.next_attempt_at)
+            .limit(self.batch_size)
+        )
+        ids = [row[0] for row in result.all()]
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        await db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(ids), claimable)
+            .values(
+                status="sending",
+                claim_token=token,
+                locked_until=now + timedelta(seconds=self.lease_seconds)
+            )
+        )
+        await db.commit()
+
+        result = await db.execute(
+            select(NotificationOutbox).where(NotificationOutbox.claim_token == token)
+        )
+        rows = list(result.scalars().all())
+        # 結束讀取交易，送出 webhook 期間不佔用資料庫
+        await db.commit()
+        return rows
+
+    async def run_once(self) -> int:
+        async with AsyncSessionLocal() as db:
+            rows = await self._claim(db)
+            if not rows:
+                await self._prune(db)
+                return 0
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def deliver(row: NotificationOutbox):
+                async with semaphore:
+                    try:
+                        await post_webhook(row.webhook_url, json.loads(row.payload_json))
+                        return None
+                    except Exception as e:
+                        return e
+
+            errors = await asyncio.gather(*[deliver(row) for row in rows])
+
+            now = datetime.utcnow()
+            for row, error in zip(rows, errors):
+                row.claim_token = None
+                row.locked_until = None
+                if isinstance(error, WebhookRateLimited):
+                    # 被限流不算失敗，依 Retry-After 延後即可
+                    row.status = "pending"
+                    row.next_attempt_at = now + timedelta(seconds=error.retry_after)
+                    continue
+                
+                row.attempts += 1
+                if error is None:
+                    row.status = "sent"
+                    row.sent_at = now
+                    row.last_error = None
+                    self.delivered += 1
+                    self.latencies.append((now - row.created_at).total_seconds())
+                    continue
+
+                self.failed_attempts += 1
+                row.last_error = str(error)[:500]
+                if row.attempts >= self.max_attempts:
+                    row.status = "dead"
+                    print(f"Discord webhook to {row.webhook_url} failed permanently: {error}")
+                else:
+                    row.status = "pending"
+                    row.next_attempt_at = now + timedelta(seconds=backoff_delay(row.attempts))
+
+            await db.commit()
+            return len(rows)
+
+    async def _prune(self, db: AsyncSession) -> None:
+        # 每小時清掉一次超過保留期限的已送達通知
+        now = datetime.utcnow()
+        if now - self._last_prune < timedelta(hours=1):
+            return
+        self._last_prune = now
+        await db.execute(
+            delete(NotificationOutbox).where(
+                NotificationOutbox.status == "sent",
+                NotificationOutbox.sent_at < now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+            )
+        )
+        await db.commit()
+
+    async def get_stats(self, db: AsyncSession) -> Dict:
+        """佇列深度（資料庫）與送達延遲（本 worker）"""
+        result = await db.execute(
+            select(NotificationOutbox.status, func.count(), func.min(NotificationOutbox.created_at))
+            .where(NotificationOutbox.status.in_(["pending", "sending", "dead"]))
+            .group_by(NotificationOutbox.status)
+        )
+        counts = {"pending": 0, "sending": 0, "dead": 0}
+        oldest = None
+        for status, count, created_at in result.all():
+            counts[status] = count
+            if status != "dead" and created_at and (oldest is None or created_at < oldest):
+                oldest = created_at
+
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            "queue_depth": counts["pending"] + counts["sending"],
+            "pending": counts["pending"],
+            "sending": counts["sending"],
+            "dead": counts["dead"],
+            "oldest_pending_age_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else None,
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "latency_p50_seconds": percentile(0.5),
+            "latency_p95_seconds": percentile(0.95)
+        }
+
+
+notification_dispatcher = NotificationDispatcher(
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    concurrency=settings.NOTIFICATION_CONCURRENCY,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    poll_interval=settings.NOTIFICATION_POLL_INTERVAL_SECONDS
+)
@@ -2,10 +2,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import uuid
 import secrets
-from typing import List, Dict
+from typing import List, Dict, Optional
 from app.models.room import Room, RoomWebhook
 from app.models.event import Event
 from app.models.room import room_members
+from app.models.user import User
+from app.core.pagination import paginate_query, split_page, DEFAULT_PAGE_SIZE
 from app.schemas.room import RoomCreate
 
 
@@ -46,16 +48,11 @@ async def create_room(db: AsyncSession, user_id: str, room_data: RoomCreate) ->
 
 async def get_user_rooms(db: AsyncSession, user_id: str) -> List[Dict]:
     """取得使用者參與的房間列表"""
-    # TODO: 使用 JOIN 查詢優化
     result = await db.execute(
-        select(room_members.c.room_id).where(room_members.c.user_id == user_id)
+        select(Room)
+        .join(room_members, room_members.c.room_id == Room.id)
+        .where(room_members.c.user_id == user_id)
     )
-    room_ids = [row[0] for row in result.fetchall()]
-    
-    if not room_ids:
-        return []
-    
-    result = await db.execute(select(Room).where(Room.id.in_(room_ids)))
     rooms = result.scalars().all()
     
     return [
@@ -72,10 +69,72 @@ async def get_user_rooms(db: AsyncSession, user_id: str) -> List[Dict]:
     ]
 
 
+class RoomListLoader:
+    """
+    以固定次數的查詢載入一頁房間列表：
+    1. 房間 + 擁有者姓名（JOIN users），以 (created_at, id) 遞減做 keyset 分頁
+    2. 本頁房間的成員角色 + 成員姓名（JOIN users）
+    query_count 記錄實際送出的查詢數，方便測試確認沒有 N+1；
+    next_cursor 為下一頁游標，沒有下一頁時為 None。
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.query_count = 0
+        self.next_cursor = None
+
+    async def _execute(self, statement):
+        self.query_count += 1
+        return await self.db.execute(statement)
+
+    async def load(
+        self,
+        user_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> List[Dict]:
+        """載入房間列表；user_id 為 None 時載入所有房間（管理員）"""
+        query = select(Room, User.name).outerjoin(User, User.id == Room.owner_id)
+        if user_id is not None:
+            query = query.where(Room.id.in_(
+                select(room_members.c.room_id).where(room_members.c.user_id == user_id)
+            ))
+
+        keys = [Room.created_at, Room.id]
+        result = await self._execute(
+            paginate_query(query, keys, cursor, limit, descending=True, tag="rooms")
+        )
+        room_rows, self.next_cursor = split_page(result.all(), len(keys), limit, tag="rooms")
+        if not room_rows:
+            return []
+
+        rooms = {}
+        for room, owner_name in room_rows:
+            rooms[room.id] = {
+                "id": room.id,
+                "name": room.name,
+                "owner_id": room.owner_id,
+                "owner_name": owner_name,
+                "school": room.school,
+                "invite_code": room.invite_code,
+                "created_at": room.created_at,
+                "updated_at": room.updated_at,
+                "members": []
+            }
+
+        result = await self._execute(
+            select(room_members.c.room_id, room_members.c.user_id, room_members.c.role, User.name)
+            .outerjoin(User, User.id == room_members.c.user_id)
+            .where(room_members.c.room_id.in_(list(rooms.keys())))
+        )
+        for room_id, member_id, role, name in result.all():
+            rooms[room_id]["members"].append({"user_id": member_id, "name": name, "role": role})
+
+        return list(rooms.values())
+
+
 async def get_room_detail(db: AsyncSession, room_id: str) -> Dict:
     """取得房間詳細資訊"""
-    from app.models.user import User
-    
     result = await db.execute(select(Room).where(Room.id == room_id))
     room = result.scalar_one_or_none()
     
@@ -1,36 +1,161 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import json
-from typing import List, Dict
+import time
+import uuid
+from typing import List, Dict, Optional
 from datetime import datetime
+from app.core.config import settings
+from app.core.database import upsert
+from app.models.app_state import AppState
 from app.models.timetable import Timetable, TimetableTemplate
 from app.schemas.timetable import TimetableData, FreeSlot
+from app.services.availability_service import WEEKDAYS, apply_occupancy, load_member_occupancy, normalize_weekday
 
+# 未指定模板時使用的預設節次
+DEFAULT_PERIODS = [
+    {"name": "1", "start": "08:10", "end": "09:00"},
+    {"name": "2", "start": "09:10", "end": "10:00"},
+    {"name": "3", "start": "10:10", "end": "11:00"},
+    {"name": "4", "start": "11:10", "end": "12:00"},
+    {"name": "5", "start": "13:10", "end": "14:00"},
+    {"name": "6", "start": "14:10", "end": "15:00"},
+    {"name": "7", "start": "15:10", "end": "16:00"},
+    {"name": "8", "start": "16:10", "end": "17:00"},
+]
+
+
+# 已通過模板的版本（app_state），新增或審核模板時更換，各 worker 比對版本決定是否重新載入
+TEMPLATES_VERSION_KEY = "timetable_templates"
+
+
+def _template_dict(t: TimetableTemplate) -> Dict:
+    return {
+        "id": t.id,
+        "school": t.school,
+        "name": t.name,
+        "periods": json.loads(t.periods_json),
+        "created_by": t.created_by,
+        "status": t.status,
+        "submitted_at": t.submitted_at,
+        "reviewed_at": t.reviewed_at,
+        "reviewed_by": t.reviewed_by,
+        "created_at": t.created_at,
+        "updated_at": t.updated_at
+    }
+
+
+class TemplateSnapshot:
+    """某個版本的所有已通過模板（periods 已解析），由 get_template_snapshot 快取"""
+
+    def __init__(self, version: str, templates: List[Dict]):
+        self.version = version
+        self.templates = templates
+        self.by_id = {t["id"]: t for t in templates}
+        self.checked_at = time.monotonic()
+
+    def filter(self, school: Optional[str] = None) -> List[Dict]:
+        if school is None:
+            return self.templates
+        return [t for t in self.templates if t["school"] == school]
+
+    def etag(self, school: Optional[str] = None) -> str:
+        scope = uuid.uuid5(uuid.NAMESPACE_URL, school).hex[:12] if school is not None else "all"
+        return f'W/"templates-{self.version}-{scope}"'
+
+
+_template_snapshot: Optional[TemplateSnapshot] = None
+
+
+async def get_templates_version(db: AsyncSession) -> str:
+    result = await db.execute(select(AppState.value).where(AppState.key == TEMPLATES_VERSION_KEY))
+    return result.scalar_one_or_none() or "0"
+
+
+async def bump_templates_version(db: AsyncSession) -> None:
+    """
+    更換模板版本，與模板異動在同一個交易中；呼叫端 commit 後再呼叫 invalidate_template_cache()。
+    其他 worker 最多 TIMETABLE_TEMPLATE_CACHE_TTL_SECONDS 秒後發現版本改變而重新載入。
+    """
+    await db.execute(upsert(
+        db,
+        AppState.__table__,
+        {"key": TEMPLATES_VERSION_KEY, "value": uuid.uuid4().hex[:16], "updated_at": datetime.utcnow()},
+        index_elements=["key"],
+        update_columns=["value", "updated_at"]
+    ))
+
+
+def invalidate_template_cache() -> None:
+    """清除本 worker 的模板快取"""
+    global _template_snapshot
+    _template_snapshot = None
+
+
+async def get_template_snapshot(db: AsyncSession) -> TemplateSnapshot:
+    """
+    取得已通過模板的快取。
+    TTL 內直接使用；過期後只查詢版本，版本不變就沿用，否則重新載入全部模板。
+    """
+    global _template_snapshot
+    snapshot = _template_snapshot
+    if snapshot is not None and time.monotonic() - snapshot.checked_at < settings.TIMETABLE_TEMPLATE_CACHE_TTL_SECONDS:
+        return snapshot
+
+    version = await get_templates_version(db)
+    if snapshot is not None and snapshot.version == version:
+        snapshot.checked_at = time.monotonic()
+        return snapshot
 
-async def get_templates(db: AsyncSession) -> List[Dict]:
-    """取得所有已通過審核的課表模板"""
     result = await db.execute(
         select(TimetableTemplate)
         .where(TimetableTemplate.status == "approved")
+        .order_by(TimetableTemplate.id)
     )
-    templates = result.scalars().all()
+    snapshot = TemplateSnapshot(version, [_template_dict(t) for t in result.scalars().all()])
+    _template_snapshot = snapshot
+    return snapshot
+
+
+async def get_templates(db: AsyncSession, school: Optional[str] = None) -> List[Dict]:
+    """取得所有已通過審核的課表模板（可依學校篩選）"""
+    snapshot = await get_template_snapshot(db)
+    return snapshot.filter(school)
+
+
+async def get_template_periods(db: AsyncSession, template_id: Optional[int]) -> List[Dict]:
+    """取得模板的節次，沒有指定模板或模板未通過審核時使用預設節次"""
+    if template_id:
+        snapshot = await get_template_snapshot(db)
+        template = snapshot.by_id.get(template_id)
+        if template and template["periods"]:
+            return template["periods"]
     
-    return [
-        {
-            "id": t.id,
-            "school": t.school,
-            "name": t.name,
-            "periods": json.loads(t.periods_json),
-            "created_by": t.created_by,
-            "status": t.status,
-            "submitted_at": t.submitted_at,
-            "reviewed_at": t.reviewed_at,
-            "reviewed_by": t.reviewed_by,
-            "created_at": t.created_at,
-            "updated_at": t.updated_at
-        }
-        for t in templates
-    ]
+    return DEFAULT_PERIODS
+
+
+async def review_template(
+    db: AsyncSession,
+    admin_id: str,
+    template_id: int,
+    status: str
+) -> Optional[TimetableTemplate]:
+    """審核課表模板，找不到模板時回傳 None"""
+    result = await db.execute(
+        select(TimetableTemplate).where(TimetableTemplate.id == template_id)
+    )
+    template = result.scalar_one_or_none()
+    if not template:
+        return None
+    
+    template.status = status
+    template.reviewed_at = datetime.utcnow()
+    template.reviewed_by = admin_id
+    
+    await bump_templates_version(db)
+    await db.commit()
+    invalidate_template_cache()
+    return template
 
 
 async def submit_template(
@@ -90,22 +215,12 @@ async def create_template(
     )
     
     db.add(template)
+    await bump_templates_version(db)
     await db.commit()
+    invalidate_template_cache()
     await db.refresh(template)
     
-    return {
-        "id": template.id,
-        "school": template.school,
-        "name": template.name,
-        "periods": json.loads(template.periods_json),
-        "created_by": template.created_by,
-        "status": template.status,
-        "submitted_at": template.submitted_at,
-        "reviewed_at": template.reviewed_at,
-        "reviewed_by": template.reviewed_by,
-        "created_at": template.created_at,
-        "updated_at": template.updated_at
-    }
+    return _template_dict(template)
 
 
 async def save_timetable(db: AsyncSession, user_id: str, data: TimetableData) -> Dict:
@@ -114,7 +229,8 @@ async def save_timetable(db: AsyncSession, user_id: str, data: TimetableData) ->
     result = await db.execute(select(Timetable).where(Timetable.user_id == user_id))
     existing = result.scalar_one_or_none()
     
-    data_json = json.dumps(data.dict(exclude_none=True))
+    data_dict = data.dict(exclude_none=True)
+    data_json = json.dumps(data_dict)
     
     if existing:
         existing.data_json = data_json
@@ -122,6 +238,7 @@ async def save_timetable(db: AsyncSession, user_id: str, data: TimetableData) ->
     else:
         timetable = Timetable(user_id=user_id, data_json=data_json)
         db.add(timetable)
+    apply_occupancy(timetable, data_dict)
     
     await db.commit()
     await db.refresh(timetable)
@@ -141,8 +258,9 @@ async def get_timetable(db: AsyncSession, user_id: str) -> Dict:
     if not timetable:
         # 自動建立空的課表
         empty_data = TimetableData()
-        data_json = json.dumps(empty_data.dict(exclude_none=True))
-        timetable = Timetable(user_id=user_id, data_json=data_json)
+        data_dict = empty_data.dict(exclude_none=True)
+        timetable = Timetable(user_id=user_id, data_json=json.dumps(data_dict))
+        apply_occupancy(timetable, data_dict)
         db.add(timetable)
         await db.commit()
         await db.refresh(timetable)
@@ -160,28 +278,18 @@ async def get_free_slots(
     weekday: str,
     periods: List[Dict]
 ) -> List[FreeSlot]:
-    """計算空堂時間"""
-    # 取得使用者課表
-    result = await db.execute(select(Timetable).where(Timetable.user_id == user_id))
-    timetable = result.scalar_one_or_none()
-    
-    if not timetable:
-        # 沒有課表，回傳所有時段
+    """計算空堂時間（讀取預先計算的佔用遮罩）"""
+    try:
+        day_index = WEEKDAYS.index(normalize_weekday(weekday))
+    except ValueError:
+        # 無法辨識的星期沒有任何課程，回傳所有時段
         return [FreeSlot(start=p["start"], end=p["end"]) for p in periods]
     
-    data = json.loads(timetable.data_json)
-    weekday_key = weekday.lower()
-    
-    # 取得該天的課程
-    courses = data.get(weekday_key, [])
-    occupied_periods = {c.get("period") for c in courses if c.get("period")}
-    
-    # 找出空堂
-    free_slots = []
-    for period in periods:
-        period_name = period.get("name", "")
-        if period_name not in occupied_periods:
-            free_slots.append(FreeSlot(start=period["start"], end=period["end"]))
+    occupancy = await load_member_occupancy(db, [user_id], periods)
+    busy = occupancy[user_id][day_index]
     
-    return free_slots
-
+    return [
+        FreeSlot(start=period["start"], end=period["end"])
+        for i, period in enumerate(periods)
+        if not busy >> i & 1
+    ]
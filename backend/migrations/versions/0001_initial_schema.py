@@ -0,0 +1,240 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 15:58:19.289341
+
+與舊版啟動時 Base.metadata.create_all 建立的 schema 相同。
+資料表與索引都以 IF NOT EXISTS 建立，既有的資料庫可以直接升級。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _timestamps():
+    return [
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table('users',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('password_hash', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('school', sa.String(), nullable=True),
+    sa.Column('major', sa.String(), nullable=True),
+    *_timestamps(),
+    sa.Column('is_active', sa.Integer(), nullable=True),
+    sa.Column('email_verified', sa.Integer(), nullable=True),
+    sa.Column('is_admin', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True, if_not_exists=True)
+    op.create_index('ix_users_created_at', 'users', ['created_at'], unique=False, if_not_exists=True)
+
+    op.create_table('email_verification_codes',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('code', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('used', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_email_verification_codes_email', 'email_verification_codes', ['email'], unique=False, if_not_exists=True)
+
+    op.create_table('rooms',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('owner_id', sa.String(), nullable=False),
+    sa.Column('school', sa.String(), nullable=True),
+    sa.Column('invite_code', sa.String(), nullable=True),
+    *_timestamps(),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_rooms_owner_id', 'rooms', ['owner_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_rooms_invite_code', 'rooms', ['invite_code'], unique=True, if_not_exists=True)
+    op.create_index('ix_rooms_created_at', 'rooms', ['created_at'], unique=False, if_not_exists=True)
+
+    op.create_table('room_members',
+    sa.Column('room_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('role', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('room_id', 'user_id'),
+    if_not_exists=True
+    )
+
+    op.create_table('room_webhooks',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('room_id', sa.String(), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_room_webhooks_room_id', 'room_webhooks', ['room_id'], unique=False, if_not_exists=True)
+
+    op.create_table('events',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('room_id', sa.String(), nullable=True),
+    sa.Column('created_by', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('location', sa.String(), nullable=True),
+    sa.Column('public', sa.Integer(), nullable=True),
+    sa.Column('proposed_times_json', sa.Text(), nullable=True),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('end_time', sa.DateTime(timezone=True), nullable=True),
+    *_timestamps(),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_events_room_id', 'events', ['room_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_events_created_by', 'events', ['created_by'], unique=False, if_not_exists=True)
+    op.create_index('ix_events_room_id_created_at', 'events', ['room_id', 'created_at'], unique=False, if_not_exists=True)
+
+    op.create_table('event_attendees',
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('event_id', 'user_id'),
+    if_not_exists=True
+    )
+
+    op.create_table('event_votes',
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('vote', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('event_id', 'user_id'),
+    if_not_exists=True
+    )
+
+    op.create_table('event_vote_tallies',
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('yes', sa.Integer(), nullable=False),
+    sa.Column('no', sa.Integer(), nullable=False),
+    sa.Column('maybe', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+    sa.PrimaryKeyConstraint('event_id'),
+    if_not_exists=True
+    )
+
+    op.create_table('timetable_templates',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('school', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('periods_json', sa.Text(), nullable=False),
+    sa.Column('created_by', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('submitted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('reviewed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('reviewed_by', sa.String(), nullable=True),
+    *_timestamps(),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+
+    op.create_table('timetables',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('data_json', sa.Text(), nullable=False),
+    *_timestamps(),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_timetables_user_id', 'timetables', ['user_id'], unique=False, if_not_exists=True)
+
+    op.create_table('google_tokens',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('access_token', sa.Text(), nullable=False),
+    sa.Column('refresh_token', sa.Text(), nullable=False),
+    sa.Column('token_expiry', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('user_id'),
+    if_not_exists=True
+    )
+
+    op.create_table('apple_calendar_credentials',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('apple_id_email', sa.String(), nullable=False),
+    sa.Column('encrypted_app_password', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id'),
+    if_not_exists=True
+    )
+
+    op.create_table('calendar_events',
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('provider', sa.String(), nullable=False),
+    sa.Column('external_event_id', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('event_id', 'user_id', 'provider'),
+    if_not_exists=True
+    )
+
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('room_id', sa.String(), nullable=False),
+    sa.Column('webhook_url', sa.String(), nullable=False),
+    sa.Column('payload_json', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('claim_token', sa.String(), nullable=True),
+    sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_notification_outbox_room_id', 'notification_outbox', ['room_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_notification_outbox_status_next_attempt_at', 'notification_outbox', ['status', 'next_attempt_at'], unique=False, if_not_exists=True)
+
+    op.create_table('email_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('recipient', sa.String(), nullable=False),
+    sa.Column('payload_json', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('claim_token', sa.String(), nullable=True),
+    sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_email_jobs_status_next_attempt_at', 'email_jobs', ['status', 'next_attempt_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for table in [
+        'email_jobs', 'notification_outbox', 'calendar_events', 'apple_calendar_credentials',
+        'google_tokens', 'timetables', 'timetable_templates', 'event_vote_tallies', 'event_votes',
+        'event_attendees', 'events', 'room_webhooks', 'room_members', 'rooms',
+        'email_verification_codes', 'users',
+    ]:
+        op.drop_table(table)
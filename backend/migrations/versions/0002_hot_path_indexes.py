@@ -0,0 +1,44 @@
+"""hot path indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 16:20:00.000000
+
+常用查詢條件的索引：
+- room_members.user_id：使用者的房間列表（主鍵以 room_id 開頭，用不到）
+- event_attendees.user_id：使用者參加的活動
+- event_votes.event_id：活動的投票統計
+- email_verification_codes(email, used, expires_at)：驗證碼 / OTP 查詢，取代只有 email 的索引
+- events(public, start_time)：公開活動列表
+"""
+from alembic import op
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_room_members_user_id', 'room_members', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_event_attendees_user_id', 'event_attendees', ['user_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_event_votes_event_id', 'event_votes', ['event_id'], unique=False, if_not_exists=True)
+    op.create_index(
+        'ix_email_verification_codes_email_used_expires_at',
+        'email_verification_codes',
+        ['email', 'used', 'expires_at'],
+        unique=False,
+        if_not_exists=True
+    )
+    op.drop_index('ix_email_verification_codes_email', table_name='email_verification_codes', if_exists=True)
+    op.create_index('ix_events_public_start_time', 'events', ['public', 'start_time'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_public_start_time', table_name='events')
+    op.create_index('ix_email_verification_codes_email', 'email_verification_codes', ['email'], unique=False)
+    op.drop_index('ix_email_verification_codes_email_used_expires_at', table_name='email_verification_codes')
+    op.drop_index('ix_event_votes_event_id', table_name='event_votes')
+    op.drop_index('ix_event_attendees_user_id', table_name='event_attendees')
+    op.drop_index('ix_room_members_user_id', table_name='room_members')
@@ -0,0 +1,31 @@
+"""app state
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 16:40:00.000000
+
+app_state：系統層級的 key/value 狀態。啟動初始化完成後寫入版本，
+重新啟動的 worker 比對相同就不再執行 migration 與預設資料建立。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('app_state',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('value', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('app_state')
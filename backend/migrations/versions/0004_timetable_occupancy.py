@@ -0,0 +1,32 @@
+"""timetable occupancy
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 17:30:00.000000
+
+timetables 加上每日佔用遮罩（busy_monday ~ busy_sunday），空堂與房間共同空堂
+只讀這些整數欄位，不再解析 data_json。既有資料由啟動初始化或
+python -m app.cli timetable-occupancy --backfill 補上。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('timetables') as batch_op:
+        for day in WEEKDAYS:
+            batch_op.add_column(sa.Column(f'busy_{day}', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('timetables') as batch_op:
+        for day in reversed(WEEKDAYS):
+            batch_op.drop_column(f'busy_{day}')
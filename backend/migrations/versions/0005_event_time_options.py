@@ -0,0 +1,98 @@
+"""event time options
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 18:10:00.000000
+
+私人活動的候選時間從 events.proposed_times_json 移到 event_time_options，
+每個選項一列並以時間建立索引。既有的 JSON 在升級時轉換（有時區的時間轉為 naive UTC），
+之後刪除 proposed_times_json 欄位。
+"""
+import json
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+events = sa.table(
+    'events',
+    sa.column('id', sa.String()),
+    sa.column('proposed_times_json', sa.Text()),
+)
+
+event_time_options = sa.table(
+    'event_time_options',
+    sa.column('event_id', sa.String()),
+    sa.column('position', sa.Integer()),
+    sa.column('start_time', sa.DateTime(timezone=True)),
+    sa.column('end_time', sa.DateTime(timezone=True)),
+)
+
+
+def _parse(value: str, dialect: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    if dialect != 'sqlite':
+        # 與 UTCDateTime 相同：PostgreSQL 的 timestamptz 寫入時標記為 UTC
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def upgrade() -> None:
+    op.create_table('event_time_options',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('end_time', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_event_time_options_event_id_position', 'event_time_options', ['event_id', 'position'], unique=False, if_not_exists=True)
+    op.create_index('ix_event_time_options_start_time_end_time', 'event_time_options', ['start_time', 'end_time'], unique=False, if_not_exists=True)
+
+    bind = op.get_bind()
+    rows = []
+    for event_id, proposed_times_json in bind.execute(
+        sa.select(events.c.id, events.c.proposed_times_json).where(events.c.proposed_times_json.isnot(None))
+    ):
+        for position, option in enumerate(json.loads(proposed_times_json) or []):
+            rows.append({
+                'event_id': event_id,
+                'position': position,
+                'start_time': _parse(option['start'], bind.dialect.name),
+                'end_time': _parse(option['end'], bind.dialect.name),
+            })
+    if rows:
+        op.bulk_insert(event_time_options, rows)
+
+    with op.batch_alter_table('events') as batch_op:
+        batch_op.drop_column('proposed_times_json')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('events') as batch_op:
+        batch_op.add_column(sa.Column('proposed_times_json', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    options = {}
+    for event_id, start_time, end_time in bind.execute(
+        sa.select(event_time_options.c.event_id, event_time_options.c.start_time, event_time_options.c.end_time)
+        .order_by(event_time_options.c.event_id, event_time_options.c.position)
+    ):
+        options.setdefault(event_id, []).append({'start': start_time.isoformat(), 'end': end_time.isoformat()})
+    for event_id, proposed_times in options.items():
+        bind.execute(
+            events.update().where(events.c.id == event_id).values(proposed_times_json=json.dumps(proposed_times))
+        )
+
+    op.drop_index('ix_event_time_options_start_time_end_time', table_name='event_time_options')
+    op.drop_index('ix_event_time_options_event_id_position', table_name='event_time_options')
+    op.drop_table('event_time_options')
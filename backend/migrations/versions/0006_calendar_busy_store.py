@@ -0,0 +1,50 @@
+"""calendar busy store
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 19:20:00.000000
+
+calendar_busy_windows / calendar_busy_intervals：從 Google / Apple 行事曆取得的忙碌時段快取，
+每個使用者、每個 provider 記錄已取得的時間範圍與取得時間，排程功能可一次查詢多位使用者。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('calendar_busy_windows',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('provider', sa.String(), nullable=False),
+    sa.Column('window_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('window_end', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'provider'),
+    if_not_exists=True
+    )
+    op.create_table('calendar_busy_intervals',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('provider', sa.String(), nullable=False),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('end_time', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_calendar_busy_intervals_user_id_provider_start_time', 'calendar_busy_intervals', ['user_id', 'provider', 'start_time'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_calendar_busy_intervals_user_id_provider_start_time', table_name='calendar_busy_intervals')
+    op.drop_table('calendar_busy_intervals')
+    op.drop_table('calendar_busy_windows')
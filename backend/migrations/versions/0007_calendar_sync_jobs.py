@@ -0,0 +1,48 @@
+"""calendar sync jobs
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 20:05:00.000000
+
+calendar_sync_jobs：活動同步到 Google / Apple 行事曆的工作佇列，
+每個活動、使用者、provider 一列（唯一索引），連續的建立 / 更新 / 刪除合併為一次同步。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('calendar_sync_jobs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('event_id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('provider', sa.String(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('external_event_id', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('claim_token', sa.String(), nullable=True),
+    sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_calendar_sync_jobs_event_id_user_id_provider', 'calendar_sync_jobs', ['event_id', 'user_id', 'provider'], unique=True, if_not_exists=True)
+    op.create_index('ix_calendar_sync_jobs_status_next_attempt_at', 'calendar_sync_jobs', ['status', 'next_attempt_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_calendar_sync_jobs_status_next_attempt_at', table_name='calendar_sync_jobs')
+    op.drop_index('ix_calendar_sync_jobs_event_id_user_id_provider', table_name='calendar_sync_jobs')
+    op.drop_table('calendar_sync_jobs')
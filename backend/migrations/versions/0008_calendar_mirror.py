@@ -0,0 +1,55 @@
+"""calendar mirror
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 21:00:00.000000
+
+calendar_mirror_collections / calendar_mirror_events：Google / Apple 行事曆事件的本機鏡像，
+以 Google syncToken、CalDAV ctag / sync-collection / etag 增量更新，忙碌時段查詢直接讀鏡像。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('calendar_mirror_collections',
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('provider', sa.String(), nullable=False),
+    sa.Column('collection_id', sa.String(), nullable=False),
+    sa.Column('sync_token', sa.Text(), nullable=True),
+    sa.Column('ctag', sa.String(), nullable=True),
+    sa.Column('window_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('window_end', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('synced_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'provider', 'collection_id'),
+    if_not_exists=True
+    )
+    op.create_table('calendar_mirror_events',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('provider', sa.String(), nullable=False),
+    sa.Column('collection_id', sa.String(), nullable=False),
+    sa.Column('resource_id', sa.String(), nullable=False),
+    sa.Column('etag', sa.String(), nullable=True),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('end_time', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_calendar_mirror_events_user_id_provider_start_time', 'calendar_mirror_events', ['user_id', 'provider', 'start_time'], unique=False, if_not_exists=True)
+    op.create_index('ix_calendar_mirror_events_user_id_provider_collection_id_resource_id', 'calendar_mirror_events', ['user_id', 'provider', 'collection_id', 'resource_id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_calendar_mirror_events_user_id_provider_collection_id_resource_id', table_name='calendar_mirror_events')
+    op.drop_index('ix_calendar_mirror_events_user_id_provider_start_time', table_name='calendar_mirror_events')
+    op.drop_table('calendar_mirror_events')
+    op.drop_table('calendar_mirror_collections')
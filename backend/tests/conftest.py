@@ -0,0 +1,98 @@
+"""
+測試共用設定
+
+- 預設使用暫存資料夾中的 SQLite；設定 TEST_DATABASE_URL 時改用該資料庫（例如 PostgreSQL），
+  所有測試都會在該資料庫上執行。資料庫會先降到 base 再升級到最新版本，請使用專用的測試資料庫
+- DATABASE_URL 必須在 import app 之前設定，engine 在 import 時建立
+- 沒有使用 pytest-asyncio：async 測試由 pytest_pyfunc_call 在同一個 event loop 上執行
+  （engine 的連線綁定在建立它的 loop 上）
+"""
+import asyncio
+import inspect
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix="jiu-pluck-test-")
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite+aiosqlite:///{_TEST_DIR}/test.db"
+os.environ["DB_SLOW_QUERY_MS"] = "0"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import delete, event  # noqa: E402
+from alembic import command  # noqa: E402
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.core.migrations import alembic_config, target_metadata, upgrade_database  # noqa: E402
+
+_loop = asyncio.new_event_loop()
+
+
+def run(coro):
+    """在測試共用的 event loop 上執行 coroutine（給同步的 fixture 使用）"""
+    return _loop.run_until_complete(coro)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if inspect.iscoroutinefunction(pyfuncitem.obj):
+        args = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+        run(pyfuncitem.obj(**args))
+        return True
+    return None
+
+
+async def _reset_schema() -> None:
+    def downgrade(sync_conn) -> None:
+        config = alembic_config()
+        config.attributes["connection"] = sync_conn
+        config.attributes["configure_logger"] = False
+        command.downgrade(config, "base")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(downgrade)
+    await upgrade_database()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """整個測試只建立一次 schema（以 migration 建立）"""
+    run(_reset_schema())
+    yield
+    run(engine.dispose())
+
+
+async def _truncate() -> None:
+    async with engine.begin() as conn:
+        for table in reversed(target_metadata.sorted_tables):
+            await conn.execute(delete(table))
+
+
+@pytest.fixture
+def db():
+    """每個測試一個 session，結束後清空所有資料表"""
+    session = AsyncSessionLocal()
+    yield session
+    run(session.close())
+    run(_truncate())
+
+
+@pytest.fixture
+def query_log():
+    """記錄測試期間送出的 SQL"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def client():
+    """以 ASGI 呼叫 API 的 client（不執行 startup：不跑 migration，也不啟動背景工作）"""
+    from app.main import app
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    yield client
+    run(client.aclose())
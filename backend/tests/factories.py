@@ -0,0 +1,33 @@
+"""測試資料"""
+import uuid
+from app.core.security import create_access_token
+from app.models.user import User
+from app.models.room import Room, room_members
+
+
+async def make_user(db, name: str = None, **values) -> User:
+    user_id = str(uuid.uuid4())
+    user = User(
+        id=user_id,
+        email=f"{user_id}@example.com",
+        password_hash="x",
+        name=name or f"user-{user_id[:8]}",
+        **values
+    )
+    db.add(user)
+    await db.flush()
+    return user
+
+
+async def make_room(db, owner: User, members=(), name: str = None) -> Room:
+    room = Room(id=str(uuid.uuid4()), name=name or "room", owner_id=owner.id)
+    db.add(room)
+    await db.flush()
+    await db.execute(room_members.insert().values(room_id=room.id, user_id=owner.id, role="owner"))
+    for member in members:
+        await db.execute(room_members.insert().values(room_id=room.id, user_id=member.id, role="member"))
+    return room
+
+
+def auth_headers(user: User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user.id})}"}
@@ -0,0 +1,129 @@
+"""空堂計算：預先計算的佔用遮罩與直接解析 data_json 的結果一致"""
+import json
+from sqlalchemy import select
+from app.models.timetable import Timetable
+from app.services.availability_service import (
+    WEEKDAYS,
+    backfill_occupancy,
+    build_week_occupancy,
+    check_occupancy,
+    encode_occupancy,
+    load_member_occupancy,
+    period_projection,
+    project_occupancy
+)
+from app.services.timetable_service import DEFAULT_PERIODS, get_free_slots
+from factories import auth_headers, make_room, make_user
+
+WEEK = {
+    "monday": [{"period": "1", "course": "微積分"}, {"period": "3", "course": "物理"}],
+    "wednesday": [{"period": "8", "course": "英文"}, {"period": "12", "course": "夜間課"}],
+    "friday": [{"period": "2"}, {"course": "沒有節次"}],
+}
+NAMED_PERIODS = [
+    {"name": "A", "start": "07:10", "end": "08:00"},
+    {"name": "1", "start": "08:10", "end": "09:00"},
+]
+
+
+def _timetable(user, data, encode=True):
+    timetable = Timetable(user_id=user.id, data_json=json.dumps(data))
+    if encode:
+        for day, mask in zip(WEEKDAYS, encode_occupancy(data) or [None] * len(WEEKDAYS)):
+            setattr(timetable, f"busy_{day}", mask)
+    return timetable
+
+
+def test_projection_matches_data_json():
+    masks = encode_occupancy(WEEK)
+    # 模板沒有的節次（12）只記在遮罩中，投影到模板時略過
+    assert masks[2] == 1 << 7 | 1 << 11
+    assert project_occupancy(masks, period_projection(DEFAULT_PERIODS)) == build_week_occupancy(WEEK, DEFAULT_PERIODS)
+    assert build_week_occupancy(WEEK, DEFAULT_PERIODS)[:5] == [0b101, 0, 1 << 7, 0, 0b10]
+
+
+def test_unencodable_period_names():
+    assert encode_occupancy({"monday": [{"period": "A"}]}) is None
+    assert encode_occupancy({"monday": [{"period": "64"}]}) is None
+    assert period_projection(NAMED_PERIODS) is None
+
+
+async def test_null_masks_and_named_periods_read_data_json(db):
+    encoded, legacy, named = [await make_user(db) for _ in range(3)]
+    named_week = {"tuesday": [{"period": "A"}, {"period": "1"}]}
+    db.add_all([
+        _timetable(encoded, WEEK),
+        _timetable(legacy, WEEK, encode=False),
+        _timetable(named, named_week),
+    ])
+    await db.commit()
+    user_ids = [encoded.id, legacy.id, named.id]
+
+    occupancy = await load_member_occupancy(db, user_ids, DEFAULT_PERIODS)
+    assert occupancy[encoded.id] == occupancy[legacy.id] == build_week_occupancy(WEEK, DEFAULT_PERIODS)
+    assert occupancy[named.id] == build_week_occupancy(named_week, DEFAULT_PERIODS)
+
+    # 模板的節次名稱無法編碼：全部改讀 data_json
+    occupancy = await load_member_occupancy(db, user_ids + ["no-timetable"], NAMED_PERIODS)
+    assert occupancy[encoded.id] == build_week_occupancy(WEEK, NAMED_PERIODS)
+    assert occupancy[named.id][1] == 0b11
+    assert occupancy["no-timetable"] == [0] * len(WEEKDAYS)
+
+
+async def test_backfill_is_idempotent(db):
+    legacy, named = [await make_user(db) for _ in range(2)]
+    db.add_all([
+        _timetable(legacy, WEEK, encode=False),
+        _timetable(named, {"monday": [{"period": "午休"}]}, encode=False),
+    ])
+    await db.commit()
+
+    assert await backfill_occupancy(db, batch_size=1) == 2
+    masks = dict((await db.execute(select(Timetable.user_id, Timetable.busy_monday))).all())
+    assert masks == {legacy.id: 0b101, named.id: None}
+    assert await check_occupancy(db) == []
+
+    # 再執行一次：已編碼的不再處理，無法編碼的仍維持 NULL
+    assert await backfill_occupancy(db) == 1
+    masks = dict((await db.execute(select(Timetable.user_id, Timetable.busy_monday))).all())
+    assert masks == {legacy.id: 0b101, named.id: None}
+    assert await check_occupancy(db) == []
+
+
+async def test_free_slots_accept_short_weekday(db):
+    user = await make_user(db)
+    db.add(_timetable(user, WEEK))
+    await db.commit()
+
+    slots = await get_free_slots(db, user.id, "mon", DEFAULT_PERIODS)
+    assert slots == await get_free_slots(db, user.id, "Monday", DEFAULT_PERIODS)
+    assert [slot.start for slot in slots] == [p["start"] for p in DEFAULT_PERIODS if p["name"] not in ("1", "3")]
+
+
+async def test_room_availability(db, client):
+    owner, member = [await make_user(db) for _ in range(2)]
+    room = await make_room(db, owner, [member])
+    db.add(_timetable(owner, WEEK))
+    db.add(_timetable(member, {"monday": [{"period": "2"}]}))
+    await db.commit()
+
+    response = await client.get(f"/api/rooms/{room.id}/availability?weekday=mon", headers=auth_headers(member))
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["member_count"], body["min_free"]) == (2, 2)
+    assert [slot["period"] for slot in body["slots"]] == ["4", "5", "6", "7", "8"]
+
+    response = await client.get(f"/api/rooms/{room.id}/availability?weekday=mon&min_free=1", headers=auth_headers(member))
+    assert [(slot["period"], slot["free_count"]) for slot in response.json()["slots"]][-3:] == [("1", 1), ("2", 1), ("3", 1)]
+
+
+async def test_room_availability_access(db, client):
+    owner, outsider = [await make_user(db) for _ in range(2)]
+    admin = await make_user(db, is_admin=1)
+    room = await make_room(db, owner)
+    await db.commit()
+
+    assert (await client.get(f"/api/rooms/{room.id}/availability", headers=auth_headers(outsider))).status_code == 403
+    # 管理員可以查詢任何房間，但不存在的房間回傳 404，而不是成員數 0 的結果
+    assert (await client.get(f"/api/rooms/{room.id}/availability", headers=auth_headers(admin))).status_code == 200
+    assert (await client.get("/api/rooms/missing/availability", headers=auth_headers(admin))).status_code == 404
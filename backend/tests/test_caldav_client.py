@@ -0,0 +1,276 @@
+"""CalDAV client：以錄下的 iCloud 回應測試解析，以 httpx.MockTransport 測試 session 重用"""
+import base64
+from datetime import datetime
+from pathlib import Path
+import httpx
+import pytest
+from app.core.config import settings
+from app.core.security import encrypt_app_password
+from app.services.caldav_client import (
+    CalDAVError,
+    CalDAVSession,
+    CalDAVSessionPool,
+    build_vevent,
+    parse_busy_intervals
+)
+from conftest import run
+
+BASE_URL = "https://caldav.icloud.com/"
+HOME = "https://p42-caldav.icloud.com:443/123456789/calendars/"
+DATA = Path(__file__).parent / "data" / "caldav"
+
+
+def _recorded(name: str) -> bytes:
+    return (DATA / name).read_bytes()
+
+
+class CalDAVServer:
+    """依 method 與路徑回應錄下的內容，記錄收到的請求"""
+
+    def __init__(self, routes=None):
+        self.routes = {
+            ("PROPFIND", "/"): "principal.xml",
+            ("PROPFIND", "/123456789/principal/"): "home_set.xml",
+            ("PROPFIND", "/123456789/calendars/"): "calendars.xml",
+            **(routes or {})
+        }
+        self.requests = []
+        self.transport = httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        name = self.routes.get((request.method, request.url.path))
+        if name is None:
+            return httpx.Response(404)
+        return httpx.Response(207, content=_recorded(name), headers={"Content-Type": "application/xml"})
+
+    def session(self) -> CalDAVSession:
+        return CalDAVSession("user@icloud.com", "app-password", base_url=BASE_URL, transport=self.transport)
+
+
+async def test_discovers_event_calendars():
+    server = CalDAVServer()
+    session = server.session()
+    try:
+        calendars = await session.calendars()
+        # 只保留可放 VEVENT 的行事曆：略過提醒事項、收件匣與 home 本身；沒有列出元件的視為可用
+        assert [(c.url, c.name, c.ctag) for c in calendars] == [
+            (HOME + "home/", "家庭", "HwoQEgwAAE5Z"),
+            (HOME + "work/", "工作", "HwoQEgwAAE5b"),
+        ]
+        assert session.principal_url == BASE_URL + "123456789/principal/"
+        assert session.home_url == HOME
+        assert [r.headers["Depth"] for r in server.requests] == ["0", "0", "1"]
+
+        # 探索結果快取；refresh 時只重新列出行事曆
+        await session.calendars()
+        assert len(server.requests) == 3
+        await session.calendars(refresh=True)
+        assert [r.url.path for r in server.requests[3:]] == ["/123456789/calendars/"]
+    finally:
+        await session.close()
+
+
+async def test_discovery_without_principal_fails():
+    server = CalDAVServer({("PROPFIND", "/"): "calendars.xml"})
+    session = server.session()
+    try:
+        with pytest.raises(CalDAVError, match="current-user-principal"):
+            await session.calendars()
+    finally:
+        await session.close()
+
+
+async def test_sync_collection_changes_and_removals():
+    server = CalDAVServer({("REPORT", "/123456789/calendars/home/"): "sync_collection.xml"})
+    session = server.session()
+    try:
+        changed, removed, token = await session.sync_collection(HOME + "home/", "old-token")
+    finally:
+        await session.close()
+
+    # 行事曆本身不算變動的事件；404 的是已刪除的事件
+    assert changed == {
+        HOME + "home/A1B2C3.ics": '"mjzs7y0k"',
+        HOME + "home/D4E5F6.ics": '"mjzt0c3r"',
+    }
+    assert removed == [HOME + "home/DELETED.ics"]
+    assert token == "HwoQEgwAAE5cAAAAAAAAAAAYAhgAIhUIg4OM7oqUxqH0ARD4p6SJ4MWa6/wBKAA="
+    assert b"<d:sync-token>old-token</d:sync-token>" in server.requests[0].content
+
+
+async def test_sync_token_is_escaped():
+    server = CalDAVServer({("REPORT", "/123456789/calendars/home/"): "sync_collection.xml"})
+    session = server.session()
+    try:
+        await session.sync_collection(HOME + "home/", "a<b&c")
+    finally:
+        await session.close()
+    assert b"<d:sync-token>a&lt;b&amp;c</d:sync-token>" in server.requests[0].content
+
+
+async def test_multiget_returns_documents_by_href():
+    server = CalDAVServer({("REPORT", "/123456789/calendars/home/"): "multiget.xml"})
+    session = server.session()
+    hrefs = [HOME + "home/A1B2C3.ics", HOME + "home/D4E5F6.ics", HOME + "home/GONE.ics"]
+    try:
+        documents = await session.multiget(HOME + "home/", hrefs, datetime(2026, 3, 1), datetime(2026, 3, 8), chunk_size=2)
+    finally:
+        await session.close()
+
+    # 依 chunk_size 分批送出，只送路徑；已刪除的事件不在結果中
+    assert len(server.requests) == 2
+    assert b"<d:href>/123456789/calendars/home/A1B2C3.ics</d:href>" in server.requests[0].content
+    assert b'<c:expand start="20260301T000000Z" end="20260308T000000Z"/>' in server.requests[0].content
+    assert set(documents) == set(hrefs[:2])
+    etag, ics = documents[HOME + "home/A1B2C3.ics"]
+    assert etag == '"mjzs7y0k"'
+    assert parse_busy_intervals(ics) == [(datetime(2026, 3, 2, 2, 0), datetime(2026, 3, 2, 3, 30))]
+    assert parse_busy_intervals(documents[HOME + "home/D4E5F6.ics"][1]) == [
+        (datetime(2026, 3, 3, 1, 0), datetime(2026, 3, 3, 1, 45)),
+        (datetime(2026, 3, 4, 1, 0), datetime(2026, 3, 4, 1, 45)),
+    ]
+
+
+async def test_busy_intervals_queries_every_calendar():
+    server = CalDAVServer({("REPORT", "/123456789/calendars/home/"): "calendar_query.xml"})
+    session = server.session()
+    try:
+        # work 行事曆回應 404：整個查詢失敗，不會當作沒有忙碌時段
+        with pytest.raises(CalDAVError) as error:
+            await session.busy_intervals(datetime(2026, 3, 2, 3), datetime(2026, 3, 3))
+        assert error.value.status == 404
+
+        server.routes[("REPORT", "/123456789/calendars/work/")] = "calendar_query.xml"
+        intervals = await session.busy_intervals(datetime(2026, 3, 2, 3), datetime(2026, 3, 3))
+    finally:
+        await session.close()
+    # 裁切到查詢範圍內
+    assert intervals == [(datetime(2026, 3, 2, 3), datetime(2026, 3, 2, 3, 30))] * 2
+
+
+def test_parse_busy_intervals(monkeypatch):
+    monkeypatch.setattr(settings, "TIMETABLE_TIMEZONE", "Asia/Taipei")
+    ics = "\r\n".join([
+        "BEGIN:VCALENDAR",
+        "BEGIN:VTIMEZONE",
+        "TZID:Asia/Taipei",
+        "BEGIN:STANDARD",
+        "DTSTART:19700101T000000",
+        "TZOFFSETFROM:+0800",
+        "TZOFFSETTO:+0800",
+        "END:STANDARD",
+        "END:VTIMEZONE",
+        "BEGIN:VEVENT",
+        "UID:all-day",
+        "DTSTART;VALUE=DATE:20260305",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:floating",
+        "DTSTART:20260306T090000",
+        "DTEND:20260306T100000",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:free",
+        "DTSTART:20260306T020000Z",
+        "DTEND:20260306T030000Z",
+        "TRANSP:TRANSPARENT",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:cancelled",
+        "DTSTART:20260306T020000Z",
+        "DTEND:20260306T030000Z",
+        "STATUS:CANCELLED",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:folded",
+        "DTSTART;TZID=\"America/New_Yo",
+        " rk\":20260307T080000",
+        "DURATION:P1DT2H",
+        "END:VEVENT",
+        "BEGIN:VEVENT",
+        "UID:zero-length",
+        "DTSTART:20260308T000000Z",
+        "END:VEVENT",
+        "END:VCALENDAR",
+        ""
+    ])
+    assert parse_busy_intervals(ics) == [
+        (datetime(2026, 3, 5), datetime(2026, 3, 6)),
+        # 浮動時間以課表時區（Asia/Taipei）計
+        (datetime(2026, 3, 6, 1, 0), datetime(2026, 3, 6, 2, 0)),
+        (datetime(2026, 3, 7, 13, 0), datetime(2026, 3, 8, 15, 0)),
+    ]
+
+
+def test_build_vevent_round_trip():
+    ics = build_vevent("uid-1", "期末報告, 第 1 組; " + "很長的標題" * 10, datetime(2026, 3, 2, 2), datetime(2026, 3, 2, 4))
+    assert all(len(line.encode("utf-8")) <= 75 for line in ics.split("\r\n"))
+    assert "SUMMARY:期末報告\\, 第 1 組\\; " in ics
+    assert parse_busy_intervals(ics) == [(datetime(2026, 3, 2, 2), datetime(2026, 3, 2, 4))]
+
+
+@pytest.fixture
+def server():
+    return CalDAVServer()
+
+
+@pytest.fixture
+def pool(server):
+    pool = CalDAVSessionPool(max_sessions=2, idle_seconds=600, base_url=BASE_URL, transport=server.transport)
+    yield pool
+    run(pool.close())
+
+
+async def test_pool_reuses_session_and_discovery(pool, server):
+    password = encrypt_app_password("app-password")
+    session = await pool.get("u1", "user@icloud.com", password)
+    await session.calendars()
+
+    again = await pool.get("u1", "user@icloud.com", password)
+    assert again is session
+    await again.calendars()
+    # 重用 session 的探索結果，不再送出 PROPFIND
+    assert len(server.requests) == 3
+    # 密碼在建立 session 時解密
+    assert server.requests[0].headers["Authorization"] == "Basic " + base64.b64encode(b"user@icloud.com:app-password").decode()
+
+
+async def test_pool_rebuilds_session_when_credentials_change(pool):
+    session = await pool.get("u1", "user@icloud.com", encrypt_app_password("old"))
+    replaced = await pool.get("u1", "user@icloud.com", encrypt_app_password("new"))
+    assert replaced is not session
+    assert session.client.is_closed
+    assert not replaced.client.is_closed
+
+
+async def test_pool_discard_and_eviction(pool):
+    password = encrypt_app_password("app-password")
+    first = await pool.get("u1", "a@icloud.com", password)
+    await pool.discard("u1")
+    assert first.client.is_closed
+    assert await pool.get("u1", "a@icloud.com", password) is not first
+
+    # 超過 max_sessions 時關閉最久沒有使用的 session
+    second = await pool.get("u2", "b@icloud.com", password)
+    await pool.get("u1", "a@icloud.com", password)
+    third = await pool.get("u3", "c@icloud.com", password)
+    assert second.client.is_closed
+    assert not third.client.is_closed
+    assert await pool.get("u2", "b@icloud.com", password) is not second
+
+
+
+async def test_pool_keeps_leased_session_open_until_released(pool, server):
+    async with pool.lease("u1", "user@icloud.com", encrypt_app_password("old")) as session:
+        await session.calendars()
+        # 使用中時憑證變更：舊 session 延後關閉，進行中的操作照常完成
+        replaced = await pool.get("u1", "user@icloud.com", encrypt_app_password("new"))
+        assert replaced is not session
+        assert not session.client.is_closed
+        assert len(await session.calendars(refresh=True)) == 2
+    assert session.client.is_closed
+
+    # 之後仍拿著舊 session 的呼叫端得到 CalDAVError，而不是 httpx 的 RuntimeError
+    with pytest.raises(CalDAVError, match="session closed"):
+        await session.calendars(refresh=True)
@@ -0,0 +1,179 @@
+"""忙碌時段快取：命中 / 未命中、過期後由背景更新、查詢失敗不當作空閒"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from app.core.database import AsyncSessionLocal
+from app.models.calendar_integration import CalendarBusyWindow
+from app.services.calendar_busy_store import CalendarBusyStore
+from app.services.calendar_service import BusySlot
+from factories import make_user
+
+
+class FakeProvider:
+    """依 slots / errors 回應的 provider，記錄每次查詢"""
+
+    def __init__(self):
+        self.slots = {}
+        self.errors = {}
+        self.calls = []
+
+    def __call__(self, name, session):
+        return self
+
+    async def get_busy_slots(self, user, start, end):
+        self.calls.append((user.id, start, end))
+        if user.id in self.errors:
+            raise self.errors[user.id]
+        return [slot for slot in self.slots.get(user.id, []) if slot.start < end and slot.end > start]
+
+
+@pytest.fixture
+def provider():
+    return FakeProvider()
+
+
+@pytest.fixture
+def store(provider):
+    return CalendarBusyStore(
+        ttl_seconds=60,
+        window_days=7,
+        idle_seconds=3600,
+        concurrency=4,
+        batch_size=10,
+        poll_interval=1,
+        provider_factory=provider,
+        provider_names=["fake"]
+    )
+
+
+def _range():
+    start = (datetime.utcnow() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=1)
+
+
+async def _lookup(store, user_ids, start, end):
+    # 每次查詢使用新的 session，與 API 請求相同
+    async with AsyncSessionLocal() as session:
+        busy = await store.get_busy_intervals(session, user_ids, start, end)
+    return {user_id: [(s.start, s.end) for s in slots] for user_id, slots in busy.items()}
+
+
+async def _window(user_id):
+    async with AsyncSessionLocal() as session:
+        return await session.get(CalendarBusyWindow, (user_id, "fake"))
+
+
+async def test_miss_fetches_and_hit_reads_cache(db, store, provider):
+    users = [await make_user(db) for _ in range(2)]
+    await db.commit()
+    start, end = _range()
+    provider.slots[users[0].id] = [BusySlot(start + timedelta(hours=9), start + timedelta(hours=10))]
+
+    expected = {users[0].id: [(start + timedelta(hours=9), start + timedelta(hours=10))]}
+    assert await _lookup(store, [u.id for u in users], start, end) == expected
+    # 未命中時一次取得 window_days 天，之後範圍內的查詢都從資料庫讀取
+    assert sorted(call[0] for call in provider.calls) == sorted(u.id for u in users)
+    assert {call[2] for call in provider.calls} == {start + timedelta(days=7)}
+
+    provider.calls.clear()
+    assert await _lookup(store, [u.id for u in users], start, end) == expected
+    assert await _lookup(store, [users[1].id], start + timedelta(days=2), start + timedelta(days=3)) == {}
+    assert provider.calls == []
+
+    # 超出已取得的範圍：重新查詢
+    assert await _lookup(store, [users[1].id], start + timedelta(days=6), start + timedelta(days=8)) == {}
+    assert [call[0] for call in provider.calls] == [users[1].id]
+
+
+async def test_stale_window_is_served_then_refreshed(db, store, provider, monkeypatch):
+    user = await make_user(db)
+    await db.commit()
+    start, end = _range()
+    old = (start + timedelta(hours=9), start + timedelta(hours=10))
+    new = (start + timedelta(hours=14), start + timedelta(hours=15))
+    provider.slots[user.id] = [BusySlot(*old)]
+    await _lookup(store, [user.id], start, end)
+
+    # 行事曆變動，且快取已超過 TTL
+    provider.slots[user.id] = [BusySlot(*new)]
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(CalendarBusyWindow).values(fetched_at=datetime.utcnow() - timedelta(minutes=5))
+        )
+        await session.commit()
+
+    woken = []
+    monkeypatch.setattr(store, "wake", lambda: woken.append(True))
+    provider.calls.clear()
+    # 過期的資料先回傳，不在請求中查詢行事曆，改由背景更新
+    assert await _lookup(store, [user.id], start, end) == {user.id: [old]}
+    assert provider.calls == []
+    assert woken == [True]
+
+    assert await store.run_once() == 1
+    assert await store.run_once() == 0
+    assert await _lookup(store, [user.id], start, end) == {user.id: [new]}
+    window = await _window(user.id)
+    assert window.locked_until is None
+    assert window.fetched_at > datetime.utcnow() - timedelta(minutes=1)
+
+
+async def test_invalidate_forces_refetch(db, store, provider):
+    user = await make_user(db)
+    await db.commit()
+    start, end = _range()
+    await _lookup(store, [user.id], start, end)
+
+    async with AsyncSessionLocal() as session:
+        await store.invalidate(session, user.id)
+        await session.commit()
+    assert await _window(user.id) is None
+
+    provider.calls.clear()
+    await _lookup(store, [user.id], start, end)
+    assert len(provider.calls) == 1
+
+
+async def test_lookup_error_is_not_cached_as_free(db, store, provider):
+    user = await make_user(db)
+    await db.commit()
+    start, end = _range()
+    provider.errors[user.id] = RuntimeError("503 Service Unavailable")
+
+    assert await _lookup(store, [user.id], start, end) == {}
+    # 沒有寫入範圍：不會在之後的查詢中當作「沒有任何忙碌時段」
+    assert await _window(user.id) is None
+
+    # lease 期間內不再重試，之後重新查詢
+    provider.calls.clear()
+    await _lookup(store, [user.id], start, end)
+    assert provider.calls == []
+
+    del provider.errors[user.id]
+    provider.slots[user.id] = [BusySlot(start + timedelta(hours=1), start + timedelta(hours=2))]
+    store._retry_after.clear()
+    assert await _lookup(store, [user.id], start, end) == {user.id: [(start + timedelta(hours=1), start + timedelta(hours=2))]}
+
+
+async def test_refresh_error_keeps_cache_and_records_error(db, store, provider):
+    user = await make_user(db)
+    await db.commit()
+    start, end = _range()
+    slot = (start + timedelta(hours=9), start + timedelta(hours=10))
+    provider.slots[user.id] = [BusySlot(*slot)]
+    await _lookup(store, [user.id], start, end)
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(CalendarBusyWindow).values(fetched_at=datetime.utcnow() - timedelta(minutes=5))
+        )
+        await session.commit()
+    provider.errors[user.id] = RuntimeError("token revoked")
+
+    assert await store.run_once() == 1
+    window = await _window(user.id)
+    assert window.last_error == "token revoked"
+    # 認領期限內不再重試；舊的忙碌時段仍然可用
+    assert window.locked_until > datetime.utcnow()
+    assert await store.run_once() == 0
+    assert await _lookup(store, [user.id], start, end) == {user.id: [slot]}
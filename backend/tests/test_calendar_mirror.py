@@ -0,0 +1,112 @@
+"""行事曆鏡像：完整同步（reset）與增量同步"""
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.models.calendar_integration import CalendarMirrorEvent
+from app.services.calendar_mirror import (
+    MirrorChanges,
+    apply_mirror_changes,
+    load_mirror_etags,
+    load_mirror_intervals,
+    load_mirror_states,
+    mirror_covers,
+    needs_rebuild
+)
+from factories import make_user
+
+DAY = datetime(2026, 3, 2)
+WINDOW = (DAY - timedelta(days=30), DAY + timedelta(days=180))
+
+
+def _at(hour: int, hours: int = 1):
+    return (DAY + timedelta(hours=hour), DAY + timedelta(hours=hour + hours))
+
+
+async def _rows(db, user_id, collection_id):
+    result = await db.execute(
+        select(CalendarMirrorEvent.resource_id, CalendarMirrorEvent.start_time)
+        .where(CalendarMirrorEvent.user_id == user_id, CalendarMirrorEvent.collection_id == collection_id)
+        .order_by(CalendarMirrorEvent.resource_id, CalendarMirrorEvent.start_time)
+    )
+    return [(row.resource_id, row.start_time) for row in result.all()]
+
+
+async def _initial(db, user_id):
+    await apply_mirror_changes(db, user_id, "apple", "cal-a", MirrorChanges(
+        {"a": ("e1", [_at(1)]), "b": ("e1", [_at(3), _at(27)]), "c": ("e1", [_at(5)])},
+        [],
+        "token-1",
+        WINDOW,
+        ctag="ctag-1",
+        reset=True
+    ))
+    await apply_mirror_changes(db, user_id, "apple", "cal-b", MirrorChanges(
+        {"x": ("e1", [_at(8)])}, [], "token-b", WINDOW, reset=True
+    ))
+    await db.commit()
+
+
+async def test_incremental_changes_replace_only_touched_events(db):
+    user = await make_user(db)
+    await _initial(db, user.id)
+
+    await apply_mirror_changes(db, user.id, "apple", "cal-a", MirrorChanges(
+        # b 改期（重複事件的兩個時段都換掉）、c 改為透明、a 被刪除、d 新增
+        {"b": ("e2", [_at(4)]), "c": ("e2", []), "d": ("e1", [_at(10)])},
+        ["a"],
+        "token-2",
+        WINDOW,
+        ctag="ctag-2"
+    ))
+    await db.commit()
+
+    assert await _rows(db, user.id, "cal-a") == [
+        ("b", _at(4)[0]),
+        ("c", None),
+        ("d", _at(10)[0]),
+    ]
+    # 沒有忙碌時段的事件仍保留 etag，下次不必重新下載
+    assert await load_mirror_etags(db, user.id, "apple", "cal-a") == {"b": "e2", "c": "e2", "d": "e1"}
+    assert await _rows(db, user.id, "cal-b") == [("x", _at(8)[0])]
+
+    state = (await load_mirror_states(db, user.id, "apple"))["cal-a"]
+    assert (state.sync_token, state.ctag) == ("token-2", "ctag-2")
+    slots = await load_mirror_intervals(db, user.id, "apple", DAY, DAY + timedelta(hours=9))
+    assert [(s.start, s.end) for s in slots] == [_at(4), _at(8)]
+
+
+async def test_reset_replaces_the_whole_collection(db):
+    user = await make_user(db)
+    other = await make_user(db)
+    await _initial(db, user.id)
+    await _initial(db, other.id)
+
+    window = (DAY, DAY + timedelta(days=200))
+    await apply_mirror_changes(db, user.id, "apple", "cal-a", MirrorChanges(
+        {"d": ("e1", [_at(10)])}, ["ignored"], "token-new", window, reset=True
+    ))
+    await db.commit()
+
+    assert await _rows(db, user.id, "cal-a") == [("d", _at(10)[0])]
+    # 其他行事曆與其他使用者的鏡像不受影響
+    assert await _rows(db, user.id, "cal-b") == [("x", _at(8)[0])]
+    assert len(await _rows(db, other.id, "cal-a")) == 4
+
+    states = await load_mirror_states(db, user.id, "apple")
+    assert (states["cal-a"].sync_token, states["cal-a"].window_start, states["cal-a"].ctag) == ("token-new", DAY, None)
+    assert not mirror_covers(states.values(), DAY - timedelta(days=1), DAY)
+    assert mirror_covers(states.values(), DAY, DAY + timedelta(days=1))
+
+
+def test_needs_rebuild():
+    now = datetime(2026, 3, 2, 12)
+
+    class State:
+        def __init__(self, sync_token, window_end):
+            self.sync_token = sync_token
+            self.window_end = window_end
+
+    assert needs_rebuild(None, now)
+    assert needs_rebuild(State(None, now + timedelta(days=365)), now)
+    assert not needs_rebuild(State("t", now + timedelta(days=365)), now)
+    # window 剩餘不到一半
+    assert needs_rebuild(State("t", now + timedelta(days=1)), now)
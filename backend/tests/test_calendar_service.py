@@ -0,0 +1,59 @@
+import httpx
+import pytest
+from sqlalchemy import select
+from app.core.config import Settings, settings
+from app.core.database import AsyncSessionLocal
+from app.models.calendar_integration import AppleCalendarCredential
+from app.services.caldav_client import caldav_sessions
+from app.services.calendar_service import preload_calendar_providers, provider_enabled
+from factories import auth_headers, make_user
+from test_caldav_client import CalDAVServer
+
+
+@pytest.fixture
+def unconfigured(monkeypatch):
+    for key in ("GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET"):
+        monkeypatch.setattr(settings, key, None)
+    monkeypatch.setattr(settings, "APPLE_CALENDAR_ENABLED", False)
+
+
+def test_providers_need_settings(unconfigured):
+    # httpx 一定已安裝，但關閉 Apple 整合時不啟用
+    assert not provider_enabled("apple")
+    assert not provider_enabled("google")
+    assert preload_calendar_providers() == []
+
+
+def test_apple_enabled_by_default(unconfigured, monkeypatch):
+    fields = Settings.model_fields
+    assert fields["APPLE_CALENDAR_ENABLED"].default is True
+    assert fields["APPLE_CALDAV_URL"].default == "https://caldav.icloud.com/"
+
+    monkeypatch.setattr(settings, "APPLE_CALENDAR_ENABLED", True)
+    assert provider_enabled("apple")
+    assert preload_calendar_providers() == ["apple"]
+
+
+def test_google_needs_client_id_and_secret(unconfigured, monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", "id")
+    assert not provider_enabled("google")
+
+
+async def test_apple_connect(db, client, monkeypatch):
+    server = CalDAVServer()
+    monkeypatch.setattr(caldav_sessions, "transport", server.transport)
+    user = await make_user(db)
+    await db.commit()
+    body = {"apple_id_email": "user@icloud.com", "app_specific_password": "app-password"}
+
+    response = await client.post("/api/calendar/apple/connect", json=body, headers=auth_headers(user))
+    assert response.status_code == 200
+    # 以預設的 iCloud 伺服器探索行事曆
+    assert str(server.requests[0].url) == "https://caldav.icloud.com/"
+    async with AsyncSessionLocal() as session:
+        credential = (await session.execute(select(AppleCalendarCredential))).scalar_one()
+    assert (credential.user_id, credential.apple_id_email) == (user.id, "user@icloud.com")
+
+    monkeypatch.setattr(settings, "APPLE_CALENDAR_ENABLED", False)
+    response = await client.post("/api/calendar/apple/connect", json=body, headers=auth_headers(user))
+    assert response.status_code == 503
@@ -0,0 +1,144 @@
+"""活動同步到行事曆：同步期間活動被刪除時不留下對應，也不一再重試"""
+import pytest
+from sqlalchemy import delete, event, select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine
+from app.models.calendar_integration import AppleCalendarCredential, CalendarEvent, CalendarSyncJob
+from app.models.event import Event
+from app.services.calendar_service import SYNC_ACTIONS, sync_event_to_calendars
+from app.services.calendar_sync import CalendarSyncWorker
+from app.services.event_service import delete_event_rows
+from conftest import run
+from factories import make_user
+
+
+class FakeProvider:
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+        self.on_create = None
+
+    def __call__(self, name, session):
+        return self
+
+    async def create_event(self, user, event):
+        if self.on_create:
+            await self.on_create()
+        external_event_id = f"ext-{len(self.created) + 1}"
+        self.created.append(external_event_id)
+        return external_event_id
+
+    async def update_event(self, user, event, external_event_id):
+        pass
+
+    async def delete_event(self, user, external_event_id):
+        self.deleted.append(external_event_id)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setattr(settings, "APPLE_CALENDAR_ENABLED", True)
+    monkeypatch.setattr(settings, "CALENDAR_SYNC_DEBOUNCE_SECONDS", 0)
+    return FakeProvider()
+
+
+@pytest.fixture
+def worker(provider):
+    return CalendarSyncWorker(batch_size=10, concurrency=2, max_attempts=3, poll_interval=1, provider_factory=provider)
+
+
+async def _scheduled_event(db):
+    user = await make_user(db)
+    db.add(AppleCalendarCredential(user_id=user.id, apple_id_email="a@example.com", encrypted_app_password="x"))
+    db.add(Event(id="e1", created_by=user.id, title="t", public=1))
+    await db.flush()
+    assert await sync_event_to_calendars(db, "e1", "create", [user.id]) == 1
+    await db.commit()
+    return user
+
+
+async def _job():
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(CalendarSyncJob))).scalar_one()
+
+
+async def _mappings():
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(CalendarEvent))).scalars().all()
+
+
+def test_update_action_is_not_offered():
+    # 活動不能編輯，沒有排入 update 的地方
+    assert set(SYNC_ACTIONS) == {"create", "delete"}
+
+
+async def test_create_then_record_mapping(db, worker, provider):
+    await _scheduled_event(db)
+
+    assert await worker.run_once() == 1
+    assert [(m.event_id, m.external_event_id) for m in await _mappings()] == [("e1", "ext-1")]
+    job = await _job()
+    assert (job.status, job.external_event_id, job.claim_token) == ("done", None, None)
+
+
+async def test_event_deleted_while_creating(db, worker, provider):
+    await _scheduled_event(db)
+
+    async def delete_event():
+        async with AsyncSessionLocal() as session:
+            await delete_event_rows(session, "e1")
+            await session.execute(delete(Event).where(Event.id == "e1"))
+            await session.commit()
+
+    provider.on_create = delete_event
+    assert await worker.run_once() == 1
+    # 沒有記錄對應；剛建立的事件留給刪除工作
+    assert await _mappings() == []
+    job = await _job()
+    assert (job.action, job.status, job.external_event_id, job.claim_token) == ("delete", "pending", "ext-1", None)
+
+    assert await worker.run_once() == 1
+    assert provider.deleted == ["ext-1"]
+    assert (await _job()).status == "done"
+
+
+@pytest.fixture
+def foreign_keys():
+    """SQLite 預設不檢查外鍵；PostgreSQL 一律檢查"""
+    def enable(dbapi_connection, connection_record, connection_proxy):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "checkout", enable)
+    yield
+    if engine.dialect.name == "sqlite":
+        event.remove(engine.sync_engine, "checkout", enable)
+        # 之後的測試使用不檢查外鍵的連線
+        run(engine.dispose())
+
+
+async def test_event_deleted_before_mapping_is_written(db, worker, provider, foreign_keys):
+    await _scheduled_event(db)
+
+    # 在檢查活動存在之後、寫入對應之前刪除活動
+    deleted = []
+
+    def delete_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO calendar_events") and not deleted:
+            deleted.append(True)
+            conn.execute(delete(Event).where(Event.id == "e1"))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", delete_first)
+    try:
+        assert await worker.run_once() == 1
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", delete_first)
+    assert deleted
+
+    # 違反外鍵只放棄這筆對應，工作照常釋放，不會逾時後再建立一次
+    assert await _mappings() == []
+    job = await _job()
+    assert (job.status, job.external_event_id, job.claim_token) == ("done", "ext-1", None)
+    assert provider.created == ["ext-1"]
@@ -0,0 +1,140 @@
+"""
+資料庫相容性：migration、upsert 與 UTCDateTime
+
+預設在 SQLite 上執行；設定 TEST_DATABASE_URL=postgresql+asyncpg://... 時在 PostgreSQL 上執行
+（timestamptz 與 ON CONFLICT 的路徑），標記 postgresql 的測試只在 PostgreSQL 上執行。
+"""
+from datetime import datetime, timedelta, timezone
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import select, text
+from app.core.database import _engine_options, engine, upsert
+from app.core.migrations import alembic_config, current_revision, head_revision, target_metadata
+from app.models.app_state import AppState
+from app.models.event import Event, EventVoteTally
+from factories import make_user
+
+postgresql_only = pytest.mark.skipif(engine.dialect.name != "postgresql", reason="requires TEST_DATABASE_URL=postgresql+asyncpg://...")
+
+
+async def _migrate(action, revision: str) -> None:
+    def run(sync_conn) -> None:
+        config = alembic_config()
+        config.attributes["connection"] = sync_conn
+        config.attributes["configure_logger"] = False
+        action(config, revision)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(run)
+
+
+async def test_migrations_step_down_and_up(db):
+    await db.close()
+    revisions = [s.revision for s in ScriptDirectory.from_config(alembic_config()).walk_revisions("base", "heads")]
+
+    # 逐版降級到 base，再逐版升級回最新版本
+    for revision in revisions[1:] + ["base"]:
+        await _migrate(command.downgrade, revision)
+        assert await current_revision() == (None if revision == "base" else revision)
+    for revision in reversed(revisions):
+        await _migrate(command.upgrade, revision)
+        assert await current_revision() == revision
+    assert await current_revision() == head_revision()
+
+
+async def test_models_match_migrations():
+    async with engine.connect() as conn:
+        diff = await conn.run_sync(
+            lambda sync_conn: compare_metadata(MigrationContext.configure(sync_conn), target_metadata)
+        )
+    assert diff == []
+
+
+async def test_upsert_inserts_updates_and_ignores(db):
+    now = datetime.utcnow().replace(microsecond=0)
+    values = {"key": "k", "value": "1", "updated_at": now}
+
+    await db.execute(upsert(db, AppState.__table__, values, ["key"], ["value", "updated_at"]))
+    await db.execute(upsert(db, AppState.__table__, {**values, "value": "2", "updated_at": now + timedelta(seconds=1)}, ["key"], ["value", "updated_at"]))
+    # update_columns 為空：衝突時略過
+    await db.execute(upsert(db, AppState.__table__, {**values, "value": "3"}, ["key"]))
+    await db.commit()
+
+    row = (await db.execute(select(AppState.value, AppState.updated_at).where(AppState.key == "k"))).one()
+    assert row.value == "2"
+    assert row.updated_at == now + timedelta(seconds=1)
+
+
+async def test_upsert_update_values_expression(db):
+    user = await make_user(db)
+    db.add(Event(id="e1", created_by=user.id, title="t", public=0))
+    await db.commit()
+
+    for _ in range(3):
+        await db.execute(upsert(
+            db,
+            EventVoteTally.__table__,
+            {"event_id": "e1", "yes": 1, "no": 0, "maybe": 0},
+            ["event_id"],
+            update_values={"yes": EventVoteTally.__table__.c.yes + 1}
+        ))
+    await db.commit()
+    assert (await db.execute(select(EventVoteTally.yes))).scalar_one() == 3
+
+
+async def test_utc_datetime_round_trip(db):
+    value = datetime(2026, 3, 8, 1, 30, 15, 123456)
+    db.add(AppState(key="t", value="x", updated_at=value))
+    await db.commit()
+    db.expunge_all()
+
+    loaded = (await db.execute(select(AppState.updated_at).where(AppState.key == "t"))).scalar_one()
+    assert loaded == value
+    assert loaded.tzinfo is None
+    # 以時間比較的條件也要能找到（keyset 分頁、到期查詢）
+    found = await db.execute(select(AppState.key).where(AppState.updated_at > value - timedelta(seconds=1)))
+    assert found.scalar_one() == "t"
+
+
+def test_asyncpg_engine_options():
+    options = _engine_options("postgresql+asyncpg://user@localhost/jiu_pluck")
+    assert options["connect_args"]["server_settings"]["timezone"] == "UTC"
+    assert "prepared_statement_cache_size" in options["connect_args"]
+    assert "pool_recycle" in options
+    assert "connect_args" not in _engine_options("sqlite+aiosqlite:///./app.db")
+
+
+@postgresql_only
+async def test_postgresql_stores_timestamptz_in_utc(db):
+    value = datetime(2026, 1, 1, 23, 0, 0)
+    db.add(AppState(key="tz", value="x", updated_at=value))
+    await db.commit()
+
+    column_type = await db.execute(text(
+        "SELECT data_type FROM information_schema.columns WHERE table_name = 'app_state' AND column_name = 'updated_at'"
+    ))
+    assert column_type.scalar_one() == "timestamp with time zone"
+    # 在其他時區的 session 看到的仍是同一個時間點
+    await db.execute(text("SET LOCAL TIME ZONE 'Asia/Taipei'"))
+    local = await db.execute(text("SELECT to_char(updated_at, 'YYYY-MM-DD HH24:MI') FROM app_state WHERE key = 'tz'"))
+    assert local.scalar_one() == "2026-01-02 07:00"
+    await db.rollback()
+
+
+@postgresql_only
+async def test_postgresql_connection_settings(db):
+    assert (await db.execute(text("SHOW timezone"))).scalar_one() == "UTC"
+    assert (await db.execute(text("SELECT current_setting('application_name')"))).scalar_one() == "jiu-pluck"
+
+
+async def test_utc_datetime_converts_aware_values(db):
+    # 有時區的值存成同一個時間點的 UTC（SQLite 也一樣）
+    db.add(AppState(key="aware", value="x", updated_at=datetime(2026, 3, 8, 9, 30, tzinfo=timezone(timedelta(hours=8)))))
+    await db.commit()
+    db.expunge_all()
+
+    loaded = (await db.execute(select(AppState.updated_at).where(AppState.key == "aware"))).scalar_one()
+    assert loaded == datetime(2026, 3, 8, 1, 30)
@@ -0,0 +1,46 @@
+import httpx
+import pytest
+from app.services import discord_service
+from app.services.discord_service import WebhookRateLimited, post_webhook
+
+
+@pytest.fixture
+def webhook_server(monkeypatch):
+    """以 httpx.MockTransport 取代 Discord；responses 依序回傳，送出的請求記錄在 requests"""
+    server = {"responses": [], "requests": []}
+
+    def handler(request):
+        server["requests"].append(request)
+        return server["responses"].pop(0) if server["responses"] else httpx.Response(204)
+
+    monkeypatch.setattr(discord_service, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(discord_service, "_blocked_until", {})
+    monkeypatch.setattr(discord_service, "_last_blocked_prune", 0.0)
+    return server
+
+
+async def test_short_rate_limit_is_waited_out(webhook_server):
+    webhook_server["responses"] = [httpx.Response(429, headers={"Retry-After": "0.01"}), httpx.Response(204)]
+    await post_webhook("https://discord.test/a", {"content": "hi"})
+    assert len(webhook_server["requests"]) == 2
+    assert discord_service._blocked_until == {}
+
+
+async def test_long_rate_limit_is_left_to_the_outbox(webhook_server):
+    webhook_server["responses"] = [httpx.Response(429, json={"retry_after": 30})]
+    with pytest.raises(WebhookRateLimited) as e:
+        await post_webhook("https://discord.test/a", {"content": "hi"})
+    assert e.value.retry_after == 30
+
+    # 還在限流期間：不送出請求
+    with pytest.raises(WebhookRateLimited):
+        await post_webhook("https://discord.test/a", {"content": "hi"})
+    assert len(webhook_server["requests"]) == 1
+
+
+async def test_expired_rate_limits_are_pruned(webhook_server):
+    now = discord_service.time.monotonic()
+    discord_service._blocked_until.update({"https://discord.test/old": now - 1, "https://discord.test/busy": now + 600})
+
+    await post_webhook("https://discord.test/a", {"content": "hi"})
+    assert discord_service._blocked_until == {"https://discord.test/busy": now + 600}
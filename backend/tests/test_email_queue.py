@@ -0,0 +1,147 @@
+"""驗證碼 email 佇列：過期不寄、部分失敗只重試失敗的信、退避與 dead、狀態查詢、註冊與工作同時提交"""
+import json
+from datetime import datetime, timedelta
+import aiosmtplib
+import pytest
+from sqlalchemy import select, update
+from app.core.database import AsyncSessionLocal
+from app.models.email_job import EmailJob
+from app.models.user import User
+from app.services import auth_service, email_queue
+from app.services.email_queue import EmailDispatcher, enqueue_email
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    """取代 send_emails：記錄每組寄出的收件人；down 的收件人讓整組連線失敗，rejected 的收件人被拒"""
+    server = {"batches": [], "down": set(), "rejected": set()}
+
+    async def send_emails(messages):
+        recipients = [m["To"] for m in messages]
+        server["batches"].append(recipients)
+        if server["down"] & set(recipients):
+            raise ConnectionError("SMTP server unavailable")
+        return [
+            aiosmtplib.SMTPRecipientsRefused([]) if recipient in server["rejected"] else None
+            for recipient in recipients
+        ]
+
+    monkeypatch.setattr(email_queue, "send_emails", send_emails)
+    return server
+
+
+def _dispatcher(concurrency=1):
+    return EmailDispatcher(batch_size=10, concurrency=concurrency, max_attempts=2, poll_interval=1)
+
+
+async def _enqueue(db, *recipients, expires_at=None):
+    ids = [enqueue_email(db, "verification", recipient, {"code": "ABC123"}, expires_at) for recipient in recipients]
+    await db.commit()
+    return ids
+
+
+async def _jobs():
+    async with AsyncSessionLocal() as session:
+        jobs = (await session.execute(select(EmailJob))).scalars().all()
+    return {job.recipient: job for job in jobs}
+
+
+async def _due_now():
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(EmailJob).values(next_attempt_at=datetime.utcnow()))
+        await session.commit()
+
+
+async def test_expired_job_is_dead(db, smtp):
+    await _enqueue(db, "late@example.com", expires_at=datetime.utcnow() - timedelta(seconds=1))
+    assert await _dispatcher().run_once() == 1
+
+    job = (await _jobs())["late@example.com"]
+    assert (job.status, job.attempts, job.claim_token) == ("dead", 0, None)
+    assert job.last_error == "Expired before it could be sent"
+    # 過期的驗證碼不寄出
+    assert smtp["batches"] == []
+
+
+async def test_partial_batch_failure(db, smtp):
+    smtp["rejected"] = {"rejected@example.com"}
+    await _enqueue(db, "a@example.com", "rejected@example.com", "b@example.com")
+    assert await _dispatcher().run_once() == 3
+
+    # 同一條連線寄出整批，只有被拒的那封失敗
+    assert len(smtp["batches"]) == 1
+    jobs = await _jobs()
+    assert {r: (j.status, j.attempts) for r, j in jobs.items()} == {
+        "a@example.com": ("sent", 1),
+        "rejected@example.com": ("failed", 1),
+        "b@example.com": ("sent", 1),
+    }
+    assert jobs["a@example.com"].sent_at is not None
+
+
+async def test_failed_chunk_does_not_affect_other_chunks(db, smtp):
+    smtp["down"] = {"down@example.com"}
+    await _enqueue(db, "down@example.com", "ok@example.com")
+    assert await _dispatcher(concurrency=2).run_once() == 2
+
+    assert sorted(smtp["batches"]) == [["down@example.com"], ["ok@example.com"]]
+    jobs = await _jobs()
+    assert (jobs["ok@example.com"].status, jobs["down@example.com"].status) == ("sent", "failed")
+    assert jobs["down@example.com"].last_error == "SMTP server unavailable"
+
+
+async def test_backoff_then_dead(db, smtp):
+    smtp["down"] = {"down@example.com"}
+    await _enqueue(db, "down@example.com")
+    dispatcher = _dispatcher()
+
+    assert await dispatcher.run_once() == 1
+    job = (await _jobs())["down@example.com"]
+    assert (job.status, job.attempts) == ("failed", 1)
+    assert 0 < (job.next_attempt_at - datetime.utcnow()).total_seconds() <= 2
+    # 退避期間不再寄送
+    assert await dispatcher.run_once() == 0
+
+    await _due_now()
+    assert await dispatcher.run_once() == 1
+    job = (await _jobs())["down@example.com"]
+    assert (job.status, job.attempts) == ("dead", 2)
+    await _due_now()
+    assert await dispatcher.run_once() == 0
+    assert len(smtp["batches"]) == 2
+
+
+async def test_job_status_hides_recipient_and_code(db, client, smtp):
+    [job_id] = await _enqueue(db, "secret@example.com")
+    await _dispatcher().run_once()
+
+    response = await client.get(f"/api/auth/email-jobs/{job_id}")
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"job_id", "kind", "status", "attempts", "created_at", "sent_at"}
+    assert (body["job_id"], body["kind"], body["status"], body["attempts"]) == (job_id, "verification", "sent", 1)
+    assert "secret@example.com" not in response.text and "ABC123" not in response.text
+
+    assert (await client.get("/api/auth/email-jobs/missing")).status_code == 404
+
+
+async def test_signup_commits_user_and_job_together(db, client, monkeypatch):
+    body = {"email": "new@example.com", "name": "new"}
+    response = await client.post("/api/auth/signup", json=body)
+    assert response.status_code == 200
+    jobs = await _jobs()
+    assert jobs["new@example.com"].id == response.json()["job_id"]
+    assert json.loads(jobs["new@example.com"].payload_json)["code"]
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(User.email).where(User.email == "new@example.com"))).scalar_one()
+
+    # 寫入佇列失敗時使用者也不會建立，之後可以重新註冊
+    def fail(*args, **kwargs):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(auth_service, "enqueue_email", fail)
+    with pytest.raises(RuntimeError):
+        await client.post("/api/auth/signup", json={"email": "other@example.com", "name": "other"})
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(User).where(User.email == "other@example.com"))).scalar_one_or_none() is None
+    assert set(await _jobs()) == {"new@example.com"}
@@ -0,0 +1,73 @@
+"""SMTP 連線池：批次寄信中途斷線、重新連線失敗時不重送已寄出的信"""
+import aiosmtplib
+from app.services.email_service import SMTPPool, build_notification_email
+
+
+class FakeSMTP:
+    """sent 記錄寄出的收件人；disconnect_on 的收件人會讓連線中斷"""
+
+    def __init__(self, sent, disconnect_on=()):
+        self.sent = sent
+        self.disconnect_on = set(disconnect_on)
+        self.is_connected = True
+
+    async def send_message(self, message):
+        if message["To"] in self.disconnect_on:
+            self.is_connected = False
+            raise aiosmtplib.SMTPServerDisconnected("Connection lost")
+        if message["To"] == "rejected@example.com":
+            raise aiosmtplib.SMTPRecipientsRefused([])
+        self.sent.append(message["To"])
+
+    async def quit(self):
+        self.is_connected = False
+
+    def close(self):
+        self.is_connected = False
+
+
+class FakePool(SMTPPool):
+    """依序使用 connections 中的連線；元素為例外時代表連線或登入失敗"""
+
+    def __init__(self, connections):
+        super().__init__(size=1, idle_timeout=60)
+        self.connections = list(connections)
+        self.connects = 0
+
+    async def _connect(self):
+        self.connects += 1
+        connection = self.connections.pop(0)
+        if isinstance(connection, Exception):
+            raise connection
+        return connection
+
+
+def _messages(*recipients):
+    return [build_notification_email(recipient, "s", "b") for recipient in recipients]
+
+
+async def test_reconnect_resumes_after_disconnect():
+    sent = []
+    pool = FakePool([FakeSMTP(sent, disconnect_on=["b@example.com"]), FakeSMTP(sent)])
+    results = await pool.send_batch(_messages("a@example.com", "rejected@example.com", "b@example.com", "c@example.com"))
+
+    # 單封被拒不影響其他信；斷線後從 b 繼續
+    assert results[0] is None
+    assert isinstance(results[1], aiosmtplib.SMTPRecipientsRefused)
+    assert results[2:] == [None, None]
+    assert sent == ["a@example.com", "b@example.com", "c@example.com"]
+    assert pool.connects == 2
+
+
+async def test_reconnect_failure_only_fails_unsent_messages():
+    sent = []
+    login_error = aiosmtplib.SMTPAuthenticationError(535, "Authentication failed")
+    pool = FakePool([FakeSMTP(sent, disconnect_on=["b@example.com"]), login_error])
+    results = await pool.send_batch(_messages("a@example.com", "b@example.com", "c@example.com"))
+
+    # a 已寄出，回傳成功，不會被重送；b、c 帶著登入錯誤留給佇列重試
+    assert results == [None, login_error, login_error]
+    assert sent == ["a@example.com"]
+    # 連線失敗時有歸還 semaphore，連線池仍可使用
+    pool.connections = [FakeSMTP(sent)]
+    assert await pool.send_batch(_messages("b@example.com")) == [None]
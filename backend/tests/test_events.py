@@ -0,0 +1,89 @@
+import json
+from datetime import datetime, timedelta, timezone
+from app.api.routes.events import get_public_events_endpoint
+from app.core.serialization import dumps
+from app.models.event import Event, event_attendees
+from app.schemas.event import PrivateEventCreate, ProposedTime, PublicEventCreate
+from app.services.event_service import (
+    create_private_event,
+    create_public_event,
+    event_to_dict,
+    get_public_feed_page,
+    invalidate_public_feed_cache,
+    load_time_options
+)
+from factories import make_room, make_user
+
+
+async def _admin_feed(db, admin):
+    response = await get_public_events_endpoint(
+        request=None, school=None, category=None, from_date=None, to_date=None,
+        sort="time", cursor=None, limit=50, current_user=admin, db=db
+    )
+    return json.loads(response.body)
+
+
+async def _public_event_with_attendees(db, creator, attendees):
+    start = datetime.utcnow() + timedelta(days=1)
+    event = await create_public_event(db, creator.id, PublicEventCreate(title="e", start_time=start, end_time=start + timedelta(hours=1)))
+    for user in attendees:
+        await db.execute(event_attendees.insert().values(event_id=event["id"], user_id=user.id))
+    await db.commit()
+    return event
+
+
+async def test_admin_feed_loads_attendees_in_one_query(db, query_log):
+    admin = await make_user(db, is_admin=1)
+    users = [await make_user(db) for _ in range(3)]
+    await _public_event_with_attendees(db, admin, users[:1])
+
+    query_log.clear()
+    events = await _admin_feed(db, admin)
+    baseline = len(query_log)
+    assert [a["user_id"] for a in events[0]["attendees"]] == [users[0].id]
+
+    for _ in range(9):
+        await _public_event_with_attendees(db, admin, users)
+
+    query_log.clear()
+    events = await _admin_feed(db, admin)
+    assert len(query_log) == baseline
+    assert len(events) == 10
+    assert sorted(len(e["attendees"]) for e in events) == [1] + [3] * 9
+    assert {a["name"] for e in events for a in e["attendees"]} == {u.name for u in users}
+
+
+async def test_event_times_are_returned_as_utc_with_offset(db):
+    user = await make_user(db)
+    room = await make_room(db, user)
+    taipei = timezone(timedelta(hours=8))
+    start = datetime(2026, 11, 2, 10, 0, tzinfo=taipei)
+
+    created = await create_private_event(db, room.id, user.id, PrivateEventCreate(
+        title="e", proposed_times=[ProposedTime(start=start, end=start + timedelta(hours=1))]
+    ))
+    # 資料庫內為 naive UTC，回應與 pydantic 相同以 Z 結尾，前端 new Date() 解析出同一個時間點
+    assert json.loads(dumps(created["proposed_times"])) == [
+        {"start": "2026-11-02T02:00:00Z", "end": "2026-11-02T03:00:00Z"}
+    ]
+    event = await db.get(Event, created["id"])
+    options = await load_time_options(db, [event.id])
+    body = json.loads(dumps(event_to_dict(event, proposed_times=options[event.id])))
+    assert datetime.fromisoformat(body["proposed_times"][0]["start"]) == start
+
+    public_start = datetime(2026, 11, 3, 19, 30, tzinfo=taipei)
+    public = await create_public_event(db, user.id, PublicEventCreate(
+        title="p", start_time=public_start, end_time=public_start + timedelta(hours=2)
+    ))
+    invalidate_public_feed_cache()
+    page = await get_public_feed_page(db)
+    [item] = json.loads(page["body"])
+    assert item["start_time"] == "2026-11-03T11:30:00Z"
+    assert datetime.fromisoformat(item["end_time"]) == public_start + timedelta(hours=2)
+
+    # 建立 / 更新時間同樣帶時區
+    for value in (created, body, public, item):
+        value = json.loads(dumps(value))
+        assert value["created_at"].endswith("Z")
+        assert value["updated_at"] is None or value["updated_at"].endswith("Z")
+    assert page["last_modified"].tzinfo is None
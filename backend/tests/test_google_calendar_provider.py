@@ -0,0 +1,116 @@
+"""Google Calendar provider：鏡像的增量同步與超出鏡像範圍的查詢"""
+from datetime import datetime, timedelta
+import pytest
+from app.models.calendar_integration import GoogleToken
+from app.services import google_calendar_provider
+from app.services.calendar_mirror import load_mirror_states, mirror_window
+from app.services.google_calendar_provider import GoogleCalendarProvider, SyncTokenExpired
+from factories import make_user
+
+
+def _item(event_id, start, end, **values):
+    return {
+        "id": event_id,
+        "etag": f'"{event_id}"',
+        "start": {"dateTime": start.isoformat() + "Z"},
+        "end": {"dateTime": end.isoformat() + "Z"},
+        **values
+    }
+
+
+class FakeEvents:
+    """取代 _list_changes：完整同步回傳 items，有 syncToken 時回傳 changes"""
+
+    def __init__(self):
+        self.items = []
+        self.changes = []
+        self.expired = False
+        self.calls = []
+
+    def __call__(self, credentials, sync_token, window):
+        self.calls.append((sync_token, window))
+        if sync_token is None:
+            return [i for i in self.items if i["start"]["dateTime"] < window[1].isoformat() + "Z"], "sync-1"
+        if self.expired:
+            raise SyncTokenExpired()
+        return self.changes, "sync-2"
+
+
+@pytest.fixture
+def events(monkeypatch):
+    fake = FakeEvents()
+    monkeypatch.setattr(google_calendar_provider, "_list_changes", fake)
+    return fake
+
+
+async def _connected_user(db):
+    user = await make_user(db)
+    db.add(GoogleToken(
+        user_id=user.id,
+        access_token="access",
+        refresh_token="refresh",
+        token_expiry=datetime.utcnow() + timedelta(hours=1)
+    ))
+    await db.commit()
+    return user
+
+
+def _day(days: int, hour: int = 0) -> datetime:
+    return datetime.utcnow().replace(hour=hour, minute=0, second=0, microsecond=0) + timedelta(days=days)
+
+
+async def test_busy_slots_from_incremental_mirror(db, events):
+    user = await _connected_user(db)
+    provider = GoogleCalendarProvider(db)
+    events.items = [
+        _item("a", _day(1, 9), _day(1, 10)),
+        _item("b", _day(1, 13), _day(1, 14)),
+        _item("free", _day(1, 15), _day(1, 16), transparency="transparent"),
+    ]
+
+    slots = await provider.get_busy_slots(user, _day(1), _day(2))
+    assert [(s.start, s.end) for s in slots] == [(_day(1, 9), _day(1, 10)), (_day(1, 13), _day(1, 14))]
+    assert events.calls[0] == (None, mirror_window())
+
+    # 之後只列出變動：a 改期、b 取消
+    events.changes = [_item("a", _day(1, 11), _day(1, 12)), {"id": "b", "status": "cancelled"}]
+    slots = await provider.get_busy_slots(user, _day(1), _day(2))
+    assert [(s.start, s.end) for s in slots] == [(_day(1, 11), _day(1, 12))]
+    assert events.calls[1][0] == "sync-1"
+    assert (await load_mirror_states(db, user.id, "google"))["primary"].sync_token == "sync-2"
+
+
+async def test_expired_sync_token_rebuilds_mirror(db, events):
+    user = await _connected_user(db)
+    provider = GoogleCalendarProvider(db)
+    events.items = [_item("a", _day(1, 9), _day(1, 10))]
+    await provider.get_busy_slots(user, _day(1), _day(2))
+
+    events.expired = True
+    events.items = [_item("c", _day(1, 17), _day(1, 18))]
+    slots = await provider.get_busy_slots(user, _day(1), _day(2))
+    # 完整同步取代原本的鏡像（a 已不在行事曆上）
+    assert [(s.start, s.end) for s in slots] == [(_day(1, 17), _day(1, 18))]
+    assert [call[0] for call in events.calls] == [None, "sync-1", None]
+
+
+async def test_range_outside_mirror_lists_events_directly(db, events):
+    user = await _connected_user(db)
+    provider = GoogleCalendarProvider(db)
+    start, end = mirror_window()
+    later = end + timedelta(days=30)
+    events.items = [
+        _item("inside", _day(1, 9), _day(1, 10)),
+        _item("later", later - timedelta(hours=1), later + timedelta(hours=2)),
+    ]
+
+    slots = await provider.get_busy_slots(user, later, later + timedelta(days=1))
+    # 裁切到查詢範圍
+    assert [(s.start, s.end) for s in slots] == [(later, later + timedelta(hours=2))]
+    assert events.calls[-1] == (None, (later, later + timedelta(days=1)))
+
+    # 直接查詢不改變鏡像
+    state = (await load_mirror_states(db, user.id, "google"))["primary"]
+    assert (state.sync_token, state.window_start, state.window_end) == ("sync-1", start, end)
+    slots = await provider.get_busy_slots(user, _day(1), _day(2))
+    assert [(s.start, s.end) for s in slots] == [(_day(1, 9), _day(1, 10))]
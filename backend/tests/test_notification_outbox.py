@@ -0,0 +1,165 @@
+"""Discord 通知 outbox：認領與 lease 逾時、退避與 dead、與活動 / 投票同一個交易寫入、管理員統計"""
+import json
+import uuid
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from sqlalchemy import select, update
+from app.api.routes import admin, rooms
+from app.core.database import AsyncSessionLocal
+from app.models.notification import NotificationOutbox
+from app.models.room import RoomWebhook
+from app.services import discord_service
+from app.services.notification_outbox import NotificationDispatcher, enqueue_room_notification
+from factories import auth_headers, make_room, make_user
+from test_discord import webhook_server  # noqa: F401
+
+WEBHOOK = "https://discord.test/api/webhooks/1/token"
+
+
+def _dispatcher():
+    return NotificationDispatcher(batch_size=10, concurrency=2, max_attempts=2, poll_interval=1)
+
+
+async def _rows():
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(NotificationOutbox).order_by(NotificationOutbox.id))).scalars().all()
+
+
+async def _move(**values):
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(NotificationOutbox).values(**values))
+        await session.commit()
+
+
+async def _room_with_webhook(db):
+    owner = await make_user(db)
+    room = await make_room(db, owner)
+    db.add(RoomWebhook(id=str(uuid.uuid4()), room_id=room.id, url=WEBHOOK))
+    await db.flush()
+    return owner, room
+
+
+async def test_claim_lease_and_reclaim(db, webhook_server):  # noqa: F811
+    _, room = await _room_with_webhook(db)
+    assert await enqueue_room_notification(db, room.id, {"content": "hi"}) == 1
+    await db.commit()
+
+    first, second = _dispatcher(), _dispatcher()
+    async with AsyncSessionLocal() as session:
+        claimed = await first._claim(session)
+    assert [(r.status, r.claim_token is not None) for r in claimed] == [("sending", True)]
+    # lease 期間其他 dispatcher 取不到
+    async with AsyncSessionLocal() as session:
+        assert await second._claim(session) == []
+    assert await second.run_once() == 0
+
+    # 第一個 dispatcher 沒有完成（例如 process 被終止），lease 逾時後由其他 dispatcher 重新取得
+    await _move(locked_until=datetime.utcnow() - timedelta(seconds=1))
+    assert await second.run_once() == 1
+    [row] = await _rows()
+    assert (row.status, row.attempts, row.claim_token, row.locked_until) == ("sent", 1, None, None)
+    assert json.loads(webhook_server["requests"][0].content) == {"content": "hi"}
+    assert second.delivered == 1
+
+
+async def test_backoff_and_dead_letter(db, webhook_server):  # noqa: F811
+    _, room = await _room_with_webhook(db)
+    await enqueue_room_notification(db, room.id, {"content": "hi"})
+    await db.commit()
+    dispatcher = _dispatcher()
+
+    webhook_server["responses"] = [httpx.Response(500)]
+    assert await dispatcher.run_once() == 1
+    [row] = await _rows()
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert "500" in row.last_error
+    # 退避期間不會再送
+    assert 0 < (row.next_attempt_at - datetime.utcnow()).total_seconds() <= 2
+    assert await dispatcher.run_once() == 0
+
+    # 被限流不算失敗次數，依 Retry-After 延後
+    await _move(next_attempt_at=datetime.utcnow())
+    webhook_server["responses"] = [httpx.Response(429, json={"retry_after": 30})]
+    assert await dispatcher.run_once() == 1
+    [row] = await _rows()
+    assert (row.status, row.attempts) == ("pending", 1)
+    assert (row.next_attempt_at - datetime.utcnow()).total_seconds() > 25
+
+    # 限流結束後再次失敗：超過 max_attempts 標記為 dead，之後不再送出
+    discord_service._blocked_until.clear()
+    await _move(next_attempt_at=datetime.utcnow())
+    webhook_server["responses"] = [httpx.Response(502)]
+    assert await dispatcher.run_once() == 1
+    [row] = await _rows()
+    assert (row.status, row.attempts) == ("dead", 2)
+    assert dispatcher.failed_attempts == 2
+    await _move(next_attempt_at=datetime.utcnow() - timedelta(hours=1))
+    assert await dispatcher.run_once() == 0
+    assert len(webhook_server["requests"]) == 3
+
+
+async def test_outbox_is_written_with_the_event_and_vote(db, client, monkeypatch):
+    owner, room = await _room_with_webhook(db)
+    await db.commit()
+    headers = auth_headers(owner)
+    start = datetime.utcnow() + timedelta(days=1)
+    body = {"title": "聚餐", "proposed_times": [{"start": start.isoformat() + "Z", "end": (start + timedelta(hours=1)).isoformat() + "Z"}]}
+
+    response = await client.post(f"/api/rooms/{room.id}/events", headers=headers, json=body)
+    assert response.status_code == 200
+    event_id = response.json()["id"]
+    rows = await _rows()
+    assert [(r.room_id, r.webhook_url, r.status) for r in rows] == [(room.id, WEBHOOK, "pending")]
+    assert json.loads(rows[0].payload_json)["embeds"][0]["title"] == "新活動：聚餐"
+
+    response = await client.post(f"/api/rooms/{room.id}/events/{event_id}/vote", headers=headers, json={"vote": "yes"})
+    assert response.status_code == 200
+    assert len(await _rows()) == 2
+
+    # 投票失敗：通知沒有單獨提交
+    with pytest.raises(ValueError):
+        await client.post(f"/api/rooms/{room.id}/events/{event_id}/vote", headers=headers, json={"vote": "never"})
+    assert len(await _rows()) == 2
+
+    # 建立活動失敗：同樣沒有留下通知
+    async def fail(db, *args):
+        await db.flush()
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(rooms, "create_private_event", fail)
+    with pytest.raises(RuntimeError):
+        await client.post(f"/api/rooms/{room.id}/events", headers=headers, json=body)
+    assert len(await _rows()) == 2
+
+
+async def test_admin_stats(db, client, webhook_server, monkeypatch):  # noqa: F811
+    admin_user = await make_user(db, is_admin=1)
+    _, room = await _room_with_webhook(db)
+    now = datetime.utcnow()
+    for status, age in [("pending", 30), ("pending", 10), ("sending", 20), ("dead", 600), ("sent", 900)]:
+        db.add(NotificationOutbox(
+            room_id=room.id, webhook_url=WEBHOOK, payload_json="{}", status=status, attempts=0,
+            next_attempt_at=now + timedelta(hours=1), created_at=now - timedelta(seconds=age),
+            locked_until=now + timedelta(minutes=1) if status == "sending" else None
+        ))
+    await db.commit()
+    dispatcher = _dispatcher()
+    monkeypatch.setattr(admin, "notification_dispatcher", dispatcher)
+
+    stats = (await client.get("/api/admin/notifications/stats", headers=auth_headers(admin_user))).json()
+    assert (stats["queue_depth"], stats["pending"], stats["sending"], stats["dead"]) == (3, 2, 1, 1)
+    # dead 的通知不算在等待時間內
+    assert 30 <= stats["oldest_pending_age_seconds"] < 60
+    assert (stats["delivered"], stats["latency_p50_seconds"]) == (0, None)
+
+    await enqueue_room_notification(db, room.id, {"content": "hi"})
+    await db.commit()
+    assert await dispatcher.run_once() == 1
+    stats = (await client.get("/api/admin/notifications/stats", headers=auth_headers(admin_user))).json()
+    assert (stats["delivered"], stats["pending"]) == (1, 2)
+    assert stats["latency_p50_seconds"] is not None
+
+    member = await make_user(db)
+    await db.commit()
+    assert (await client.get("/api/admin/notifications/stats", headers=auth_headers(member))).status_code == 403
@@ -0,0 +1,89 @@
+"""Keyset 分頁：游標往返、SQLite 上混合格式的時間、管理員使用者列表"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import String, select, type_coerce
+from app.core.pagination import decode_cursor, encode_cursor, fetch_page
+from app.models.user import User
+from factories import auth_headers, make_user
+
+KEYS = [User.created_at, User.id]
+
+
+def test_cursor_round_trip():
+    values = [datetime(2026, 3, 2, 10, 0, 0, 123456), "2026-03-02 10:00:00", 3]
+    assert decode_cursor(encode_cursor("users", values), "users", 3) == values
+
+    for cursor, tag, count in [("not-base64!", "users", 3), (encode_cursor("events", values), "users", 3),
+                               (encode_cursor("users", values), "users", 2)]:
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_cursor(cursor, tag, count)
+
+
+async def _stored(db) -> list:
+    """資料庫裡的原始時間字串與 id，依列表順序（新到舊）"""
+    result = await db.execute(
+        select(type_coerce(User.created_at, String), User.id).order_by(User.created_at.desc(), User.id.desc())
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def _all_pages(db, limit: int, total: int) -> list:
+    ids, cursor = [], None
+    # 游標沒有往前推進時會一直拿到同一頁，超過應有的頁數就停下
+    for _ in range(total // limit + 1):
+        users, cursor = await fetch_page(db, select(User.id), KEYS, cursor, limit, descending=True, tag="users")
+        ids.extend(users)
+        if cursor is None:
+            return ids
+    raise AssertionError(f"paging did not finish: {ids}")
+
+
+async def test_mixed_timestamp_formats_page_without_gaps(db):
+    # server_default 寫入的是 "YYYY-MM-DD HH:MM:SS"，沒有微秒
+    for _ in range(3):
+        await make_user(db)
+    await db.commit()
+    base = datetime.fromisoformat(min(raw for raw, _ in await _stored(db)))
+
+    # Python 寫入的時間帶微秒（"... .000000"），落在同一秒前後
+    for created_at in [base, base + timedelta(microseconds=500000), base - timedelta(microseconds=1),
+                       base + timedelta(seconds=1), base - timedelta(seconds=1)]:
+        await make_user(db, created_at=created_at)
+    await db.commit()
+
+    stored = await _stored(db)
+    assert {len(raw) for raw, _ in stored} == {19, 26}
+    # 字串順序與時間順序一致
+    times = [datetime.fromisoformat(raw) for raw, _ in stored]
+    assert times == sorted(times, reverse=True)
+
+    expected = [user_id for _, user_id in stored]
+    for limit in range(1, len(expected) + 1):
+        assert await _all_pages(db, limit, len(expected)) == expected, limit
+
+
+async def test_admin_user_list_counts_total_on_first_page_only(db, client):
+    admin = await make_user(db, is_admin=1)
+    for _ in range(4):
+        await make_user(db)
+    await db.commit()
+
+    ids, totals, cursor = [], [], None
+    for _ in range(3):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/admin/users", params=params, headers=auth_headers(admin))
+        assert response.status_code == 200
+        body = response.json()
+        ids.extend(user["id"] for user in body["users"])
+        totals.append(body["total"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    else:
+        raise AssertionError(f"paging did not finish: {ids}")
+
+    assert totals == [5, None, None]
+    assert ids == [user_id for _, user_id in await _stored(db)]
+
+    response = await client.get("/api/admin/users", params={"cursor": "bad"}, headers=auth_headers(admin))
+    assert response.status_code == 400
@@ -0,0 +1,57 @@
+"""使用者快取：修改或刪除使用者後，TTL 內不會再用舊的資料驗證請求"""
+from datetime import datetime, timedelta
+import pytest
+from app.core.security import principal_cache
+from app.models.user import EmailVerificationCode
+from factories import auth_headers, make_user
+
+
+@pytest.fixture(autouse=True)
+def clear_principals():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+async def _me(client, user):
+    return await client.get("/api/users/me", headers=auth_headers(user))
+
+
+async def test_admin_update_user_invalidates_principal(db, client):
+    admin = await make_user(db, is_admin=1)
+    user = await make_user(db)
+    await db.commit()
+    assert (await _me(client, user)).json()["is_admin"] is False
+    assert principal_cache.get(user.id) is not None
+
+    response = await client.put(
+        f"/api/admin/users/{user.id}", json={"name": "renamed", "is_admin": True}, headers=auth_headers(admin)
+    )
+    assert response.status_code == 200
+    me = (await _me(client, user)).json()
+    assert (me["name"], me["is_admin"]) == ("renamed", True)
+
+    await client.put(f"/api/admin/users/{user.id}", json={"name": "renamed", "is_active": False}, headers=auth_headers(admin))
+    assert (await _me(client, user)).status_code == 403
+
+
+async def test_admin_delete_user_invalidates_principal(db, client):
+    admin = await make_user(db, is_admin=1)
+    user = await make_user(db)
+    await db.commit()
+    assert (await _me(client, user)).status_code == 200
+
+    response = await client.delete(f"/api/admin/users/{user.id}", headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert (await _me(client, user)).status_code == 401
+
+
+async def test_verify_email_invalidates_principal(db, client):
+    user = await make_user(db, email_verified=0)
+    db.add(EmailVerificationCode(email=user.email, code="ABC123", expires_at=datetime.utcnow() + timedelta(minutes=10)))
+    await db.commit()
+    assert (await _me(client, user)).json()["email_verified"] is False
+
+    response = await client.post("/api/auth/verify-email", json={"email": user.email, "code": "ABC123"})
+    assert response.status_code == 200
+    assert (await _me(client, user)).json()["email_verified"] is True
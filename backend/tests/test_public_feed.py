@@ -0,0 +1,111 @@
+"""公開活動列表：條件式請求（ETag / Last-Modified）、快取命中，以及新增 / 刪除活動後更新"""
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+import pytest
+from sqlalchemy import update
+from app.core.database import AsyncSessionLocal
+from app.core.http_cache import http_date
+from app.models.app_state import AppState
+from app.models.event import Event
+from app.services.event_service import invalidate_public_feed_cache
+from factories import auth_headers, make_user
+
+
+@pytest.fixture(autouse=True)
+def feed_cache():
+    invalidate_public_feed_cache()
+    yield
+    invalidate_public_feed_cache()
+
+
+async def _create(client, user, title="e"):
+    start = datetime.utcnow() + timedelta(days=1)
+    response = await client.post("/api/events/public", headers=auth_headers(user), json={
+        "title": title,
+        "start_time": start.isoformat() + "Z",
+        "end_time": (start + timedelta(hours=1)).isoformat() + "Z"
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+async def _feed(client, user, **headers):
+    return await client.get("/api/events/public", headers={**auth_headers(user), **headers})
+
+
+async def _backdate(hours):
+    """把活動與列表異動時間往前移，之後的異動才會讓 Last-Modified 明顯前進"""
+    earlier = datetime.utcnow() - timedelta(hours=hours)
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Event).values(created_at=earlier, updated_at=earlier))
+        await session.execute(update(AppState).where(AppState.key == "public_events").values(updated_at=earlier))
+        await session.commit()
+    invalidate_public_feed_cache()
+
+
+async def test_conditional_get(db, client):
+    user = await make_user(db)
+    await db.commit()
+    await _create(client, user)
+    await _backdate(1)
+
+    response = await _feed(client, user)
+    assert response.status_code == 200
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = await _feed(client, user, **{"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    # 有 If-None-Match 時不看 If-Modified-Since
+    response = await _feed(client, user, **{"If-None-Match": '"other"', "If-Modified-Since": last_modified})
+    assert response.status_code == 200
+
+    assert (await _feed(client, user, **{"If-Modified-Since": last_modified})).status_code == 304
+    earlier = http_date(parsedate_to_datetime(last_modified).replace(tzinfo=None) - timedelta(seconds=1))
+    assert (await _feed(client, user, **{"If-Modified-Since": earlier})).status_code == 200
+    assert (await _feed(client, user, **{"If-Modified-Since": "not a date"})).status_code == 200
+
+
+async def test_cache_hit_skips_database(db, client, query_log):
+    user = await make_user(db)
+    await db.commit()
+    await _create(client, user)
+
+    first = await _feed(client, user)
+    query_log.clear()
+    second = await _feed(client, user)
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert not [s for s in query_log if "events" in s or "app_state" in s]
+
+
+async def test_create_and_delete_refresh_the_feed(db, client):
+    user = await make_user(db)
+    await db.commit()
+    first_id = await _create(client, user, "first")
+    await _backdate(1)
+
+    before = await _feed(client, user)
+    assert [e["id"] for e in before.json()] == [first_id]
+
+    # 新增活動後清除快取：不需要等到 TTL 結束
+    second_id = await _create(client, user, "second")
+    created = await _feed(client, user)
+    assert {e["id"] for e in created.json()} == {first_id, second_id}
+    assert created.headers["ETag"] != before.headers["ETag"]
+
+    await _backdate(1)
+    cached = await _feed(client, user)
+    response = await client.delete(f"/api/events/{second_id}", headers=auth_headers(user))
+    assert response.status_code == 200
+
+    after = await _feed(client, user)
+    assert [e["id"] for e in after.json()] == [first_id]
+    # 刪除不會反映在剩下活動的時間上，Last-Modified 仍然要前進，舊的 If-Modified-Since 不能得到 304
+    assert parsedate_to_datetime(after.headers["Last-Modified"]) > parsedate_to_datetime(cached.headers["Last-Modified"])
+    response = await _feed(client, user, **{"If-Modified-Since": cached.headers["Last-Modified"]})
+    assert response.status_code == 200
@@ -0,0 +1,67 @@
+from app.services.room_service import RoomListLoader
+from factories import make_room, make_user
+
+
+async def _load_all(db, user_id, limit):
+    """逐頁載入，回傳 (所有房間 id, 每一頁送出的查詢數)"""
+    ids, counts, cursor = [], [], None
+    while True:
+        loader = RoomListLoader(db)
+        rooms = await loader.load(user_id=user_id, cursor=cursor, limit=limit)
+        ids.extend(room["id"] for room in rooms)
+        counts.append(loader.query_count)
+        cursor = loader.next_cursor
+        if cursor is None:
+            return ids, counts
+
+
+async def test_room_list_query_count_is_constant(db, query_log):
+    user = await make_user(db)
+    await make_room(db, user)
+    await db.commit()
+
+    query_log.clear()
+    loader = RoomListLoader(db)
+    assert len(await loader.load(user_id=user.id)) == 1
+    baseline = len(query_log)
+    assert loader.query_count == baseline == 2
+
+    # 房間與成員變多，查詢數不變
+    members = [await make_user(db) for _ in range(10)]
+    for _ in range(20):
+        await make_room(db, user, members)
+    await db.commit()
+
+    query_log.clear()
+    loader = RoomListLoader(db)
+    rooms = await loader.load(user_id=user.id)
+    assert len(rooms) == 21
+    assert len(query_log) == baseline
+    assert all(room["owner_name"] == user.name for room in rooms)
+    assert sum(len(room["members"]) for room in rooms) == 1 + 20 * 11
+
+
+async def test_room_list_cursor_does_not_skip_or_duplicate(db):
+    user = await make_user(db)
+    other = await make_user(db)
+    # 同一批建立的房間 created_at 相同，分頁要以 id 區分
+    expected = {(await make_room(db, user)).id for _ in range(23)}
+    await make_room(db, other)
+    await db.commit()
+
+    for limit in (1, 5, 7, 23, 50):
+        ids, counts = await _load_all(db, user.id, limit)
+        assert len(ids) == len(set(ids)) == 23
+        assert set(ids) == expected
+        assert all(count <= 2 for count in counts)
+
+
+async def test_room_list_admin_sees_all_rooms(db):
+    user = await make_user(db)
+    other = await make_user(db)
+    await make_room(db, user)
+    await make_room(db, other)
+    await db.commit()
+
+    ids, _ = await _load_all(db, None, 1)
+    assert len(ids) == len(set(ids)) == 2
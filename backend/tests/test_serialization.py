@@ -0,0 +1,113 @@
+"""trusted_response 與 FastAPI 以 response_model 驗證後輸出的 JSON 相同"""
+import json
+from datetime import datetime, timedelta
+from typing import List
+import pytest
+from pydantic import TypeAdapter
+from app.api.routes import events, rooms
+from app.core import serialization
+from app.models.event import event_attendees
+from app.models.timetable import Timetable
+from app.schemas.event import EventResponse
+from app.services.availability_service import apply_occupancy
+from app.services import event_service
+from app.services.event_service import invalidate_public_feed_cache
+from factories import auth_headers, make_room, make_user
+
+
+def _expected(model, data) -> list:
+    """FastAPI 的做法：先以 response_model 驗證，再由 pydantic 輸出 JSON"""
+    adapter = TypeAdapter(model if isinstance(data, dict) else List[model])
+    return json.loads(adapter.dump_json(adapter.validate_python(data)))
+
+
+@pytest.fixture
+def responses(monkeypatch):
+    """記錄路由經由 trusted_response 輸出的 (model, data, response)"""
+    calls = []
+
+    def recording(model, data, *args, **kwargs):
+        response = serialization.trusted_response(model, data, *args, **kwargs)
+        calls.append((model, data, response))
+        return response
+
+    for module in (rooms, events):
+        monkeypatch.setattr(module, "trusted_response", recording)
+    return calls
+
+
+async def test_trusted_responses_match_pydantic(db, client, responses):
+    admin = await make_user(db, is_admin=1)
+    owner = await make_user(db, school="逢甲大學")
+    member = await make_user(db, name=None)
+    room = await make_room(db, owner, [member])
+    data = {"monday": [{"period": "1"}], "tuesday": [{"period": "3"}]}
+    timetable = Timetable(user_id=owner.id, data_json=json.dumps(data))
+    apply_occupancy(timetable, data)
+    db.add(timetable)
+    await db.commit()
+
+    start = datetime.utcnow().replace(microsecond=123456) + timedelta(days=3)
+    headers = auth_headers(owner)
+    private = (await client.post(f"/api/rooms/{room.id}/events", headers=headers, json={
+        "title": "聚餐", "description": None,
+        "proposed_times": [{"start": start.isoformat() + "Z", "end": (start + timedelta(hours=1)).isoformat() + "Z"}]
+    })).json()
+    await client.post(f"/api/rooms/{room.id}/events/{private['id']}/vote", headers=headers, json={"vote": "maybe"})
+    public = (await client.post("/api/events/public", headers=headers, json={
+        "title": "講座", "location": "資電館", "start_time": start.isoformat() + "+08:00", "end_time": (start + timedelta(hours=2)).isoformat() + "+08:00"
+    })).json()
+    await db.execute(event_attendees.insert().values(event_id=public["id"], user_id=member.id))
+    await db.commit()
+
+    paths = [
+        (owner, "/api/rooms"),
+        (owner, f"/api/rooms/{room.id}"),
+        (owner, f"/api/rooms/{room.id}/availability"),
+        (owner, f"/api/rooms/{room.id}/availability?weekday=mon&min_free=1"),
+        (owner, f"/api/rooms/{room.id}/events"),
+        (owner, f"/api/rooms/{room.id}/events/{private['id']}/time-scores"),
+        (owner, f"/api/events/{private['id']}"),
+        (owner, f"/api/events/{public['id']}"),
+        (owner, f"/api/events/{public['id']}/attendees"),
+        (admin, "/api/events/public"),
+        (admin, "/api/rooms"),
+    ]
+    for user, path in paths:
+        response = await client.get(path, headers=auth_headers(user))
+        assert response.status_code == 200, path
+
+    assert len(responses) == len(paths)
+    assert {model.__name__ for model, _, _ in responses} == {
+        "RoomResponse", "RoomAvailabilityResponse", "EventResponse", "ProposedTimeScoresResponse", "EventAttendee"
+    }
+    for model, data, response in responses:
+        assert json.loads(response.body) == _expected(model, data), model.__name__
+
+
+async def test_public_feed_body_matches_pydantic(db, client, monkeypatch):
+    user = await make_user(db)
+    await db.commit()
+    start = datetime.utcnow() + timedelta(days=1)
+    for title in ("a", "b"):
+        await client.post("/api/events/public", headers=auth_headers(user), json={
+            "title": title, "start_time": start.isoformat() + "Z", "end_time": (start + timedelta(hours=1)).isoformat() + "Z"
+        })
+
+    # 記錄公開活動列表交給 encode_many 的資料
+    encoded = []
+
+    def recording(model, items):
+        items = list(items)
+        encoded.append((model, items))
+        return serialization.encode_many(model, items)
+
+    monkeypatch.setattr(event_service, "encode_many", recording)
+    invalidate_public_feed_cache()
+    response = await client.get("/api/events/public", headers=auth_headers(user))
+    invalidate_public_feed_cache()
+
+    assert response.status_code == 200
+    [(model, items)] = encoded
+    assert len(items) == 2
+    assert json.loads(response.content) == _expected(model, items)
@@ -0,0 +1,95 @@
+"""啟動初始化：已初始化時跳過、force 重新執行、多個 worker 同時啟動只初始化一次"""
+import asyncio
+import json
+import pytest
+from sqlalchemy import func, select
+from app.core import startup
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.timetable import TimetableTemplate
+from app.models.user import User
+from app.services.timetable_service import get_templates_version
+
+
+@pytest.fixture
+def seeds(monkeypatch):
+    """記錄 seed_default_templates 的呼叫次數；稍微延長執行時間，讓同時啟動的 worker 重疊"""
+    calls = []
+    seed = startup.seed_default_templates
+
+    async def counted():
+        calls.append(True)
+        await asyncio.sleep(0.05)
+        await seed()
+
+    monkeypatch.setattr(startup, "seed_default_templates", counted)
+    monkeypatch.setattr(settings, "ADMIN_EMAIL", None)
+    return calls
+
+
+async def _count(model, *where):
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(func.count()).select_from(model).where(*where))).scalar_one()
+
+
+async def test_second_run_is_a_no_op(db, seeds, monkeypatch):
+    assert await startup.run_startup(migrate=False) is True
+    assert await startup.run_startup(migrate=False) is False
+    assert len(seeds) == 1
+    assert await _count(TimetableTemplate) == 1
+
+    # force 一定重新執行；預設模板已存在，不會再建立
+    assert await startup.run_startup(migrate=False, force=True) is True
+    assert len(seeds) == 2
+    assert await _count(TimetableTemplate) == 1
+
+    # 初始化版本包含 ADMIN_EMAIL：換了管理員帳號就重新執行
+    monkeypatch.setattr(settings, "ADMIN_EMAIL", "admin@example.com")
+    assert await startup.run_startup(migrate=False) is True
+    assert await _count(User, User.email == "admin@example.com", User.is_admin == 1) == 1
+    assert await startup.run_startup(migrate=False) is False
+
+
+async def test_duplicate_default_templates_are_removed(db):
+    periods = json.dumps(startup.DEFAULT_TEMPLATE_PERIODS)
+    templates = [
+        TimetableTemplate(school=startup.DEFAULT_TEMPLATE_SCHOOL, name=startup.DEFAULT_TEMPLATE_NAME,
+                          periods_json=periods, status="approved", created_by=created_by)
+        for created_by in (None, None, "user-1", None)
+    ]
+    db.add_all(templates)
+    await db.commit()
+    kept = [templates[0].id, templates[2].id]
+    version = await get_templates_version(db)
+
+    await startup.seed_default_templates()
+    async with AsyncSessionLocal() as session:
+        ids = (await session.execute(select(TimetableTemplate.id).order_by(TimetableTemplate.id))).scalars().all()
+        # 只保留最早的系統預設模板；使用者提交的同名模板不受影響
+        assert ids == kept
+        assert await get_templates_version(session) != version
+
+    version = await get_templates_version(db)
+    await startup.seed_default_templates()
+    assert await get_templates_version(db) == version
+
+
+async def test_concurrent_startup_runs_once(db, seeds):
+    results = await asyncio.gather(
+        startup.run_startup(migrate=False),
+        startup.run_startup(migrate=False)
+    )
+    # 第二個 worker 等到鎖之後重新檢查，發現已初始化而跳過
+    assert sorted(results) == [False, True]
+    assert len(seeds) == 1
+    assert await _count(TimetableTemplate) == 1
+
+
+async def test_startup_lock_times_out(db):
+    async with startup.startup_lock(5):
+        with pytest.raises(TimeoutError):
+            async with startup.startup_lock(0.3):
+                pass
+    # 釋放後可以再取得
+    async with startup.startup_lock(0.3):
+        pass
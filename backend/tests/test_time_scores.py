@@ -0,0 +1,153 @@
+"""活動候選時間評分：UTC 換算為課表時區的節次、跨日、課表與行事曆重複只算一次、排序"""
+import json
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import pytest
+from app.core.config import settings
+from app.models.timetable import Timetable
+from app.schemas.event import PrivateEventCreate, ProposedTime
+from app.services import availability_service
+from app.services.availability_service import _calendar_busy_members, option_period_masks, score_time_options
+from app.services.calendar_busy_store import CalendarBusyStore
+from app.services.calendar_service import BusySlot
+from app.services.event_service import create_private_event
+from app.services.timetable_service import DEFAULT_PERIODS
+from factories import auth_headers, make_room, make_user
+from test_calendar_busy_store import FakeProvider
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+
+def _monday():
+    """至少一週後的星期一 00:00（UTC），候選時間都在忙碌時段快取的範圍內"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=14 - today.weekday())
+
+
+def _utc(day: datetime, hhmm: str) -> datetime:
+    """day 當天的課表時區時間 hh:mm 轉為 naive UTC"""
+    hours, minutes = map(int, hhmm.split(":"))
+    local = datetime(day.year, day.month, day.day, hours, minutes, tzinfo=TAIPEI)
+    return local.astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setattr(settings, "TIMETABLE_TIMEZONE", "Asia/Taipei")
+    provider = FakeProvider()
+    store = CalendarBusyStore(
+        ttl_seconds=60,
+        window_days=7,
+        idle_seconds=3600,
+        concurrency=4,
+        batch_size=10,
+        poll_interval=1,
+        provider_factory=provider,
+        provider_names=["fake"]
+    )
+    monkeypatch.setattr(availability_service, "calendar_busy_store", store)
+    return provider
+
+
+def test_option_converted_to_local_periods():
+    monday = _monday()
+    # 08:30 ~ 09:30（台北）重疊第 1、2 節；換算前是 UTC 00:30 ~ 01:30
+    start, end = _utc(monday, "08:30"), _utc(monday, "09:30")
+    assert (start.hour, start.minute) == (0, 30)
+    assert option_period_masks(start, end, DEFAULT_PERIODS, TAIPEI) == [(0, 0b11)]
+    # 只看 UTC 的話是第 1 節之前，沒有任何節次
+    assert option_period_masks(start, end, DEFAULT_PERIODS, ZoneInfo("UTC")) == []
+
+
+def test_cross_midnight_option_is_split_per_day():
+    monday = _monday()
+    start, end = _utc(monday - timedelta(days=1), "16:30"), _utc(monday, "09:00")
+    # 星期日 16:30 之後只剩第 8 節的最後半小時；星期一到 09:00 為止是第 1 節
+    assert option_period_masks(start, end, DEFAULT_PERIODS, TAIPEI) == [(6, 1 << 7), (0, 0b1)]
+
+
+def test_calendar_busy_members():
+    monday = _monday()
+    options = [
+        {"start": monday + timedelta(hours=1), "end": monday + timedelta(hours=2)},
+        {"start": monday + timedelta(hours=5), "end": monday + timedelta(hours=6)},
+    ]
+    busy = {
+        # 長時段先開始、短時段在它之內：以最晚結束時間判斷重疊
+        "a": [BusySlot(monday, monday + timedelta(hours=5, minutes=30)), BusySlot(monday + timedelta(hours=3), monday + timedelta(hours=4))],
+        # 結束時間等於候選開始：不重疊
+        "b": [BusySlot(monday, monday + timedelta(hours=1))],
+    }
+    assert _calendar_busy_members(["a", "b", "c"], busy, options) == [0b001, 0b001]
+
+
+async def _member(db, monday_periods=()):
+    user = await make_user(db)
+    if monday_periods:
+        data = {"monday": [{"period": p} for p in monday_periods]}
+        timetable = Timetable(user_id=user.id, data_json=json.dumps(data))
+        availability_service.apply_occupancy(timetable, data)
+        db.add(timetable)
+    return user
+
+
+def _counts(score):
+    return score["free_count"], score["busy_count"], score["timetable_busy_count"], score["calendar_busy_count"]
+
+
+async def test_score_time_options(db, provider):
+    monday = _monday()
+    in_class = await _member(db, monday_periods=["1"])
+    calendar_only = await _member(db)
+    both = await _member(db, monday_periods=["1"])
+    await db.commit()
+    morning = (_utc(monday, "08:30"), _utc(monday, "09:00"))
+    for user in (calendar_only, both):
+        provider.slots[user.id] = [BusySlot(*morning)]
+    tuesday = monday + timedelta(days=1)
+    provider.slots[calendar_only.id].append(BusySlot(_utc(tuesday, "13:00"), _utc(tuesday, "15:00")))
+
+    options = [
+        {"start": morning[0], "end": morning[1]},
+        {"start": _utc(monday, "13:10"), "end": _utc(monday, "14:00")},
+        {"start": _utc(tuesday, "13:10"), "end": _utc(tuesday, "14:00")},
+        {"start": _utc(monday + timedelta(days=2), "13:10"), "end": _utc(monday + timedelta(days=2), "14:00")},
+        {"start": _utc(monday - timedelta(days=1), "23:30"), "end": _utc(monday, "09:00")},
+    ]
+    member_ids = [in_class.id, calendar_only.id, both.id]
+    scores = await score_time_options(db, member_ids, options, DEFAULT_PERIODS)
+
+    # 空閒人數多的在前，同分時依開始時間
+    assert [s["index"] for s in scores] == [1, 3, 2, 4, 0]
+    by_index = {s["index"]: s for s in scores}
+    # 同一人有課又在行事曆上忙碌，只算一次
+    assert _counts(by_index[0]) == (0, 3, 2, 2)
+    assert _counts(by_index[1]) == (3, 0, 0, 0)
+    assert _counts(by_index[2]) == (2, 1, 0, 1)
+    # 跨日：星期日深夜沒有課，星期一早上的第 1 節有課
+    assert _counts(by_index[4]) == (0, 3, 2, 2)
+    assert by_index[1]["start"].utcoffset() == timedelta(0)
+
+
+async def test_time_scores_route(db, client, provider):
+    monday = _monday()
+    owner = await _member(db, monday_periods=["5"])
+    member = await _member(db)
+    room = await make_room(db, owner, [member])
+    other_room = await make_room(db, member)
+    start = _utc(monday, "13:10")
+    event = await create_private_event(db, room.id, owner.id, PrivateEventCreate(title="e", proposed_times=[
+        ProposedTime(start=start, end=start + timedelta(minutes=50)),
+        ProposedTime(start=start + timedelta(days=1), end=start + timedelta(days=1, minutes=50)),
+    ]))
+
+    response = await client.get(f"/api/rooms/{room.id}/events/{event['id']}/time-scores", headers=auth_headers(member))
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["event_id"], body["member_count"]) == (event["id"], 2)
+    assert [(o["index"], o["free_count"]) for o in body["options"]] == [(1, 2), (0, 1)]
+    assert body["options"][1]["start"].endswith("Z")
+
+    # 活動不屬於這個房間
+    response = await client.get(f"/api/rooms/{other_room.id}/events/{event['id']}/time-scores", headers=auth_headers(member))
+    assert response.status_code == 404
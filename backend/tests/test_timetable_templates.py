@@ -0,0 +1,117 @@
+"""課表模板快取：ETag / 304、依學校篩選、新增或審核後更換版本、其他 worker 在 TTL 後重新載入"""
+import pytest
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.timetable import TimetableTemplate
+from app.services import timetable_service
+from app.services.timetable_service import bump_templates_version, invalidate_template_cache, submit_template
+from factories import auth_headers, make_user
+
+PERIODS = [{"name": "1", "start": "08:00", "end": "08:50"}]
+
+
+@pytest.fixture(autouse=True)
+def template_cache():
+    invalidate_template_cache()
+    yield
+    invalidate_template_cache()
+
+
+async def _templates(client, school=None, etag=None):
+    params = {"school": school} if school is not None else {}
+    headers = {"If-None-Match": etag} if etag else {}
+    return await client.get("/api/timetable/templates", params=params, headers=headers)
+
+
+async def _create(client, admin, school, name="t"):
+    response = await client.post(
+        "/api/admin/templates", headers=auth_headers(admin), json={"school": school, "name": name, "periods": PERIODS}
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+async def test_etag_and_school_filter(db, client):
+    admin = await make_user(db, is_admin=1)
+    await db.commit()
+    first = await _create(client, admin, "A 大學")
+    second = await _create(client, admin, "B 大學")
+
+    response = await _templates(client)
+    assert [t["id"] for t in response.json()] == [first, second]
+    assert response.json()[0]["periods"] == PERIODS
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"templates-') and etag.endswith('-all"')
+
+    response = await _templates(client, etag=etag)
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    response = await _templates(client, school="A 大學")
+    assert [t["id"] for t in response.json()] == [first]
+    school_etag = response.headers["ETag"]
+    # 每個學校的 ETag 不同，不能用全部模板的 ETag 得到 304
+    assert school_etag != etag
+    assert (await _templates(client, school="A 大學", etag=etag)).status_code == 200
+    assert (await _templates(client, school="A 大學", etag=school_etag)).status_code == 304
+    assert (await _templates(client, school="C 大學")).json() == []
+
+
+async def test_create_and_review_change_version(db, client):
+    admin = await make_user(db, is_admin=1)
+    user = await make_user(db)
+    await db.commit()
+    await _create(client, admin, "A 大學")
+    etag = (await _templates(client)).headers["ETag"]
+
+    pending = await submit_template(db, user.id, "A 大學", "pending", PERIODS)
+    # 待審核的模板不影響版本
+    assert (await _templates(client, etag=etag)).status_code == 304
+
+    response = await client.post(
+        f"/api/admin/templates/{pending['id']}/review", headers=auth_headers(admin), json={"status": "approved"}
+    )
+    assert response.status_code == 200
+    response = await _templates(client, etag=etag)
+    assert response.status_code == 200
+    assert pending["id"] in [t["id"] for t in response.json()]
+    approved_etag = response.headers["ETag"]
+
+    await client.post(f"/api/admin/templates/{pending['id']}/review", headers=auth_headers(admin), json={"status": "rejected"})
+    response = await _templates(client, etag=approved_etag)
+    assert response.status_code == 200
+    assert pending["id"] not in [t["id"] for t in response.json()]
+
+    await _create(client, admin, "B 大學")
+    assert (await _templates(client)).headers["ETag"] not in (etag, approved_etag, response.headers["ETag"])
+
+
+async def test_other_worker_reloads_after_ttl(db, client, query_log):
+    admin = await make_user(db, is_admin=1)
+    await db.commit()
+    first = await _create(client, admin, "A 大學")
+    before = await _templates(client)
+
+    # 另一個 worker 新增模板：只更換資料庫中的版本，不會清除這個 worker 的快取
+    async with AsyncSessionLocal() as session:
+        session.add(TimetableTemplate(school="B 大學", name="t", periods_json="[]", status="approved"))
+        await bump_templates_version(session)
+        await session.commit()
+
+    query_log.clear()
+    response = await _templates(client)
+    assert [t["id"] for t in response.json()] == [first]
+    assert response.headers["ETag"] == before.headers["ETag"]
+    assert query_log == []
+
+    # TTL 過後查詢版本，發現改變而重新載入
+    timetable_service._template_snapshot.checked_at -= settings.TIMETABLE_TEMPLATE_CACHE_TTL_SECONDS
+    response = await _templates(client)
+    assert len(response.json()) == 2
+    assert response.headers["ETag"] != before.headers["ETag"]
+
+    # 版本沒變：只查詢版本，不重新載入模板
+    timetable_service._template_snapshot.checked_at -= settings.TIMETABLE_TEMPLATE_CACHE_TTL_SECONDS
+    query_log.clear()
+    assert len((await _templates(client)).json()) == 2
+    assert len(query_log) == 1 and "app_state" in query_log[0]
@@ -0,0 +1,47 @@
+import uuid
+from app.models.event import Event, EventVote, EventVoteTally
+from app.services.event_service import check_vote_tallies, get_event_vote_stats, rebuild_vote_tallies, vote_event
+from factories import make_user
+
+
+async def _legacy_event(db, creator):
+    """統計表加入前建立的活動：沒有 event_vote_tallies 列"""
+    event = Event(id=str(uuid.uuid4()), room_id="r", created_by=creator.id, title="legacy", public=0)
+    db.add(event)
+    await db.commit()
+    return event
+
+
+async def test_legacy_event_without_votes_is_consistent(db):
+    user = await make_user(db)
+    await _legacy_event(db, user)
+    assert await check_vote_tallies(db) == []
+
+
+async def test_legacy_event_with_votes_is_reported_and_rebuilt(db):
+    user = await make_user(db)
+    event = await _legacy_event(db, user)
+    db.add(EventVote(event_id=event.id, user_id=user.id, vote="yes"))
+    await db.commit()
+
+    assert await check_vote_tallies(db) == [
+        {"event_id": event.id, "expected": {"yes": 1, "no": 0, "maybe": 0}, "actual": None}
+    ]
+    assert await rebuild_vote_tallies(db) == 1
+    assert await check_vote_tallies(db) == []
+
+
+async def test_vote_event_keeps_tally_in_sync(db):
+    users = [await make_user(db) for _ in range(3)]
+    event = await _legacy_event(db, users[0])
+    db.add(EventVote(event_id=event.id, user_id=users[0].id, vote="no"))
+    await db.commit()
+
+    # 第一次投票時依現有投票建立統計列
+    await vote_event(db, event.id, users[1].id, "yes")
+    await vote_event(db, event.id, users[2].id, "maybe")
+    await vote_event(db, event.id, users[2].id, "yes")
+
+    assert await get_event_vote_stats(db, event.id) == {"yes": 2, "no": 1, "maybe": 0}
+    assert await db.get(EventVoteTally, event.id) is not None
+    assert await check_vote_tallies(db) == []
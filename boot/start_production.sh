@@ -34,6 +34,12 @@ trap cleanup SIGTERM SIGINT EXIT
 # 啟動後端（背景執行）
 cd "$PROJECT_ROOT/backend"
 source venv/bin/activate
+# 先執行一次初始化（migration 與預設資料），worker 啟動時檢查到已初始化就直接跳過
+echo "初始化資料庫..."
+if ! python -m app.cli init; then
+    echo "錯誤: 資料庫初始化失敗"
+    exit 1
+fi
 echo "啟動後端服務..."
 uvicorn app.main:app \
     --host 0.0.0.0 \
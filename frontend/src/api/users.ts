@@ -24,7 +24,8 @@ export type UserUpdate = {
 
 export type UserListResponse = {
   users: User[]
-  total: number
+  total?: number // 只有第一頁會回傳
+  next_cursor?: string
 }
 
 export const usersApi = {
@@ -33,9 +34,9 @@ export const usersApi = {
     return response.data
   },
 
-  getUsers: async (skip = 0, limit = 50): Promise<UserListResponse> => {
+  getUsers: async (cursor?: string, limit = 50): Promise<UserListResponse> => {
     const response = await apiClient.get('/admin/users', {
-      params: { skip, limit },
+      params: { cursor, limit },
     })
     return response.data
   },
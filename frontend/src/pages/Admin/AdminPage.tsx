@@ -17,7 +17,7 @@ export default function AdminPage() {
 
   const { data: userList, isLoading: usersLoading } = useQuery({
     queryKey: ['admin', 'users'],
-    queryFn: () => usersApi.getUsers(0, 100),
+    queryFn: () => usersApi.getUsers(undefined, 100),
   })
 
   const { data: pendingTemplates, isLoading: templatesLoading } = usePendingTemplates()